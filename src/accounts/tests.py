@@ -1,3 +1,39 @@
+import datetime
+
+from django.contrib.auth.models import User
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from employee.models import Department, Employee, Role
+
+
+class UsersListQueryCountTest(TestCase):
+
+    def setUp(self):
+        self.admin = User.objects.create(username='admin', is_staff=True, is_superuser=True)
+        self.department = Department.objects.create(name='HR')
+        self.role = Role.objects.create(name='Officer')
+
+    def add_employees(self, count):
+        for index in range(count):
+            user = User.objects.create(username='user{0}'.format(User.objects.count()))
+            Employee.objects.create(user=user, firstname='First', lastname=str(index), birthday=datetime.date(1990, 1, 1),
+                                    department=self.department, role=self.role, is_blocked=True)
+
+    def queries_for(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_user_tables_have_fixed_query_count(self):
+        self.client.force_login(self.admin)
+        urls = [reverse('accounts:users'), reverse('accounts:erasedusers')]
 
-# Create your tests here.
+        self.add_employees(2)
+        few = [self.queries_for(url) for url in urls]
+        self.add_employees(18)
+        many = [self.queries_for(url) for url in urls]
+        self.assertEqual(few, many)
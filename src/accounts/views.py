@@ -121,7 +121,7 @@ def logout_view(request):
 
 
 def users_list(request):
-    employees = Employee.objects.all()
+    employees = Employee.objects.for_list()
     return render(request,'accounts/users_table.html',{'employees':employees,'title':'Users List'})
 
 
@@ -150,7 +150,7 @@ def users_block(request,id):
 
 
 def users_blocked_list(request):
-    blocked_employees = Employee.objects.all_blocked_employees()
+    blocked_employees = Employee.objects.all_blocked_employees().for_list()
     return render(request,'accounts/all_deleted_users.html',{'employees':blocked_employees,'title':'blocked users list'})
 
 def register_admin_view(request):
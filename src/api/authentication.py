@@ -0,0 +1,35 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.authentication import TokenAuthentication
+
+from dashboard.cache import is_process_local
+
+
+TOKEN_KEY = 'api:token:{0}'
+
+
+def token_cache_key(key):
+    # hashed, the cache never holds a usable token
+    return TOKEN_KEY.format(hashlib.sha256(key.encode()).hexdigest())
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    '''
+    "Authorization: Token <key>" without a session and, once the token's user is
+    cached, without any query; api.signals drops the entry when the user changes
+    (deactivated, staff rights) or the token is deleted. That only reaches every
+    worker through a shared cache, so with a process-local one nothing is cached
+    and each call reads the token; see API_TOKEN_CACHE_TIMEOUT for the window left
+    '''
+
+    def authenticate_credentials(self, key):
+        if is_process_local():
+            return super().authenticate_credentials(key)
+        cache_key = token_cache_key(key)
+        credentials = cache.get(cache_key)
+        if credentials is None:
+            credentials = super().authenticate_credentials(key) # only active users get this far
+            cache.set(cache_key, credentials, settings.API_TOKEN_CACHE_TIMEOUT)
+        return credentials
@@ -0,0 +1,64 @@
+"""
+Serializers of the JSON API.
+
+They read .values() rows, not model instances: a view selects only the
+columns behind the fields of its serializer, and ?fields=a,b narrows
+both the response and the SELECT for clients that need a few of them.
+"""
+from rest_framework import serializers
+
+
+class ProjectedSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        wanted = request.query_params.get('fields') if request else None
+        if wanted:
+            wanted = set(wanted.split(',')) | {'id'}
+            for name in set(self.fields) - wanted:
+                self.fields.pop(name)
+
+    @property
+    def columns(self):
+        return [field.source for field in self.fields.values()]
+
+
+class LeaveSerializer(ProjectedSerializer):
+    user = serializers.IntegerField(source='user_id')
+    startdate = serializers.DateField()
+    enddate = serializers.DateField()
+    leavetype = serializers.CharField()
+    status = serializers.CharField()
+    duration = serializers.IntegerField() # working days
+    reason = serializers.CharField()
+    created = serializers.DateTimeField()
+    updated = serializers.DateTimeField()
+
+
+class LeaveBalanceSerializer(ProjectedSerializer):
+    user = serializers.IntegerField(source='user_id')
+    year = serializers.IntegerField()
+    entitlement = serializers.IntegerField()
+    used = serializers.IntegerField()
+    pending = serializers.IntegerField()
+    remaining = serializers.IntegerField() # annotated by the view, see LeaveBalance.remaining
+    available = serializers.IntegerField()
+    updated = serializers.DateTimeField()
+
+
+class EmployeeSerializer(ProjectedSerializer):
+    user = serializers.IntegerField(source='user_id')
+    employeeid = serializers.CharField()
+    firstname = serializers.CharField()
+    lastname = serializers.CharField()
+    othername = serializers.CharField()
+    department = serializers.IntegerField(source='department_id')
+    department_name = serializers.CharField(source='department__name')
+    role = serializers.IntegerField(source='role_id')
+    role_name = serializers.CharField(source='role__name')
+    employeetype = serializers.CharField()
+    startdate = serializers.DateField()
+    is_blocked = serializers.BooleanField()
+    updated = serializers.DateTimeField()
@@ -0,0 +1,25 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import token_cache_key
+
+
+@receiver(post_save, sender=User)
+def forget_user_token(sender, instance, created=False, **kwargs):
+    if not created:
+        forget([token_cache_key(key) for key in Token.objects.filter(user=instance).values_list('key', flat=True)])
+
+
+@receiver(post_delete, sender=Token)
+def forget_token(sender, instance, **kwargs):
+    forget([token_cache_key(instance.key)])
+
+
+def forget(cache_keys):
+    # again on commit: a request running meanwhile may have cached the row as it was before
+    cache.delete_many(cache_keys)
+    transaction.on_commit(lambda: cache.delete_many(cache_keys))
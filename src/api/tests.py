@@ -0,0 +1,133 @@
+import datetime
+import shutil
+import tempfile
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+
+from employee.models import Department, Employee
+from leave import transitions
+from leave.models import Leave
+
+from .authentication import token_cache_key
+
+
+def url(name, **kwargs):
+    return reverse('api:' + name, kwargs=dict(kwargs, version='v1'))
+
+
+@override_settings(LEAVE_WORK_WEEKS={None: 'Mon Tue Wed Thu Fri Sat Sun'}, LEAVE_HOLIDAY_COUNTRY=None)
+class ApiTest(TestCase):
+
+    def setUp(self):
+        # tokens are only cached in a cache every process shares
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        shared_cache = override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': directory}})
+        shared_cache.enable()
+        self.addCleanup(shared_cache.disable)
+        self.department = Department.objects.create(name='Ops')
+        self.ama = User.objects.create_user('ama')
+        self.kofi = User.objects.create_user('kofi')
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', None)
+        for user in (self.ama, self.kofi):
+            Employee.objects.create(user=user, firstname=user.username, lastname='Test',
+                                    birthday=datetime.date(1990, 1, 1), department=self.department)
+        self.leaves = [
+            Leave.objects.create(user=self.ama, startdate=datetime.date(2024, 3, day), enddate=datetime.date(2024, 3, day + 1))
+            for day in (4, 11, 18)
+        ]
+        Leave.objects.create(user=self.kofi, startdate=datetime.date(2024, 3, 4), enddate=datetime.date(2024, 3, 4))
+        self.token = Token.objects.create(user=self.ama)
+        self.auth = {'HTTP_AUTHORIZATION': 'Token ' + self.token.key}
+
+    def test_token_authentication_is_cached(self):
+        self.assertEqual(self.client.get(url('leave-list')).status_code, 401)
+        self.assertEqual(self.client.get(url('leave-list'), HTTP_AUTHORIZATION='Token nope').status_code, 401)
+
+        self.client.get(url('leave-list'), **self.auth)
+        with self.assertNumQueries(2): # ETag and page, no session or token lookup
+            response = self.client.get(url('leave-list'), **self.auth)
+        self.assertEqual(len(response.json()['results']), 3)
+
+        self.ama.is_active = False
+        self.ama.save()
+        self.assertEqual(self.client.get(url('leave-list'), **self.auth).status_code, 401)
+
+    def test_token_cache_is_dropped_on_commit_and_skipped_when_process_local(self):
+        self.client.get(url('leave-list'), **self.auth)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ama.is_active = False
+            self.ama.save()
+            cache.set(token_cache_key(self.token.key), (self.ama, self.token)) # read before the commit
+        self.assertIsNone(cache.get(token_cache_key(self.token.key)))
+
+        self.ama.is_active = True
+        self.ama.save()
+        with self.settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            self.client.get(url('leave-list'), **self.auth)
+            with self.assertNumQueries(3): # the token is read every time
+                self.client.get(url('leave-list'), **self.auth)
+
+    def test_rows_are_scoped_to_the_user(self):
+        leaves = self.client.get(url('leave-list'), **self.auth).json()['results']
+        self.assertEqual({leave['user'] for leave in leaves}, {self.ama.pk})
+        kofi_leave = Leave.objects.get(user=self.kofi)
+        self.assertEqual(self.client.get(url('leave-detail', pk=kofi_leave.pk), **self.auth).status_code, 404)
+        employees = self.client.get(url('employee-list'), **self.auth).json()['results']
+        self.assertEqual([employee['firstname'] for employee in employees], ['ama'])
+
+        self.client.force_login(self.admin)
+        self.assertEqual(len(self.client.get(url('leave-list')).json()['results']), 4)
+        leaves = self.client.get(url('leave-list'), {'user': self.kofi.pk}).json()['results']
+        self.assertEqual([leave['id'] for leave in leaves], [kofi_leave.pk])
+
+    def test_fields_narrow_the_projection(self):
+        leave = self.client.get(url('leave-detail', pk=self.leaves[0].pk), {'fields': 'status,duration'}, **self.auth).json()
+        self.assertEqual(leave, {'id': self.leaves[0].pk, 'status': 'pending', 'duration': 2})
+
+    def test_cursor_pagination(self):
+        page = self.client.get(url('leave-list'), {'limit': 2}, **self.auth).json()
+        self.assertEqual([leave['id'] for leave in page['results']], [self.leaves[2].pk, self.leaves[1].pk])
+        self.assertIsNone(page['previous'])
+        page = self.client.get(page['next'], **self.auth).json()
+        self.assertEqual([leave['id'] for leave in page['results']], [self.leaves[0].pk])
+        self.assertIsNone(page['next'])
+
+    def test_conditional_get(self):
+        response = self.client.get(url('leave-list'), **self.auth)
+        etag = response['ETag']
+        self.assertIn('private', response['Cache-Control'])
+
+        with self.assertNumQueries(1):
+            response = self.client.get(url('leave-list'), HTTP_IF_NONE_MATCH=etag, **self.auth)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        # another query string is another response
+        self.assertEqual(self.client.get(url('leave-list'), {'fields': 'status'}, HTTP_IF_NONE_MATCH=etag, **self.auth).status_code, 200)
+
+        transitions.transition(self.leaves[0], 'approve')
+        response = self.client.get(url('leave-list'), HTTP_IF_NONE_MATCH=etag, **self.auth)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_balances_follow_the_ledger(self):
+        response = self.client.get(url('balance-list'), **self.auth)
+        balance = response.json()['results'][0]
+        self.assertEqual((balance['year'], balance['pending'], balance['used']), (2024, 6, 0))
+
+        transitions.transition(self.leaves[0], 'approve')
+        response = self.client.get(url('balance-list'), HTTP_IF_NONE_MATCH=response['ETag'], **self.auth)
+        self.assertEqual(response.status_code, 200)
+        balance = response.json()['results'][0]
+        self.assertEqual((balance['pending'], balance['used'], balance['remaining']), (4, 2, balance['entitlement'] - 2))
+
+    def test_employee_etag_follows_department_names(self):
+        etag = self.client.get(url('employee-list'), **self.auth)['ETag']
+        self.department.name = 'Operations'
+        self.department.save()
+        response = self.client.get(url('employee-list'), HTTP_IF_NONE_MATCH=etag, **self.auth)
+        self.assertEqual(response.json()['results'][0]['department_name'], 'Operations')
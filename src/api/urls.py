@@ -0,0 +1,17 @@
+from django.urls import path
+from rest_framework.authtoken.views import obtain_auth_token
+from rest_framework.routers import DefaultRouter
+
+from . import views
+
+
+app_name = 'api'
+
+router = DefaultRouter()
+router.register('leaves', views.LeaveViewSet, basename='leave')
+router.register('balances', views.LeaveBalanceViewSet, basename='balance')
+router.register('employees', views.EmployeeViewSet, basename='employee')
+
+urlpatterns = [
+    path('token/', obtain_auth_token, name='token'),
+] + router.urls
@@ -0,0 +1,131 @@
+"""
+Read-only JSON API of leaves, leave balances and employees (/api/v1/).
+
+Everyone sees their own rows, superusers with staff status see all of
+them. Responses carry an ETag computed with one aggregate query (row
+count and latest `updated` of the rows in scope) before anything is
+serialized, so a client polling with If-None-Match gets a 304 for the
+price of that query; with CachedTokenAuthentication the call needs no
+other query at all.
+"""
+import datetime
+import hashlib
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Count, F, Max, Value
+from django.db.models.functions import Greatest
+from django.utils.cache import get_conditional_response, patch_cache_control
+from rest_framework import mixins, viewsets
+
+from employee.models import Employee
+from leave.models import Leave, LeaveBalance
+from .pagination import KeysetPagination
+from .serializers import EmployeeSerializer, LeaveBalanceSerializer, LeaveSerializer
+
+
+def sees_everyone(user):
+    return user.is_superuser and user.is_staff
+
+
+class ConditionalViewSet(mixins.ListModelMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    '''
+    list and retrieve over get_scope() with ETag / If-None-Match support
+    '''
+    pagination_class = KeysetPagination
+    lookup_value_regex = '[0-9]+'
+    ordering = ('-id',)
+    etag_fields = ('updated',) # latest value of each, with the row count, identifies a response
+
+    def get_scope(self):
+        '''
+        rows the request may see, its filters applied
+        '''
+        raise NotImplementedError
+
+    def get_queryset(self):
+        columns = set(self.get_serializer().columns) | {field.lstrip('-') for field in self.ordering}
+        return self.get_scope().values(*columns)
+
+    def etag(self, scope):
+        state = scope.aggregate(rows=Count('pk'), **{'v{0}'.format(index): Max(field) for index, field in enumerate(self.etag_fields)})
+        user = self.request.user
+        identity = [self.request.version, user.pk, sees_everyone(user), sorted(self.request.query_params.lists()), sorted(state.items())]
+        return '"{0}"'.format(hashlib.md5(json.dumps(identity, cls=DjangoJSONEncoder).encode()).hexdigest())
+
+    def conditional(self, scope, render, request, *args, **kwargs):
+        etag = self.etag(scope)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = render(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+        patch_cache_control(response, private=True, no_cache=True) # always revalidate, never shared
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional(self.get_scope(), super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional(self.get_scope().filter(pk=kwargs['pk']), super().retrieve, request, *args, **kwargs)
+
+
+class LeaveViewSet(ConditionalViewSet):
+    '''
+    leaves, newest first -> ?status=, ?year=, and ?user= for those who see everyone
+    '''
+    serializer_class = LeaveSerializer
+    ordering = ('-created', '-id')
+
+    def get_scope(self):
+        params = self.request.query_params
+        leaves = Leave.objects.all()
+        if not sees_everyone(self.request.user):
+            leaves = leaves.filter(user=self.request.user)
+        elif params.get('user', '').isdigit():
+            leaves = leaves.filter(user_id=params['user'])
+        if params.get('status'):
+            leaves = leaves.filter(status=params['status'])
+        if params.get('year', '').isdigit():
+            year = int(params['year'])
+            leaves = leaves.filter(startdate__range=(datetime.date(year, 1, 1), datetime.date(year, 12, 31)))
+        return leaves
+
+
+class LeaveBalanceViewSet(ConditionalViewSet):
+    '''
+    yearly leave ledgers, latest year first -> ?year=, and ?user= for those who see everyone
+    '''
+    serializer_class = LeaveBalanceSerializer
+    ordering = ('-year', 'id')
+
+    def get_scope(self):
+        params = self.request.query_params
+        balances = LeaveBalance.objects.annotate(
+            remaining=Greatest(F('entitlement') - F('used'), Value(0)),
+            available=Greatest(F('entitlement') - F('used') - F('pending'), Value(0)),
+        )
+        if not sees_everyone(self.request.user):
+            balances = balances.filter(user=self.request.user)
+        elif params.get('user', '').isdigit():
+            balances = balances.filter(user_id=params['user'])
+        if params.get('year', '').isdigit():
+            balances = balances.filter(year=params['year'])
+        return balances
+
+
+class EmployeeViewSet(ConditionalViewSet):
+    '''
+    active employees by id -> ?department= for those who see everyone
+    '''
+    serializer_class = EmployeeSerializer
+    ordering = ('id',)
+    etag_fields = ('updated', 'department__updated', 'role__updated') # their names are part of the rows
+
+    def get_scope(self):
+        employees = Employee.objects.all()
+        if not sees_everyone(self.request.user):
+            return employees.filter(user=self.request.user)
+        if self.request.query_params.get('department', '').isdigit():
+            employees = employees.filter(department_id=self.request.query_params['department'])
+        return employees
@@ -0,0 +1,139 @@
+"""
+Query plans and timings of the Leave/Employee hot queries, before and
+after the hot query indexes (leave 0006 and 0007, employee 0005).
+
+Runs against a throw-away SQLite database, never the project one:
+
+    python benchmarks/leave_indexes.py --leaves 1000000
+"""
+import argparse
+import datetime
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'hrsuit.settings')
+
+import django
+from django.conf import settings
+
+DATABASE = os.path.join(tempfile.mkdtemp(), 'bench.sqlite3')
+settings.DATABASES['default']['NAME'] = DATABASE
+django.setup()
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+
+from dashboard import aggregates
+from employee.models import Department, Employee
+from leave.models import Leave, LEAVE_TYPE
+
+
+BEFORE = [('leave', '0005_leavebalance'), ('employee', '0004_nationality_religion_employee_nationality_and_more')]
+AFTER = [('leave', '0007_leave_overlap_index'), ('employee', '0005_hot_query_indexes')]
+STATUSES = ['pending', 'approved', 'rejected', 'cancelled']
+
+
+def seed(leaves, users, departments):
+    department_objs = Department.objects.bulk_create([Department(name='Department {0}'.format(i)) for i in range(departments)])
+    user_objs = User.objects.bulk_create([User(username='bench{0}'.format(i)) for i in range(users)])
+    Employee.objects.bulk_create([
+        Employee(user=user, firstname='Bench', lastname=str(i), birthday=datetime.date(1990, 1, 1),
+                 department=department_objs[i % departments], is_deleted=(i % 20 == 0))
+        for i, user in enumerate(user_objs)
+    ], batch_size=1000)
+
+    rng = random.Random(42)
+    first_day = datetime.date(2015, 1, 1)
+    batch = []
+    for _ in range(leaves):
+        startdate = first_day + datetime.timedelta(days=rng.randrange(365 * 10))
+        enddate = startdate + datetime.timedelta(days=rng.randrange(10))
+        batch.append(Leave(
+            user=rng.choice(user_objs), startdate=startdate, enddate=enddate,
+            duration=(enddate - startdate).days + 1, leavetype=rng.choice(LEAVE_TYPE)[0],
+            status=rng.choices(STATUSES, weights=[5, 80, 10, 5])[0],
+        ))
+        if len(batch) == 10000:
+            Leave.objects.bulk_create(batch)
+            batch = []
+    Leave.objects.bulk_create(batch)
+
+
+def hot_queries():
+    user = User.objects.order_by('id').first()
+    department = Department.objects.order_by('id').first()
+    year = 2020
+    return [
+        ('pending list (status, -created)', lambda: list(Leave.objects.all_pending_leaves()[:50])),
+        ('user dashboard (user, status)', lambda: Leave.objects.filter(user=user, status='approved').count()),
+        ('monthly counts (startdate range)', lambda: aggregates.monthly_counts(Leave.objects.all(), year)),
+        ('leave history year (startdate range)', lambda: Leave.objects.filter(
+            startdate__range=(datetime.date(year, 1, 1), datetime.date(year, 12, 31))).order_by('-created')[:15].count()),
+        ('active employees by department', lambda: Employee.objects.filter(department=department).count()),
+    ]
+
+
+def explain(run):
+    capture = _Capture()
+    with connection.execute_wrapper(capture):
+        run()
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN QUERY PLAN ' + capture.sql, capture.params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+class _Capture:
+    sql, params = None, None
+
+    def __call__(self, execute, sql, params, many, context):
+        if self.sql is None:
+            self.sql, self.params = sql, params
+        return execute(sql, params, many, context)
+
+
+def measure(label, repeat):
+    print('\n=== {0} ==='.format(label))
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+    for name, run in hot_queries():
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            run()
+            timings.append(time.perf_counter() - start)
+        print('{0:<40} best {1:8.2f} ms'.format(name, min(timings) * 1000))
+        for line in explain(run):
+            print('    ' + line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--leaves', type=int, default=1000000)
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--departments', type=int, default=300)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    call_command('migrate', verbosity=0)
+    started = time.perf_counter()
+    seed(args.leaves, args.users, args.departments)
+    print('seeded {0} leaves in {1:.1f}s ({2})'.format(args.leaves, time.perf_counter() - started, DATABASE))
+
+    for app, migration in BEFORE:
+        call_command('migrate', app, migration, verbosity=0)
+    measure('before', args.repeat)
+
+    for app, migration in AFTER:
+        call_command('migrate', app, migration, verbosity=0)
+    measure('after', args.repeat)
+
+    os.remove(DATABASE)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+"""
+Bytes a browser transfers for a dashboard load, cold (empty cache) and
+warm (everything cached, revisited a day later), before and after the
+fingerprinted, pre-compressed static pipeline (hrsuit/staticfiles.py):
+
+    before    plain collectstatic, django.views.static.serve: no
+              Cache-Control, no compression, every asset revalidated
+    after     manifest + .gz/.br build, hrsuit.staticfiles.serve
+
+The page is the welcome dashboard of a superuser against a throw-away
+SQLite database; its assets are the /static/ URLs in the HTML plus the
+url() references of its stylesheets (only the woff/woff2 web fonts a
+browser would pick). Bytes are status line, headers and body. Warm loads
+skip assets sent as immutable and revalidate the others (a 304);
+heuristic freshness is ignored.
+
+    python benchmarks/static_transfer.py
+"""
+import argparse
+import gzip
+import os
+import posixpath
+import re
+import shutil
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'hrsuit.settings')
+
+import django
+from django.conf import settings
+
+DATABASE = os.path.join(tempfile.mkdtemp(), 'bench.sqlite3')
+settings.DATABASES['default']['NAME'] = DATABASE
+settings.SEARCH_INDEX = os.path.join(os.path.dirname(DATABASE), 'search.sqlite3')
+settings.DEBUG = False # {% static %} only uses hashed names outside DEBUG
+settings.ALLOWED_HOSTS = ['testserver']
+django.setup()
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.http import Http404
+from django.test import Client, RequestFactory, override_settings
+from django.urls import reverse
+from django.views import static as django_static
+
+from hrsuit import staticfiles
+
+
+ACCEPT_ENCODING = 'gzip, deflate, br'
+ASSET = re.compile(r'''(?:href|src|data-image)\s*=\s*["']({0}[^"'?#]+)'''.format(re.escape(settings.STATIC_URL)))
+CSS_URL = re.compile(r'''url\(\s*["']?([^"')?#]+)''')
+SKIPPED_FONTS = ('.eot', '.ttf', '.otf', '.svg')
+
+CONFIGURATIONS = {
+    'before': ('django.contrib.staticfiles.storage.StaticFilesStorage',
+               lambda request, path: django_static.serve(request, path, document_root=settings.STATIC_ROOT)),
+    'after': ('hrsuit.staticfiles.CompressedManifestStaticFilesStorage', staticfiles.serve),
+}
+
+
+def transferred(response):
+    '''
+    bytes on the wire -> (status line + headers + body, body)
+    '''
+    body = b''.join(response.streaming_content) if response.streaming else response.content
+    headers = ''.join('{0}: {1}\r\n'.format(name, value) for name, value in response.items())
+    return len('HTTP/1.1 {0} {1}\r\n\r\n'.format(response.status_code, response.reason_phrase)) + len(headers) + len(body), body
+
+
+def decode(body, encoding):
+    if encoding == 'gzip':
+        body = gzip.decompress(body)
+    elif encoding == 'br':
+        body = staticfiles.brotli.decompress(body)
+    return body.decode('utf-8', 'replace')
+
+
+def stylesheet_assets(url, text):
+    base = posixpath.dirname(url)
+    for reference in CSS_URL.findall(text):
+        if reference.startswith(('data:', 'http:', 'https:', '//')) or reference.lower().endswith(SKIPPED_FONTS):
+            continue
+        yield posixpath.normpath(posixpath.join(base, reference))
+
+
+class Browser:
+    '''
+    a client with an HTTP cache: keeps validators, and the pages and stylesheets it parsed
+    '''
+
+    def __init__(self, serve, user):
+        self.serve, self.factory = serve, RequestFactory()
+        self.client = Client(HTTP_ACCEPT_ENCODING=ACCEPT_ENCODING)
+        self.client.force_login(user)
+        self.cache = {} # url -> response headers
+        self.texts = {} # url -> HTML or CSS
+
+    def get(self, url):
+        '''
+        -> (requests made, bytes transferred); nothing when the cached copy needs no revalidation
+        '''
+        cached = self.cache.get(url)
+        if cached is not None and 'immutable' in cached.get('Cache-Control', ''):
+            return 0, 0
+
+        headers = {}
+        if cached is not None:
+            if 'ETag' in cached:
+                headers['HTTP_IF_NONE_MATCH'] = cached['ETag']
+            if 'Last-Modified' in cached:
+                headers['HTTP_IF_MODIFIED_SINCE'] = cached['Last-Modified']
+
+        if url.startswith(settings.STATIC_URL):
+            request = self.factory.get(url, HTTP_ACCEPT_ENCODING=ACCEPT_ENCODING, **headers)
+            try:
+                response = self.serve(request, url[len(settings.STATIC_URL):])
+            except Http404:
+                return 1, 0 # referenced but not shipped
+        else:
+            response = self.client.get(url, **headers)
+        size, body = transferred(response)
+        if response.status_code == 200:
+            self.cache[url] = dict(response.items())
+            if not url.startswith(settings.STATIC_URL) or url.endswith('.css'):
+                self.texts[url] = decode(body, response.get('Content-Encoding'))
+        return 1, size
+
+    def load(self, page):
+        '''
+        page and its assets -> (requests, bytes)
+        '''
+        requests, size = self.get(page)
+        pending, seen = list(ASSET.findall(self.texts[page])), set()
+        while pending:
+            url = pending.pop(0)
+            if url in seen:
+                continue
+            seen.add(url)
+            made, transferred_bytes = self.get(url)
+            requests, size = requests + made, size + transferred_bytes
+            if url in self.texts:
+                pending.extend(stylesheet_assets(url, self.texts[url]))
+        return requests, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.parse_args()
+
+    call_command('migrate', verbosity=0)
+    admin = User.objects.create_superuser('bench-admin', 'admin@example.com', None)
+    page = reverse('dashboard:dashboard')
+
+    print('{0:<8} {1:>14} {2:>14} {3:>14} {4:>14}'.format('', 'cold requests', 'cold bytes', 'warm requests', 'warm bytes'))
+    for label, (backend, serve) in CONFIGURATIONS.items():
+        root = tempfile.mkdtemp()
+        storages = dict(settings.STORAGES, staticfiles={'BACKEND': backend})
+        with override_settings(STATIC_ROOT=root, STORAGES=storages):
+            call_command('collectstatic', interactive=False, verbosity=0)
+            browser = Browser(serve, admin)
+            cold, warm = browser.load(page), browser.load(page)
+        shutil.rmtree(root)
+        print('{0:<8} {1:>14} {2:>14,} {3:>14} {4:>14,}'.format(label, cold[0], cold[1], warm[0], warm[1]))
+
+    os.remove(DATABASE)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,183 @@
+"""
+Render time of the large dashboard templates, three ways:
+
+    parse     every render parses the template again (no cached loader)
+    cached    parsed once by the cached loader, fragment cache empty
+    warm      parsed once, cached fragments ({% cache %}) already stored
+
+Contexts are built by the dashboard views' own data functions against a
+throw-away SQLite database, so lazy querysets rendered by the templates
+count too (queries are listed per mode). Save a run and compare a later
+one to it to catch regressions:
+
+    python benchmarks/template_render.py --save before.json
+    python benchmarks/template_render.py --compare before.json
+"""
+import argparse
+import datetime
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'hrsuit.settings')
+
+import django
+from django.conf import settings
+
+DATABASE = os.path.join(tempfile.mkdtemp(), 'bench.sqlite3')
+settings.DATABASES['default']['NAME'] = DATABASE
+settings.SEARCH_INDEX = os.path.join(os.path.dirname(DATABASE), 'search.sqlite3')
+django.setup()
+
+from django.contrib.auth.models import User
+from django.core.cache import cache as django_cache
+from django.core.management import call_command
+from django.db import connection
+from django.template import engines
+from django.template.backends.django import DjangoTemplates
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+from dashboard import cache
+from dashboard.views import compute_user_dashboard_data, get_superuser_dashboard_data
+from employee.models import Department, Employee, Role
+from leave.models import Leave, LEAVE_TYPE
+
+
+STATUSES = ['pending', 'approved', 'rejected', 'cancelled']
+MODES = ('parse', 'cached', 'warm')
+SLOWER = 1.2 # a compared run flags templates this much slower
+
+
+def seed(leaves, users, departments):
+    department_objs = Department.objects.bulk_create([Department(name='Department {0}'.format(i)) for i in range(departments)])
+    role = Role.objects.create(name='Officer')
+    user_objs = User.objects.bulk_create([User(username='bench{0}'.format(i)) for i in range(users)])
+    Employee.objects.bulk_create([
+        Employee(user=user, firstname='Bench', lastname=str(i), birthday=datetime.date(1990, 1, 1),
+                 department=department_objs[i % departments], role=role)
+        for i, user in enumerate(user_objs)
+    ], batch_size=1000)
+
+    rng = random.Random(42)
+    first_day = datetime.date(datetime.date.today().year, 1, 1)
+    Leave.objects.bulk_create([
+        Leave(user=rng.choice(user_objs), startdate=first_day + datetime.timedelta(days=offset),
+              enddate=first_day + datetime.timedelta(days=offset + rng.randrange(5)), duration=3,
+              leavetype=rng.choice(LEAVE_TYPE)[0], status=rng.choice(STATUSES))
+        for offset in (rng.randrange(360) for _ in range(leaves))
+    ], batch_size=1000)
+    call_command('rebuild_leave_statistics', verbosity=0)
+    return user_objs[0]
+
+
+def scenarios(regular):
+    admin = User.objects.create_superuser('bench-admin', 'admin@example.com', None)
+    employee = Employee.objects.select_related('department', 'role').get(user=regular)
+
+    def admin_dashboard():
+        return dict(get_superuser_dashboard_data(), data_version=cache.page_version(admin), title='Dashboard')
+
+    def user_dashboard():
+        return dict(compute_user_dashboard_data(regular), data_version=cache.page_version(regular), title='Dashboard')
+
+    def profile():
+        return {'employee': employee, 'data_version': cache.page_version(), 'title': 'profile'}
+
+    return [
+        ('dashboard/basic_dashboard.html', 'admin', admin, admin_dashboard),
+        ('dashboard/basic_dashboard.html', 'employee', regular, user_dashboard),
+        ('dashboard/enhanced_dashboard.html', 'admin', admin, admin_dashboard),
+        ('dashboard/enhanced_dashboard.html', 'employee', regular, user_dashboard),
+        ('dashboard/employee_detail.html', 'employee', regular, profile),
+    ]
+
+
+def parsing_engine():
+    '''
+    the project's template engine without the cached loader
+    '''
+    config = dict(settings.TEMPLATES[0], NAME='bench-parse', APP_DIRS=False)
+    config.pop('BACKEND')
+    config['OPTIONS'] = dict(config['OPTIONS'], loaders=[
+        'django.template.loaders.filesystem.Loader',
+        'django.template.loaders.app_directories.Loader',
+    ])
+    return DjangoTemplates(config)
+
+
+def measure(template_name, user, context_of, repeat):
+    '''
+    -> {mode: (best ms, queries of one render)}
+    '''
+    request = RequestFactory().get('/dashboard/')
+    request.user = user
+    engine, parse = engines['django'], parsing_engine()
+    results = {}
+    for mode in MODES:
+        timings, queries = [], 0
+        for _ in range(repeat):
+            if mode != 'warm':
+                django_cache.clear()
+            context = context_of() # fresh lazy querysets, they are part of what a render costs
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                (parse if mode == 'parse' else engine).get_template(template_name).render(context, request)
+                timings.append(time.perf_counter() - start)
+            queries = len(captured)
+        results[mode] = (min(timings) * 1000, queries)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--leaves', type=int, default=20000)
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--departments', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--save', help='write the timings to this JSON file')
+    parser.add_argument('--compare', help='JSON file of an earlier run to compare with')
+    args = parser.parse_args()
+
+    call_command('migrate', verbosity=0)
+    started = time.perf_counter()
+    regular = seed(args.leaves, args.users, args.departments)
+    print('seeded {0} leaves in {1:.1f}s ({2})'.format(args.leaves, time.perf_counter() - started, DATABASE))
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+
+    print('\n{0:<54} {1:>16} {2:>16} {3:>16}'.format('template', *MODES))
+    runs, regressions = {}, []
+    for template_name, role, user, context_of in scenarios(regular):
+        label = '{0} ({1})'.format(template_name, role)
+        results = measure(template_name, user, context_of, args.repeat)
+        runs[label] = {mode: ms for mode, (ms, _) in results.items()}
+        print('{0:<54} {1}'.format(label, ' '.join(
+            '{0:>9.2f} ms {1:>3}q'.format(ms, queries) for ms, queries in results.values())))
+
+        for mode, ms in runs[label].items():
+            before = baseline.get(label, {}).get(mode)
+            if before and ms > before * SLOWER:
+                regressions.append('{0} [{1}] {2:.2f} ms, was {3:.2f} ms'.format(label, mode, ms, before))
+
+    if args.save:
+        with open(args.save, 'w') as file:
+            json.dump(runs, file, indent=2)
+    if regressions:
+        print('\nslower than {0}:'.format(args.compare))
+        for line in regressions:
+            print('    ' + line)
+
+    os.remove(DATABASE)
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
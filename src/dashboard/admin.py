@@ -1,3 +1,21 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import FeedConsumer, OutboxEvent
+
+
+class OutboxEventAdmin(admin.ModelAdmin):
+    list_display = ('id', 'topic', 'key', 'action', 'created')
+    list_filter = ('topic', 'action')
+    search_fields = ('=key',)
+    readonly_fields = ('topic', 'key', 'action', 'data', 'created')
+
+    def has_add_permission(self, request):
+        return False # the log is written by the change feed only
+
+admin.site.register(OutboxEvent, OutboxEventAdmin)
+
+
+class FeedConsumerAdmin(admin.ModelAdmin):
+    list_display = ('name', 'position', 'updated')
+
+admin.site.register(FeedConsumer, FeedConsumerAdmin)
@@ -0,0 +1,177 @@
+"""
+Shared leave aggregations for the dashboards.
+
+Every helper here runs a fixed number of queries - conditional aggregates
+or a single GROUP BY - no matter how many departments, leave types or
+months are involved.
+
+Helpers accept either a Leave queryset or a LeaveStatistic queryset;
+the latter reads the pre-summed monthly rollups instead of scanning
+the leave table.
+"""
+import calendar
+import datetime
+
+from django.db.models import Avg, Count, Q, Sum
+from django.db.models.functions import Coalesce
+
+from employee.models import Department
+from leave.models import Leave, LeaveStatistic, LEAVE_TYPE
+
+
+STATUSES = ('pending', 'approved', 'rejected', 'cancelled')
+
+
+def month_range(year, month):
+    """first and last day of a month -> (date, date)"""
+    last_day = calendar.monthrange(year, month)[1]
+    return datetime.date(year, month, 1), datetime.date(year, month, last_day)
+
+
+def _tally(rows, condition=None):
+    """number of leaves matching `condition`, counted or summed from rollups"""
+    if rows.model is LeaveStatistic:
+        return Coalesce(Sum('leaves', filter=condition), 0)
+    return Count('id', filter=condition)
+
+
+def _days(rows, condition=None):
+    """leave days matching `condition`, from durations or rollups"""
+    field = 'days' if rows.model is LeaveStatistic else 'duration'
+    return Coalesce(Sum(field, filter=condition), 0)
+
+
+def _month_field(rows):
+    return 'month' if rows.model is LeaveStatistic else 'startdate'
+
+
+def _department_field(rows):
+    return 'department' if rows.model is LeaveStatistic else 'user__employee__department'
+
+
+def status_counts(leaves):
+    """
+    {'total': n, 'pending': n, 'approved': n, 'rejected': n, 'cancelled': n}
+    for any leave queryset, in one query.
+    """
+    aggregates = {'total': _tally(leaves)}
+    for status in STATUSES:
+        aggregates[status] = _tally(leaves, Q(status=status))
+    return leaves.order_by().aggregate(**aggregates)
+
+
+def type_counts(leaves, display=False, measure=_tally):
+    """
+    Non-zero counts per leave type, in LEAVE_TYPE order, in one query.
+    Keys are the stored values, or the display names when display=True.
+    """
+    rows = leaves.order_by().values('leavetype').annotate(count=measure(leaves))
+    counts = {row['leavetype']: row['count'] for row in rows}
+
+    result = {}
+    for leave_type, display_name in LEAVE_TYPE:
+        if counts.get(leave_type):
+            result[display_name if display else leave_type] = counts[leave_type]
+    return result
+
+
+def day_totals(leaves):
+    """
+    {'total_days': n, 'average_days': x} over the stored inclusive
+    durations of a Leave queryset, in one query
+    """
+    return leaves.order_by().aggregate(
+        total_days=Coalesce(Sum('duration'), 0),
+        average_days=Avg('duration'),
+    )
+
+
+def type_days(leaves, display=False):
+    """leave days per leave type, shaped like type_counts(), in one query"""
+    return type_counts(leaves, display=display, measure=_days)
+
+
+def summary(leaves):
+    """
+    Totals of a filtered Leave queryset in one query:
+    {'total': n, 'total_days': n, 'statuses': {status: n}, 'types': {leavetype: n}}
+    with zero type counts left out.
+    """
+    aggregates = {'total': _tally(leaves), 'total_days': _days(leaves)}
+    for status in STATUSES:
+        aggregates['status_' + status] = _tally(leaves, Q(status=status))
+    for leave_type, _ in LEAVE_TYPE:
+        aggregates['type_' + leave_type] = _tally(leaves, Q(leavetype=leave_type))
+    row = leaves.order_by().aggregate(**aggregates)
+
+    return {
+        'total': row['total'],
+        'total_days': row['total_days'],
+        'statuses': {status: row['status_' + status] for status in STATUSES},
+        'types': {
+            leave_type: row['type_' + leave_type]
+            for leave_type, _ in LEAVE_TYPE if row['type_' + leave_type]
+        },
+    }
+
+
+def most_common_type(leaves):
+    """{'leavetype': ..., 'count': n} of the most requested type, or None"""
+    counts = type_counts(leaves)
+    if not counts:
+        return None
+    leave_type = max(counts, key=counts.get)
+    return {'leavetype': leave_type, 'count': counts[leave_type]}
+
+
+def monthly_counts(leaves, year=None):
+    """
+    Leaves starting in each month of `year` (default: current year),
+    as [{'month': 'Jan', 'count': n}, ...], in one query.
+    """
+    year = year or datetime.date.today().year
+    field = _month_field(leaves) + '__range'
+    aggregates = {}
+    for month in range(1, 13):
+        aggregates['m{0}'.format(month)] = _tally(leaves, Q(**{field: month_range(year, month)}))
+
+    # the outer year range lets the start date index narrow the scan
+    year_range = (month_range(year, 1)[0], month_range(year, 12)[1])
+    totals = leaves.order_by().filter(**{field: year_range}).aggregate(**aggregates)
+
+    return [
+        {'month': calendar.month_abbr[month], 'count': totals['m{0}'.format(month)]}
+        for month in range(1, 13)
+    ]
+
+
+def department_stats(leaves=None):
+    """
+    Per-department employees, leaves, pending and approved counts in
+    Department ordering. Two queries in total.
+    """
+    if leaves is None:
+        leaves = Leave.objects.all()
+
+    departments = Department.objects.annotate(
+        employees=Count('employee', filter=Q(employee__is_deleted=False))
+    )
+    field = _department_field(leaves)
+    rows = leaves.order_by().values(field).annotate(
+        leave_count=_tally(leaves),
+        pending_count=_tally(leaves, Q(status='pending')),
+        approved_count=_tally(leaves, Q(status='approved')),
+    )
+    by_department = {row[field]: row for row in rows}
+
+    stats = []
+    for department in departments:
+        row = by_department.get(department.id, {})
+        stats.append({
+            'name': department.name,
+            'employees': department.employees,
+            'leaves': row.get('leave_count', 0),
+            'pending': row.get('pending_count', 0),
+            'approved': row.get('approved_count', 0),
+        })
+    return stats
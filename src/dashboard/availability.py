@@ -0,0 +1,111 @@
+"""
+Team availability: who is out on each day of a month, and the headcount left.
+
+The approved leaves of a department overlapping the month are swept once
+over their start/end events instead of being queried (or scanned) per
+day. Months are cached per (department, month) under a per-department
+version that dashboard.signals bumps when one of the department's
+leaves changes. Employee and department changes bump a global version,
+since they move people between departments.
+"""
+import calendar
+import datetime
+
+from django.conf import settings
+from django.core.cache import cache as django_cache
+
+from employee.models import Employee
+from leave.models import Leave
+from . import cache
+
+
+GLOBAL_VERSION_KEY = 'availability:version'
+DEPARTMENT_VERSION_KEY = 'availability:department:{0}:version'
+DATA_KEY = 'availability:department:{0}:{1:%Y-%m}:v{2}.{3}'
+
+
+def bump_department(department_id):
+    cache.bump_version(DEPARTMENT_VERSION_KEY.format(department_id))
+
+
+def bump_all():
+    cache.bump_version(GLOBAL_VERSION_KEY)
+
+
+def month_bounds(month):
+    first = month.replace(day=1)
+    return first, first.replace(day=calendar.monthrange(first.year, first.month)[1])
+
+
+def compute(department_id, month):
+    '''
+    -> {'department', 'month', 'headcount', 'employees': {user_id: name},
+        'days': [{'date', 'out': [{'user_id', 'leavetype'}], 'available'}, ...]}
+    two queries whatever the size of the department or the month
+    '''
+    first, last = month_bounds(month)
+
+    employees = {}
+    rows = Employee.objects.filter(department_id=department_id).order_by('-created').values_list('user_id', 'firstname', 'lastname', 'othername')
+    for user_id, *names in rows:
+        employees.setdefault(user_id, ' '.join(name for name in names if name))
+
+    leaves = (
+        Leave.objects.filter(user_id__in=list(employees)).overlapping(first, last, statuses=('approved',))
+        .order_by().values_list('user_id', 'startdate', 'enddate', 'leavetype')
+    )
+    events = {} # day -> [(+1 on the first day out, -1 on the day back, user_id, leavetype)]
+    for user_id, startdate, enddate, leavetype in leaves:
+        events.setdefault(max(startdate, first), []).append((1, user_id, leavetype))
+        events.setdefault(min(enddate, last) + datetime.timedelta(days=1), []).append((-1, user_id, leavetype))
+
+    days, away = [], {} # (user_id, leavetype) -> number of running leaves
+    for day in range(1, last.day + 1):
+        date = first.replace(day=day)
+        for sign, user_id, leavetype in events.get(date, ()):
+            away[(user_id, leavetype)] = away.get((user_id, leavetype), 0) + sign
+        out = {}
+        for (user_id, leavetype), running in sorted(away.items()):
+            if running > 0:
+                out.setdefault(user_id, leavetype)
+        days.append({
+            'date': date.isoformat(),
+            'out': [{'user_id': user_id, 'leavetype': leavetype} for user_id, leavetype in out.items()],
+            'available': len(employees) - len(out),
+        })
+
+    return {
+        'department': department_id,
+        'month': '{0:%Y-%m}'.format(first),
+        'headcount': len(employees),
+        'employees': employees,
+        'days': days,
+    }
+
+
+def month_availability(department_id, month):
+    '''
+    compute() through the cache, keyed by department and month
+    '''
+    first, _ = month_bounds(month)
+    key = DATA_KEY.format(department_id, first, cache.version(GLOBAL_VERSION_KEY), cache.version(DEPARTMENT_VERSION_KEY.format(department_id)))
+    data = django_cache.get(key)
+    if data is None:
+        data = compute(department_id, first)
+        django_cache.set(key, data, settings.DASHBOARD_CACHE_TIMEOUT)
+    return data
+
+
+def out_today(department_id):
+    '''
+    "who's out today" of a department, read from the cached month
+    -> {'out': [{'name', 'leavetype'}], 'available', 'headcount'}
+    '''
+    today = datetime.date.today()
+    data = month_availability(department_id, today)
+    day = data['days'][today.day - 1]
+    return {
+        'out': [{'name': data['employees'][entry['user_id']], 'leavetype': entry['leavetype']} for entry in day['out']],
+        'available': day['available'],
+        'headcount': data['headcount'],
+    }
@@ -0,0 +1,167 @@
+"""
+Per-user dashboard cache.
+
+Datasets are stored under a key carrying the user's data version. Any
+change to one of the user's leaves bumps that version (dashboard.signals),
+so stale entries are never read again and simply expire. Versions and
+hit/miss counters live in the cache itself, so the backend must be shared
+by every process and increment atomically: with a per-process one (locmem)
+a bump only reaches the process that made the write, and every other
+worker keeps serving (and answering 304 for) the old data; with a
+get-then-set incr (file, database) two bumps can land on the same version.
+is_shared() tells them apart, the dashboard.E001 deploy check requires it.
+
+The counters are sampled (DASHBOARD_CACHE_STATS_SAMPLE), so most cache
+hits are a single read.
+"""
+import datetime
+import hashlib
+import random
+import time
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+
+VERSION_KEY = 'dashboard:user:{0}:version'
+GLOBAL_VERSION_KEY = 'dashboard:global:version' # any leave, employee, department, role or user
+CHANGED_KEY = '{0}:changed'
+DATA_KEY = 'dashboard:user:{0}:v{1}:{2}:{3}'
+HITS_KEY = 'dashboard:hits'
+MISSES_KEY = 'dashboard:misses'
+
+# backends shared between processes and hosts whose incr and add are atomic
+SHARED_BACKENDS = (
+    'django.core.cache.backends.redis.RedisCache',
+    'django.core.cache.backends.memcached.PyMemcacheCache',
+    'django.core.cache.backends.memcached.PyLibMCCache',
+    'django_redis.cache.RedisCache',
+)
+
+
+def is_process_local():
+    '''
+    True when the default cache lives in this process only (versions, counters and
+    invalidations are not seen by other workers or by management commands)
+    '''
+    return isinstance(caches['default'], (LocMemCache, DummyCache))
+
+
+def is_shared():
+    '''
+    True when the default cache is one every process sees, with atomic incr/add
+    '''
+    return backend_name() in SHARED_BACKENDS
+
+
+def backend_name():
+    backend = caches['default'].__class__
+    return '{0}.{1}'.format(backend.__module__, backend.__name__)
+
+
+def _incr(key, initial=1, delta=1):
+    try:
+        return cache.incr(key, delta)
+    except ValueError:
+        # missing key; add() keeps a concurrent first write from being lost
+        if cache.add(key, initial, timeout=None):
+            return initial
+        return cache.incr(key, delta)
+
+
+def _count(key):
+    sample = getattr(settings, 'DASHBOARD_CACHE_STATS_SAMPLE', 1)
+    if sample <= 1 or random.randrange(sample) == 0:
+        _incr(key, max(sample, 1), max(sample, 1))
+
+
+def _fresh_version():
+    # an evicted version must not fall back to a number that may still
+    # have data cached under it, so new versions start from the clock
+    return int(time.time() * 1000)
+
+
+def version(key):
+    '''
+    current value of a data version key, created on first use
+    '''
+    value = cache.get(key)
+    if value is None:
+        if cache.add(key, _fresh_version(), timeout=None):
+            # the data may be older, but not newer
+            cache.set(CHANGED_KEY.format(key), time.time(), timeout=None)
+        value = cache.get(key)
+    return value
+
+
+def bump_version(key):
+    # stamped before the version moves, so a reader never pairs the new version with an older stamp
+    cache.set(CHANGED_KEY.format(key), time.time(), timeout=None)
+    return _incr(key, _fresh_version())
+
+
+def changed_at(key):
+    '''
+    when the data behind a version key last changed, as a timestamp -> None when unknown
+    '''
+    return cache.get(CHANGED_KEY.format(key))
+
+
+def user_version(user_id):
+    return version(VERSION_KEY.format(user_id))
+
+
+def bump_user_version(user_id):
+    return bump_version(VERSION_KEY.format(user_id))
+
+
+def bump_global_version():
+    return bump_version(GLOBAL_VERSION_KEY)
+
+
+def page_version(user=None):
+    '''
+    vary_on value of template fragments built from the user's data, or from everyone's
+    for admins and user=None -> 'all.<version>.<date>' or '<user id>.<version>.<date>'
+    '''
+    today = datetime.date.today().isoformat()
+    if user is None or (user.is_superuser and user.is_staff):
+        return 'all.{0}.{1}'.format(version(GLOBAL_VERSION_KEY), today)
+    return '{0}.{1}.{2}'.format(user.pk, user_version(user.pk), today)
+
+
+def get_or_compute(user, compute, name='dashboard'):
+    """
+    cached compute(user) for the user's current data version; the date is
+    part of the key since datasets depend on the current year. `name`
+    tells apart several datasets of the same user.
+    """
+    name = hashlib.md5(name.encode()).hexdigest()  # safe for any backend's key rules
+    key = DATA_KEY.format(user.pk, user_version(user.pk), datetime.date.today().isoformat(), name)
+    dataset = cache.get(key)
+    if dataset is not None:
+        _count(HITS_KEY)
+        return dataset
+
+    _count(MISSES_KEY)
+    dataset = compute(user)
+    cache.set(key, dataset, getattr(settings, 'DASHBOARD_CACHE_TIMEOUT', 60 * 60))
+    return dataset
+
+
+def stats():
+    """{'hits': n, 'misses': n, 'hit_rate': percentage}, estimates when the counters are sampled"""
+    hits = cache.get(HITS_KEY, 0)
+    misses = cache.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': (hits / total * 100) if total else 0,
+    }
+
+
+def reset_stats():
+    cache.delete_many([HITS_KEY, MISSES_KEY])
@@ -0,0 +1,18 @@
+from django.core import checks
+
+from . import cache
+
+
+@checks.register(checks.Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    '''
+    data versions, template fragments and API tokens are invalidated through the cache
+    '''
+    if cache.is_shared():
+        return []
+    return [checks.Error(
+        'The default cache ({0}) is not shared by every process with atomic increments: '
+        'dashboards, fragments and API tokens would be served stale.'.format(cache.backend_name()),
+        hint='Set REDIS_URL or MEMCACHED_LOCATION, see CACHES in hrsuit/settings.py.',
+        id='dashboard.E001',
+    )]
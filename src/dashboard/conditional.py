@@ -0,0 +1,82 @@
+"""
+HTTP validators (ETag, Last-Modified) for dashboard pages.
+
+A page names the data versions (dashboard.cache) its content depends
+on; dashboard.signals bumps them whenever that content changes. The
+ETag hashes those versions with everything else the page varies by:
+the query string, the user (name and rights appear in the navigation),
+the date and the CSRF secret behind the tokens in its forms. A matching
+revalidation is answered with a 304 before the view runs, without
+queries beyond the page's own lookups and without rendering a template.
+
+A response that shows messages (django.contrib.messages) is always
+rendered in full and carries no validators, so every message is shown
+exactly once.
+"""
+import datetime
+import functools
+import hashlib
+import json
+
+from django.contrib import messages
+from django.middleware.csrf import get_token
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+from . import cache
+
+
+def has_messages(request):
+    # len() loads stored messages without marking them as seen
+    return bool(len(messages.get_messages(request)))
+
+
+def validators(request, version_keys):
+    '''
+    -> (etag, last_modified) of the page, (None, None) when the request must get the full page
+    computed once per request
+    '''
+    if not hasattr(request, '_page_validators'):
+        request._page_validators = (None, None)
+        keys = version_keys(request) if request.user.is_authenticated else None
+        if keys is not None and not has_messages(request):
+            user = request.user
+            get_token(request) # a first visit gets its CSRF cookie now, the ETag holds its secret
+            today = timezone.localdate()
+            identity = [
+                request.get_full_path(), user.pk, user.get_username(), user.is_superuser, user.is_staff,
+                request.META['CSRF_COOKIE'], today.isoformat(), [cache.version(key) for key in keys],
+            ]
+            etag = '"{0}"'.format(hashlib.md5(json.dumps(identity).encode()).hexdigest())
+
+            # the date is part of every page, it changes at midnight at the latest
+            changed = [cache.changed_at(key) for key in keys]
+            last_modified = None
+            if None not in changed:
+                midnight = timezone.make_aware(datetime.datetime.combine(today, datetime.time()))
+                last_modified = max([midnight] + [datetime.datetime.fromtimestamp(stamp, datetime.timezone.utc) for stamp in changed])
+            request._page_validators = (etag, last_modified)
+    return request._page_validators
+
+
+def conditional_page(version_keys):
+    '''
+    view decorator -> version_keys(request): the data version keys the page is built from,
+    None for requests that get no validators (anonymous, redirected)
+    responses with validators are private and revalidated on every use
+    '''
+    def decorator(view):
+        checked = condition(
+            etag_func=lambda request, *args, **kwargs: validators(request, version_keys)[0],
+            last_modified_func=lambda request, *args, **kwargs: validators(request, version_keys)[1],
+        )(view)
+
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = checked(request, *args, **kwargs)
+            if validators(request, version_keys)[0] is not None:
+                patch_cache_control(response, private=True, no_cache=True)
+            return response
+        return wrapper
+    return decorator
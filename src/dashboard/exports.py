@@ -0,0 +1,136 @@
+"""
+CSV and Excel exports of leaves and employees.
+
+Rows come from a values_list projection (related names joined or
+annotated in the same SELECT) read with a chunked .iterator(), so
+memory stays flat whatever the size of the export. CSV is streamed
+through a StreamingHttpResponse a few hundred rows at a time and starts
+with a UTF-8 BOM so Excel opens it with the right encoding. XLSX is a
+zip archive that cannot be sent before it is complete: it is written
+with openpyxl in write-only mode to a spooled temporary file and sent
+once finished.
+
+Cells starting with =, +, - or @ are prefixed with a quote so user
+input (leave reasons, names) is never run as a spreadsheet formula.
+"""
+import csv
+import datetime
+import io
+import tempfile
+
+from django.db.models import CharField, OuterRef, Subquery
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils import timezone
+
+from employee.models import Employee
+from leave.models import LEAVE_TYPE
+
+
+CHUNK_SIZE = 2000 # rows fetched per round trip
+FLUSH_ROWS = 500 # CSV rows per streamed chunk
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+LEAVE_COLUMNS = (
+    ('ID', 'pk'), ('Employee', 'employee_name'), ('Username', 'user__username'),
+    ('Department', 'employee_department'), ('Leave type', 'leavetype'), ('Status', 'status'),
+    ('Start date', 'startdate'), ('End date', 'enddate'), ('Working days', 'duration'),
+    ('Reason', 'reason'), ('Requested', 'created'),
+)
+EMPLOYEE_COLUMNS = (
+    ('ID', 'pk'), ('Employee ID', 'employeeid'), ('Firstname', 'firstname'), ('Lastname', 'lastname'),
+    ('Othername', 'othername'), ('Username', 'user__username'), ('Email', 'user__email'),
+    ('Department', 'department__name'), ('Role', 'role__name'), ('Religion', 'religion__name'),
+    ('Nationality', 'nationality__name'), ('Employee type', 'employeetype'),
+    ('Employment date', 'startdate'), ('Birthday', 'birthday'), ('Blocked', 'is_blocked'),
+)
+
+
+# ---------------- rows ----------------
+
+def leave_rows(leaves):
+    '''
+    Leave queryset -> header, then one tuple per leave with the employee name and department
+    '''
+    departments = Employee.objects.filter(user=OuterRef('user_id')).order_by('-created').values('department__name')[:1]
+    projection = (
+        leaves.with_employee()
+        .annotate(employee_department=Subquery(departments, output_field=CharField()))
+        .values_list(*[field for _, field in LEAVE_COLUMNS])
+    )
+    leavetypes = dict(LEAVE_TYPE)
+    leavetype = [field for _, field in LEAVE_COLUMNS].index('leavetype')
+
+    yield [label for label, _ in LEAVE_COLUMNS]
+    for row in projection.iterator(chunk_size=CHUNK_SIZE):
+        row = list(row)
+        row[leavetype] = leavetypes.get(row[leavetype], row[leavetype])
+        yield row
+
+
+def employee_rows(employees):
+    '''
+    Employee queryset -> header, then one tuple per employee with user, department, role,
+    religion and nationality names joined in
+    '''
+    yield [label for label, _ in EMPLOYEE_COLUMNS]
+    yield from employees.values_list(*[field for _, field in EMPLOYEE_COLUMNS]).iterator(chunk_size=CHUNK_SIZE)
+
+
+def cell(value):
+    if value is None:
+        return ''
+    if isinstance(value, datetime.datetime):
+        if timezone.is_aware(value):
+            value = timezone.localtime(value)
+        return value.replace(tzinfo=None, microsecond=0)
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+# ---------------- responses ----------------
+
+def stream_csv(rows):
+    '''
+    rows -> CSV text, the header on its own so the download starts at once, then chunks of FLUSH_ROWS rows
+    '''
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write('\ufeff') # BOM, Excel reads the file as UTF-8
+    for index, row in enumerate(rows, start=1):
+        writer.writerow([cell(value) for value in row])
+        if index == 1 or index % FLUSH_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def write_xlsx(rows, title):
+    '''
+    rows -> spooled temporary file holding the workbook, positioned at its start
+    '''
+    import openpyxl
+
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet(title)
+    for row in rows:
+        sheet.append([cell(value) for value in row])
+    output = tempfile.SpooledTemporaryFile(max_size=10 * 1024 * 1024)
+    workbook.save(output)
+    output.seek(0)
+    return output
+
+
+def export_response(rows, name, format='csv'):
+    '''
+    rows -> download response; name is the file name without extension
+    '''
+    filename = '{0}-{1:%Y%m%d}'.format(name, datetime.date.today())
+    if format == 'xlsx':
+        return FileResponse(write_xlsx(rows, name), as_attachment=True, filename=filename + '.xlsx', content_type=XLSX_CONTENT_TYPE)
+
+    response = StreamingHttpResponse(stream_csv(rows), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = 'attachment; filename="{0}.csv"'.format(filename)
+    return response
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from dashboard import outbox
+
+
+class Command(BaseCommand):
+    help = 'Drop superseded change feed events and those past retention that every consumer has read'
+
+    def handle(self, *args, **options):
+        superseded, expired = outbox.compact()
+        self.stdout.write(self.style.SUCCESS('Dropped {0} superseded and {1} expired change feed events'.format(superseded, expired)))
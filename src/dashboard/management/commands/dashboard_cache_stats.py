@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from dashboard import cache
+
+
+class Command(BaseCommand):
+    help = 'Show hit/miss counters of the per-user dashboard cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='reset the counters after printing them')
+
+    def handle(self, *args, **options):
+        stats = cache.stats()
+        self.stdout.write('backend: {0}'.format(cache.backend_name()))
+        if cache.is_process_local():
+            self.stderr.write(self.style.WARNING(
+                'the cache backend is process-local: these are the counters of this command only, '
+                'and web workers do not see each other\'s invalidations; configure a shared backend (CACHES)'))
+        elif not cache.is_shared():
+            self.stderr.write(self.style.WARNING(
+                'the cache backend does not increment atomically: concurrent invalidations can be lost; '
+                'use Redis or memcached (CACHES)'))
+        self.stdout.write('hits: {hits}\nmisses: {misses}\nhit rate: {hit_rate:.1f}%'.format(**stats))
+        sample = getattr(settings, 'DASHBOARD_CACHE_STATS_SAMPLE', 1)
+        if sample > 1:
+            self.stdout.write('(sampled, one read in {0} counted)'.format(sample))
+        if options['reset']:
+            cache.reset_stats()
+            self.stdout.write(self.style.SUCCESS('Counters reset'))
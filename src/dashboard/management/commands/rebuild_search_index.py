@@ -0,0 +1,14 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from dashboard import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index of employees and leave reasons'
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        count = search.rebuild()
+        self.stdout.write(self.style.SUCCESS('Indexed {0} documents in {1:.1f}s'.format(count, time.perf_counter() - started)))
@@ -0,0 +1,47 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:45
+
+import django.core.serializers.json
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedConsumer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.SlugField(max_length=64, unique=True, verbose_name='Name')),
+                ('position', models.BigIntegerField(default=0, verbose_name='Position')),
+                ('updated', models.DateTimeField(auto_now=True, verbose_name='Updated')),
+            ],
+            options={
+                'verbose_name': 'Feed Consumer',
+                'verbose_name_plural': 'Feed Consumers',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='OutboxEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('topic', models.CharField(choices=[('leave', 'Leave'), ('employee', 'Employee')], max_length=12, verbose_name='Topic')),
+                ('key', models.BigIntegerField(verbose_name='Object id')),
+                ('action', models.CharField(max_length=12, verbose_name='Action')),
+                ('data', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder, verbose_name='Data')),
+                ('created', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Created')),
+            ],
+            options={
+                'verbose_name': 'Outbox Event',
+                'verbose_name_plural': 'Outbox Events',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['topic', 'id'], name='outbox_topic_idx'), models.Index(fields=['topic', 'key', 'id'], name='outbox_topic_key_idx'), models.Index(fields=['created'], name='outbox_created_idx')],
+            },
+        ),
+    ]
@@ -1,3 +1,59 @@
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
 
-# Create your models here.
+
+class OutboxEvent(models.Model):
+    '''
+    Append-only change log of leaves and employees, written by dashboard.signals
+    in the transaction of each change and read through the change feed
+    (dashboard.outbox); the id is the feed cursor.
+    '''
+    LEAVE = 'leave'
+    EMPLOYEE = 'employee'
+
+    TOPIC = (
+        (LEAVE, 'Leave'),
+        (EMPLOYEE, 'Employee'),
+    )
+
+    topic = models.CharField(_('Topic'), max_length=12, choices=TOPIC)
+    key = models.BigIntegerField(_('Object id'))
+    action = models.CharField(_('Action'), max_length=12) # created, updated, deleted or a leave transition
+    data = models.JSONField(_('Data'), encoder=DjangoJSONEncoder) # the object's fields after the change, {} once deleted
+    created = models.DateTimeField(_('Created'), default=timezone.now)
+
+    class Meta:
+        verbose_name = _('Outbox Event')
+        verbose_name_plural = _('Outbox Events')
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['topic', 'id'], name='outbox_topic_idx'),
+            # compaction looks for the latest event of each object
+            models.Index(fields=['topic', 'key', 'id'], name='outbox_topic_key_idx'),
+            # recent events (change feed gaps) and expired ones (retention)
+            models.Index(fields=['created'], name='outbox_created_idx'),
+        ]
+
+    def __str__(self):
+        return '{0} {1} {2} #{3}'.format(self.topic, self.key, self.action, self.id)
+
+
+class FeedConsumer(models.Model):
+    '''
+    Change feed offset of a consumer (payroll, rostering ...): the id of the
+    last event it has processed. Retention keeps events until every consumer
+    is past them.
+    '''
+    name = models.SlugField(_('Name'), max_length=64, unique=True)
+    position = models.BigIntegerField(_('Position'), default=0)
+    updated = models.DateTimeField(_('Updated'), auto_now=True)
+
+    class Meta:
+        verbose_name = _('Feed Consumer')
+        verbose_name_plural = _('Feed Consumers')
+        ordering = ['name']
+
+    def __str__(self):
+        return '{0} @ {1}'.format(self.name, self.position)
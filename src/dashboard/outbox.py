@@ -0,0 +1,173 @@
+"""
+Transactional outbox and change feed of leaves and employees.
+
+dashboard.signals appends an OutboxEvent for every Leave and Employee
+change from inside the transaction that makes it, so the log holds an
+event exactly when the change committed. Consumers page through the log
+by id ("events after X"), and may keep their offset here
+(FeedConsumer) instead of on their side.
+
+Ids are handed out when a row is inserted, not when its transaction
+commits: an event can become visible after a higher id has already been
+read. read() therefore stops before a gap in the ids until the events
+after it are OUTBOX_SETTLE_SECONDS old; an older gap is taken for a
+rolled back transaction (or compacted events) and skipped, so the
+setting must exceed the longest transaction that writes events.
+
+compact() keeps the table small: superseded events (the object changed
+again later) older than OUTBOX_COMPACT_AFTER_HOURS are dropped, and
+events older than OUTBOX_RETENTION_DAYS once every consumer read them.
+"""
+import datetime
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from employee.models import Employee
+from leave.models import Leave
+from .models import FeedConsumer, OutboxEvent
+
+
+LEAVE_FIELDS = ('id', 'user_id', 'startdate', 'enddate', 'leavetype', 'status', 'duration', 'reason', 'created', 'updated')
+EMPLOYEE_FIELDS = (
+    'id', 'user_id', 'employeeid', 'firstname', 'lastname', 'othername', 'birthday', 'department_id', 'role_id',
+    'religion_id', 'nationality_id', 'startdate', 'employeetype', 'is_blocked', 'is_deleted', 'created', 'updated',
+)
+TOPICS = {
+    OutboxEvent.LEAVE: (Leave, LEAVE_FIELDS),
+    OutboxEvent.EMPLOYEE: (Employee, EMPLOYEE_FIELDS),
+}
+BATCH_SIZE = 1000
+MAX_LIMIT = 1000
+
+
+# ---------------- writing ----------------
+
+def snapshot(instance):
+    '''
+    model instance -> its feed fields, as stored after the change
+    '''
+    _, fields = TOPICS[topic_of(instance.__class__)]
+    return {field: getattr(instance, field) for field in fields}
+
+
+def topic_of(model):
+    return OutboxEvent.LEAVE if issubclass(model, Leave) else OutboxEvent.EMPLOYEE
+
+
+def record(topic, action, rows):
+    '''
+    appends one event per row -> rows: [{field: value} including 'id'], written in one INSERT
+    '''
+    now = timezone.now()
+    OutboxEvent.objects.bulk_create(
+        [OutboxEvent(topic=topic, key=row['id'], action=action, data=row, created=now) for row in rows],
+        batch_size=BATCH_SIZE,
+    )
+
+
+def record_instance(instance, action):
+    data = snapshot(instance) if action != 'deleted' else {}
+    record(topic_of(instance.__class__), action, [dict(data, id=instance.pk)])
+
+
+def record_rows(topic, action, field, values):
+    '''
+    appends the events of rows written in bulk (UPDATE, bulk_create), selected by field__in=values
+    and read back with one SELECT per batch
+    '''
+    model, fields = TOPICS[topic]
+    values = list(values)
+    for start in range(0, len(values), BATCH_SIZE):
+        rows = model._base_manager.filter(**{field + '__in': values[start:start + BATCH_SIZE]}).order_by('pk').values(*fields)
+        record(topic, action, list(rows))
+
+
+# ---------------- reading ----------------
+
+def horizon(after):
+    '''
+    first id after `after` the feed must not reach yet -> id, or None when nothing is held back
+    only events younger than OUTBOX_SETTLE_SECONDS can sit behind a gap that may still fill
+    '''
+    recent = timezone.now() - datetime.timedelta(seconds=settings.OUTBOX_SETTLE_SECONDS)
+    previous = None
+    for id in OutboxEvent.objects.filter(id__gt=after, created__gt=recent).order_by('id').values_list('id', flat=True):
+        if id - 1 > after and id - 1 != previous:
+            if previous is not None or not OutboxEvent.objects.filter(id=id - 1).exists():
+                return id
+        previous = id
+    return None
+
+
+def read(after=0, limit=MAX_LIMIT, topic=None):
+    '''
+    events with id > after, oldest first -> [OutboxEvent], at most limit (capped at MAX_LIMIT)
+    stops before a recent gap in the ids, see the module docstring
+    '''
+    events = OutboxEvent.objects.filter(id__gt=after).order_by('id')
+    if topic:
+        events = events.filter(topic=topic)
+    stop = horizon(after)
+    if stop is not None:
+        events = events.filter(id__lt=stop)
+    return list(events[:max(1, min(limit, MAX_LIMIT))])
+
+
+def serialize(event):
+    '''
+    OutboxEvent -> one compact JSON line (no trailing newline)
+    '''
+    return json.dumps({
+        'id': event.id, 'topic': event.topic, 'key': event.key, 'action': event.action,
+        'at': event.created, 'data': event.data,
+    }, cls=DjangoJSONEncoder, separators=(',', ':'))
+
+
+# ---------------- consumers ----------------
+
+def position(name):
+    consumer = FeedConsumer.objects.filter(name=name).first()
+    return consumer.position if consumer else 0
+
+
+def acknowledge(name, position):
+    '''
+    moves a consumer's offset forward to position (never back) -> stored position
+    '''
+    consumer, _ = FeedConsumer.objects.get_or_create(name=name)
+    FeedConsumer.objects.filter(pk=consumer.pk, position__lt=position).update(position=position, updated=timezone.now())
+    return FeedConsumer.objects.values_list('position', flat=True).get(pk=consumer.pk)
+
+
+# ---------------- compaction ----------------
+
+def _delete(queryset):
+    deleted = 0
+    while True:
+        ids = list(queryset.values_list('id', flat=True)[:BATCH_SIZE])
+        if not ids:
+            return deleted
+        deleted += OutboxEvent.objects.filter(id__in=ids).delete()[0]
+
+
+def compact(now=None):
+    '''
+    drops superseded and expired events -> (superseded deleted, expired deleted)
+    '''
+    now = now or timezone.now()
+
+    latest = OutboxEvent.objects.values('topic', 'key').annotate(last=Max('id')).values('last')
+    superseded = OutboxEvent.objects.filter(
+        created__lt=now - datetime.timedelta(hours=settings.OUTBOX_COMPACT_AFTER_HOURS),
+    ).exclude(id__in=latest)
+    compacted = _delete(superseded)
+
+    expired = OutboxEvent.objects.filter(created__lt=now - datetime.timedelta(days=settings.OUTBOX_RETENTION_DAYS))
+    slowest = FeedConsumer.objects.aggregate(position=Min('position'))['position']
+    if slowest is not None:
+        expired = expired.filter(id__lte=slowest)
+    return compacted, _delete(expired)
@@ -0,0 +1,185 @@
+"""
+Keyset (cursor) pagination.
+
+Instead of COUNT(*) plus a growing OFFSET, each page is fetched with a
+WHERE on the ordering key of the last (or first) row of the current
+page, so deep pages cost the same as the first one. Pages link to each
+other through opaque tokens that carry that key.
+"""
+import base64
+import json
+
+from django.db.models import Q
+
+
+class KeysetPage:
+    def __init__(self, object_list, has_next, has_previous, paginator):
+        self.object_list = object_list
+        self.has_next = has_next
+        self.has_previous = has_previous
+        self.paginator = paginator
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+    @property
+    def next_token(self):
+        if self.has_next and self.object_list:
+            return self.paginator.encode(self.object_list[-1], 'next')
+        return ''
+
+    @property
+    def previous_token(self):
+        if self.has_previous and self.object_list:
+            return self.paginator.encode(self.object_list[0], 'previous')
+        return ''
+
+
+class KeysetPaginator:
+    """
+    KeysetPaginator(queryset, 15).get_page(request.GET.get('cursor'))
+
+    `ordering` must end in a unique field (the primary key by default) so
+    every row has a distinct key; its fields must not be NULL.
+    """
+
+    def __init__(self, queryset, per_page, ordering=('-created', '-id')):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = list(ordering)
+        self.fields = [field.lstrip('-') for field in self.ordering]
+
+    # ---------------- tokens ----------------
+
+    def encode(self, obj, direction):
+        if isinstance(obj, dict):
+            # a .values() row, which must include the ordering fields
+            obj = self.queryset.model(**{field: obj[field] for field in self.fields})
+        key = [self.queryset.model._meta.get_field(field).value_to_string(obj) for field in self.fields]
+        data = json.dumps({'k': key, 'd': direction}, separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(data).decode().rstrip('=')
+
+    def decode(self, token):
+        '''
+        token -> (key values, direction), or None for a missing or tampered token
+        '''
+        if not token:
+            return None
+        try:
+            data = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+            direction = data['d']
+            values = [
+                self.queryset.model._meta.get_field(field).to_python(value)
+                for field, value in zip(self.fields, data['k'])
+            ]
+        except (ValueError, KeyError, TypeError, AttributeError):
+            return None
+        if direction not in ('next', 'previous') or len(values) != len(self.fields):
+            return None
+        return values, direction
+
+    # ---------------- pages ----------------
+
+    def _after(self, values, ordering):
+        '''
+        rows that sort after `values` under `ordering`, as a single Q
+        '''
+        condition = Q()
+        for index, field in enumerate(ordering):
+            name = field.lstrip('-')
+            lookup = '{0}__{1}'.format(name, 'lt' if field.startswith('-') else 'gt')
+            equal = {self.fields[i]: values[i] for i in range(index)}
+            condition |= Q(**equal) & Q(**{lookup: values[index]})
+        return condition
+
+    def get_page(self, token=None):
+        decoded = self.decode(token)
+        if decoded is None:
+            rows = list(self.queryset.order_by(*self.ordering)[:self.per_page + 1])
+            return KeysetPage(rows[:self.per_page], len(rows) > self.per_page, False, self)
+
+        values, direction = decoded
+        if direction == 'next':
+            rows = list(self.queryset.filter(self._after(values, self.ordering)).order_by(*self.ordering)[:self.per_page + 1])
+            return KeysetPage(rows[:self.per_page], len(rows) > self.per_page, True, self)
+
+        reverse = [field[1:] if field.startswith('-') else '-' + field for field in self.ordering]
+        rows = list(self.queryset.filter(self._after(values, reverse)).order_by(*reverse)[:self.per_page + 1])
+        has_previous = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        rows.reverse()
+        return KeysetPage(rows, True, has_previous, self)
+
+    def count(self, limit=None):
+        '''
+        exact number of rows, or when limit is given at most limit + 1
+        (anything above limit means "more than limit") so the COUNT stays bounded
+        '''
+        queryset = self.queryset.order_by()
+        if limit is not None:
+            queryset = queryset[:limit + 1]
+        return queryset.count()
+
+
+class RankedPaginator:
+    """
+    RankedPaginator(queryset, ranked_pks, 15).get_page(request.GET.get('cursor'))
+
+    Pages over search results in rank order: ranked_pks (best first, bounded
+    by the search limit) narrowed to the rows of queryset. Tokens carry the
+    primary key of the row a page continues from, like KeysetPaginator's.
+    """
+
+    def __init__(self, queryset, ranked_pks, per_page):
+        self.queryset = queryset
+        self.ranked_pks = list(ranked_pks)
+        self.per_page = per_page
+        self._pks = None
+
+    @property
+    def pks(self):
+        '''
+        ranked_pks still in queryset (other filters may drop some), in rank order
+        '''
+        if self._pks is None:
+            present = set(self.queryset.filter(pk__in=self.ranked_pks).values_list('pk', flat=True))
+            self._pks = [pk for pk in self.ranked_pks if pk in present]
+        return self._pks
+
+    def encode(self, obj, direction):
+        data = json.dumps({'k': obj.pk, 'd': direction}, separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(data).decode().rstrip('=')
+
+    def decode(self, token):
+        '''
+        token -> (position of its row, direction), or None for a missing, tampered or stale token
+        '''
+        if not token:
+            return None
+        try:
+            data = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+            return self.pks.index(data['k']), data['d']
+        except (ValueError, KeyError, TypeError, AttributeError):
+            return None
+
+    def get_page(self, token=None):
+        decoded = self.decode(token)
+        if decoded is None:
+            start = 0
+        elif decoded[1] == 'next':
+            start = decoded[0] + 1
+        else:
+            start = max(decoded[0] - self.per_page, 0)
+        end = decoded[0] if decoded and decoded[1] == 'previous' else start + self.per_page
+        page = self.pks[start:end]
+        rows = self.queryset.in_bulk(page)
+        return KeysetPage([rows[pk] for pk in page if pk in rows], end < len(self.pks), start > 0, self)
+
+    def count(self, limit=None):
+        return len(self.pks)
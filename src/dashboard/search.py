@@ -0,0 +1,157 @@
+"""
+Full-text search over employees and leave reasons.
+
+Documents are kept in an SQLite FTS5 table in a file of its own
+(settings.SEARCH_INDEX), independent of the project database. Each
+model row maps to one document whose rowid is derived from its primary
+key, so updates and deletes touch a single row of the index.
+dashboard.signals keeps the index current on save and delete; the
+rebuild_search_index command fills it from scratch.
+
+    search.search('jane', 'employee')            -> [employee pk, ...] best first
+    search.search('flu', 'leave', owner=user.pk) -> [leave pk, ...] best first
+"""
+import re
+import sqlite3
+import threading
+
+from django.conf import settings
+
+from employee.models import Employee
+from leave.models import Leave
+
+
+KINDS = ('employee', 'leave')
+TOKEN = re.compile(r'\w+')
+BATCH_SIZE = 2000
+
+SCHEMA = '''
+CREATE VIRTUAL TABLE IF NOT EXISTS documents USING fts5(
+    title, body, kind UNINDEXED, owner UNINDEXED,
+    tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+)
+'''
+
+_local = threading.local()
+
+
+def connection():
+    '''
+    one connection per thread, reopened when settings.SEARCH_INDEX changes
+    '''
+    path = settings.SEARCH_INDEX
+    if getattr(_local, 'path', None) != path:
+        db = sqlite3.connect(path)
+        db.execute('PRAGMA journal_mode=WAL')
+        db.execute('PRAGMA synchronous=NORMAL')
+        db.execute(SCHEMA)
+        _local.path, _local.db = path, db
+    return _local.db
+
+
+def _rowid(kind, pk):
+    return pk * len(KINDS) + KINDS.index(kind)
+
+
+# ---------------- documents ----------------
+
+def employee_document(employee):
+    '''
+    -> (title, body, owner); the employee ID is indexed as stored (RGL/A0/091),
+    compacted (RGLA0091) and as typed before code_format (A0091)
+    '''
+    code = employee.employeeid or ''
+    compact = code.replace('/', '')
+    body = [code, compact, compact[3:] if compact.startswith('RGL') else '']
+    body += [related.name for related in (employee.department, employee.role) if related]
+    return employee.get_full_name, ' '.join(body), employee.user_id
+
+
+def leave_document(leave):
+    return leave.reason or '', leave.get_leavetype_display() or '', leave.user_id
+
+
+# ---------------- updates ----------------
+
+def index_employees(employees):
+    '''
+    (re)indexes employees, deleted ones are dropped from the index
+    '''
+    employees = list(employees)
+    rows = [
+        (_rowid('employee', employee.pk),) + employee_document(employee) + ('employee',)
+        for employee in employees if not employee.is_deleted
+    ]
+    db = connection()
+    with db:
+        remove('employee', [employee.pk for employee in employees if employee.is_deleted])
+        db.executemany('INSERT OR REPLACE INTO documents(rowid, title, body, owner, kind) VALUES (?, ?, ?, ?, ?)', rows)
+
+
+def index_leaves(leaves):
+    rows = [(_rowid('leave', leave.pk),) + leave_document(leave) + ('leave',) for leave in leaves]
+    db = connection()
+    with db:
+        db.executemany('INSERT OR REPLACE INTO documents(rowid, title, body, owner, kind) VALUES (?, ?, ?, ?, ?)', rows)
+
+
+def remove(kind, pks):
+    db = connection()
+    with db:
+        db.executemany('DELETE FROM documents WHERE rowid = ?', [(_rowid(kind, pk),) for pk in pks])
+
+
+def rebuild():
+    '''
+    reindexes every active employee and every leave -> documents written
+    '''
+    db = connection()
+    with db:
+        db.execute('DELETE FROM documents')
+
+    written = 0
+    employees = Employee.objects.order_by().select_related('department', 'role').only(
+        'id', 'user_id', 'firstname', 'lastname', 'othername', 'employeeid', 'is_deleted',
+        'department__name', 'role__name',
+    )
+    leaves = Leave.objects.order_by().only('id', 'user_id', 'reason', 'leavetype')
+    for queryset, index in ((employees, index_employees), (leaves, index_leaves)):
+        batch = []
+        for obj in queryset.iterator(chunk_size=BATCH_SIZE):
+            batch.append(obj)
+            if len(batch) == BATCH_SIZE:
+                index(batch)
+                written, batch = written + len(batch), []
+        index(batch)
+        written += len(batch)
+
+    with db:
+        db.execute("INSERT INTO documents(documents) VALUES ('optimize')")
+    return written
+
+
+# ---------------- queries ----------------
+
+def match_expression(query):
+    '''
+    user input -> FTS5 expression; every word must match, as a prefix
+    '''
+    return ' '.join('"{0}"*'.format(token) for token in TOKEN.findall(query))
+
+
+def search(query, kind, owner=None, limit=50):
+    '''
+    primary keys of the `kind` documents matching query, best (bm25, titles
+    weighted 10x) first
+    '''
+    expression = match_expression(query)
+    if not expression:
+        return []
+    sql = 'SELECT rowid FROM documents WHERE documents MATCH ? AND kind = ?'
+    params = [expression, kind]
+    if owner is not None:
+        sql += ' AND owner = ?'
+        params.append(owner)
+    sql += ' ORDER BY bm25(documents, 10.0, 1.0) LIMIT ?'
+    params.append(limit)
+    return [rowid // len(KINDS) for rowid, in connection().execute(sql, params)]
@@ -0,0 +1,249 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from employee.models import Department, Employee, Nationality, Religion, Role
+from employee.signals import employees_imported
+from leave.models import Leave, LeaveBalance
+from leave.rollups import departments_of, state_of
+from leave.durations import leaves_recounted
+from leave.signals import leave_totals_rebuilt, leaves_transitioned
+from . import availability, cache, outbox, search
+from .models import OutboxEvent
+
+
+@receiver(post_save, sender=Leave)
+@receiver(post_delete, sender=Leave)
+def invalidate_user_dashboard(sender, instance, **kwargs):
+    '''
+    bumps the dashboard version of the leave's user (and of the previous
+    user when the leave was reassigned) once the change is committed
+    '''
+    user_ids = {instance.user_id}
+    stored_state = getattr(instance, '_stored_state', None)
+    if stored_state:
+        user_ids.add(stored_state['user_id'])
+
+    def bump():
+        for user_id in user_ids:
+            cache.bump_user_version(user_id)
+        cache.bump_global_version()
+
+    transaction.on_commit(bump)
+
+
+@receiver(leaves_transitioned, sender=Leave)
+def invalidate_transitioned_dashboards(sender, user_ids, **kwargs):
+    '''
+    one call per transition batch, bumped once the batch commits
+    '''
+    def bump():
+        for user_id in user_ids:
+            cache.bump_user_version(user_id)
+        cache.bump_global_version()
+
+    transaction.on_commit(bump)
+
+
+@receiver(leaves_recounted, sender=Leave)
+@receiver(leave_totals_rebuilt, sender=Leave)
+def invalidate_rebuilt_dashboards(sender, user_ids, **kwargs):
+    '''
+    durations, rollups and the ledger rewritten in bulk (no post_save): the users'
+    dashboards, everyone's when user_ids is None, and the organisation-wide pages
+    '''
+    def bump():
+        for user_id in (User.objects.values_list('pk', flat=True).iterator() if user_ids is None else user_ids):
+            cache.bump_user_version(user_id)
+        cache.bump_global_version()
+
+    transaction.on_commit(bump)
+
+
+@receiver(post_save, sender=Employee)
+@receiver(post_delete, sender=Employee)
+@receiver(post_save, sender=Department)
+@receiver(post_delete, sender=Department)
+@receiver(post_save, sender=Role)
+@receiver(post_delete, sender=Role)
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+@receiver(employees_imported, sender=Employee)
+def invalidate_global_pages(sender, **kwargs):
+    '''
+    organisation-wide pages (admin dashboard, pending list) show employee, department and user names
+    '''
+    transaction.on_commit(cache.bump_global_version)
+
+
+@receiver(post_save, sender=LeaveBalance)
+def invalidate_user_dashboard_balance(sender, instance, **kwargs):
+    '''
+    entitlement edits in the admin change the dashboard too
+    '''
+    user_id = instance.user_id
+    transaction.on_commit(lambda: cache.bump_user_version(user_id))
+
+
+
+# ---------------- search index ----------------
+
+@receiver(post_save, sender=Employee)
+def index_employee(sender, instance, raw=False, **kwargs):
+    if not raw:
+        transaction.on_commit(lambda: search.index_employees([instance]))
+
+
+@receiver(post_delete, sender=Employee)
+def unindex_employee(sender, instance, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(lambda: search.remove('employee', [pk]))
+
+
+@receiver(employees_imported, sender=Employee)
+def index_imported_employees(sender, user_ids, **kwargs):
+    '''
+    bulk_create sends no post_save, the import is indexed in batches once it commits
+    '''
+    def index():
+        employees = Employee.objects.select_related('department', 'role')
+        for start in range(0, len(user_ids), search.BATCH_SIZE):
+            search.index_employees(employees.filter(user_id__in=user_ids[start:start + search.BATCH_SIZE]))
+
+    transaction.on_commit(index)
+
+
+@receiver(post_save, sender=Leave)
+def index_leave(sender, instance, raw=False, **kwargs):
+    if not raw:
+        transaction.on_commit(lambda: search.index_leaves([instance]))
+
+
+@receiver(post_delete, sender=Leave)
+def unindex_leave(sender, instance, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(lambda: search.remove('leave', [pk]))
+
+
+@receiver(post_save, sender=Department)
+@receiver(post_save, sender=Role)
+@receiver(pre_delete, sender=Department)
+@receiver(pre_delete, sender=Role)
+def reindex_employees_of(sender, instance, raw=False, **kwargs):
+    '''
+    department and role names are part of the employee documents; on delete the
+    employees are collected before SET_NULL detaches them
+    '''
+    if raw:
+        return
+    field = 'department' if sender is Department else 'role'
+    pks = list(Employee.objects.filter(**{field: instance}).values_list('pk', flat=True))
+    if pks:
+        transaction.on_commit(lambda: search.index_employees(
+            Employee.objects.all_employees().select_related('department', 'role').filter(pk__in=pks)))
+
+
+
+# ---------------- team availability ----------------
+
+def bump_departments_of(user_ids):
+    for department_id in set(departments_of(user_ids).values()):
+        availability.bump_department(department_id)
+
+
+@receiver(post_save, sender=Leave)
+@receiver(post_delete, sender=Leave)
+def invalidate_leave_availability(sender, instance, raw=False, **kwargs):
+    '''
+    only saves that change a leave's status, dates or user reach the calendars
+    '''
+    if raw:
+        return
+    stored_state = getattr(instance, '_stored_state', None)
+    if kwargs.get('created') is False and stored_state == state_of(instance):
+        return
+    user_ids = {instance.user_id}
+    if stored_state:
+        user_ids.add(stored_state['user_id'])
+    transaction.on_commit(lambda: bump_departments_of(user_ids))
+
+
+@receiver(leaves_transitioned, sender=Leave)
+def invalidate_transitioned_availability(sender, user_ids, **kwargs):
+    transaction.on_commit(lambda: bump_departments_of(user_ids))
+
+
+@receiver(post_save, sender=Employee)
+@receiver(post_delete, sender=Employee)
+@receiver(post_save, sender=Department)
+@receiver(post_delete, sender=Department)
+def invalidate_all_availability(sender, raw=False, **kwargs):
+    '''
+    people change departments (or lose them), every calendar may be affected
+    '''
+    if not raw:
+        transaction.on_commit(availability.bump_all)
+
+
+@receiver(employees_imported, sender=Employee)
+def invalidate_imported_availability(sender, **kwargs):
+    transaction.on_commit(availability.bump_all)
+
+
+
+# ---------------- change feed ----------------
+# written in the transaction of the change, not on commit: the outbox is part of it
+
+@receiver(post_save, sender=Leave)
+@receiver(post_save, sender=Employee)
+def record_saved(sender, instance, created=False, raw=False, **kwargs):
+    if not raw:
+        outbox.record_instance(instance, 'created' if created else 'updated')
+
+
+@receiver(post_delete, sender=Leave)
+@receiver(post_delete, sender=Employee)
+def record_deleted(sender, instance, **kwargs):
+    outbox.record_instance(instance, 'deleted')
+
+
+@receiver(leaves_transitioned, sender=Leave)
+def record_transitioned(sender, action, pks, **kwargs):
+    outbox.record_rows(OutboxEvent.LEAVE, action, 'pk', pks)
+
+
+@receiver(employees_imported, sender=Employee)
+def record_imported(sender, user_ids, **kwargs):
+    outbox.record_rows(OutboxEvent.EMPLOYEE, 'created', 'user_id', user_ids)
+
+
+@receiver(leaves_recounted, sender=Leave)
+def record_recounted(sender, pks, **kwargs):
+    outbox.record_rows(OutboxEvent.LEAVE, 'updated', 'pk', pks)
+
+
+DETACHED_BY = {Department: 'department', Role: 'role', Religion: 'religion', Nationality: 'nationality'}
+
+
+@receiver(pre_delete, sender=Department)
+@receiver(pre_delete, sender=Role)
+@receiver(pre_delete, sender=Religion)
+@receiver(pre_delete, sender=Nationality)
+def collect_detached_employees(sender, instance, **kwargs):
+    '''
+    SET_NULL detaches the employees with one UPDATE and no post_save: collect them
+    before it runs, record them once it has
+    '''
+    instance._detached_employees = list(
+        Employee.objects.all_employees().filter(**{DETACHED_BY[sender]: instance}).values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Department)
+@receiver(post_delete, sender=Role)
+@receiver(post_delete, sender=Religion)
+@receiver(post_delete, sender=Nationality)
+def record_detached_employees(sender, instance, **kwargs):
+    pks = getattr(instance, '_detached_employees', None)
+    if pks:
+        outbox.record_rows(OutboxEvent.EMPLOYEE, 'updated', 'pk', pks)
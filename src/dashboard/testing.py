@@ -0,0 +1,22 @@
+import os
+import shutil
+import tempfile
+
+from django.test import override_settings
+
+
+class TemporarySearchIndex:
+    '''
+    test case mixin: SEARCH_INDEX points into a temporary directory for the whole
+    class and the directory is removed afterwards; for tests whose on_commit
+    callbacks run (and so feed dashboard.search)
+    '''
+
+    @classmethod
+    def setUpClass(cls):
+        directory = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, directory, ignore_errors=True)
+        index = override_settings(SEARCH_INDEX=os.path.join(directory, 'search.sqlite3'))
+        index.enable()
+        cls.addClassCleanup(index.disable)
+        super().setUpClass()
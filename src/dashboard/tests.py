@@ -1,3 +1,729 @@
-from django.test import TestCase
+import csv
+import datetime
+import io
+import json
+import os
+import shutil
+import tempfile
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache as django_cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from employee.importer import import_employees
+from employee.models import Department, Employee, Role
+from leave import durations, transitions
+from leave.models import Leave, LeaveStatistic
+
+from . import aggregates, availability, cache, checks, exports, outbox, search
+from .models import FeedConsumer, OutboxEvent
+from .pagination import KeysetPaginator, RankedPaginator
+from .testing import TemporarySearchIndex
+from .views import get_superuser_dashboard_data, get_user_dashboard_data
+
+try:
+    import openpyxl
+except ModuleNotFoundError:
+    openpyxl = None
+
+
+def make_employee(username, department):
+    user = User.objects.create(username=username)
+    employee = Employee.objects.create(
+        user=user, firstname=username, lastname='Test',
+        birthday=datetime.date(1990, 1, 1), department=department,
+    )
+    return user, employee
+
+
+@override_settings(LEAVE_WORK_WEEKS={None: 'Mon Tue Wed Thu Fri Sat Sun'}, LEAVE_HOLIDAY_COUNTRY=None) # today may be a weekend
+class AggregatesTest(TestCase):
+
+    def setUp(self):
+        today = datetime.date.today()
+        self.departments = [Department.objects.create(name='dept {0}'.format(i)) for i in range(3)]
+        for index, department in enumerate(self.departments):
+            user, _ = make_employee('user{0}'.format(index), department)
+            Leave.objects.create(user=user, startdate=today, enddate=today, status='pending')
+            Leave.objects.create(user=user, startdate=today, enddate=today, status='approved', leavetype='casual')
+
+    def test_status_counts(self):
+        counts = aggregates.status_counts(Leave.objects.all())
+        self.assertEqual(counts, {'total': 6, 'pending': 3, 'approved': 3, 'rejected': 0, 'cancelled': 0})
+
+    def test_type_counts(self):
+        self.assertEqual(aggregates.type_counts(Leave.objects.all()), {'sick': 3, 'casual': 3})
+        self.assertEqual(aggregates.type_counts(Leave.objects.all(), display=True), {'Sick Leave': 3, 'Casual Leave': 3})
+
+    def test_monthly_counts(self):
+        monthly = aggregates.monthly_counts(Leave.objects.all())
+        self.assertEqual(len(monthly), 12)
+        self.assertEqual(monthly[datetime.date.today().month - 1]['count'], 6)
+
+    def test_department_stats(self):
+        stats = aggregates.department_stats()
+        self.assertEqual(len(stats), 3)
+        self.assertEqual(stats[0], {'name': 'dept 0', 'employees': 1, 'leaves': 2, 'pending': 1, 'approved': 1})
+
+    def test_day_totals(self):
+        self.assertEqual(aggregates.day_totals(Leave.objects.all()), {'total_days': 6, 'average_days': 1.0})
+        self.assertEqual(aggregates.type_days(Leave.objects.all()), {'sick': 3, 'casual': 3})
+        self.assertEqual(aggregates.type_days(LeaveStatistic.objects.all()), {'sick': 3, 'casual': 3})
+
+    def test_rollups_match_leave_table(self):
+        self.assertEqual(aggregates.status_counts(LeaveStatistic.objects.all()), aggregates.status_counts(Leave.objects.all()))
+        self.assertEqual(aggregates.type_counts(LeaveStatistic.objects.all()), aggregates.type_counts(Leave.objects.all()))
+        self.assertEqual(aggregates.monthly_counts(LeaveStatistic.objects.all()), aggregates.monthly_counts(Leave.objects.all()))
+        self.assertEqual(aggregates.department_stats(LeaveStatistic.objects.all()), aggregates.department_stats())
+
+    def test_superuser_dashboard_query_count_is_constant(self):
+        with self.assertNumQueries(7):
+            get_superuser_dashboard_data()
+
+        for index in range(20):
+            make_employee('extra{0}'.format(index), Department.objects.create(name='extra {0}'.format(index)))
+
+        with self.assertNumQueries(7):
+            get_superuser_dashboard_data()
+
+
+class UserDashboardCacheTest(TemporarySearchIndex, TestCase):
+
+    def setUp(self):
+        django_cache.clear()
+        self.user, _ = make_employee('kofi', Department.objects.create(name='Sales'))
+        self.other, _ = make_employee('esi', Department.objects.create(name='Audit'))
+        today = datetime.date.today()
+        self.leave = Leave.objects.create(user=self.user, startdate=today, enddate=today)
+
+    @override_settings(DASHBOARD_CACHE_STATS_SAMPLE=1)
+    def test_second_read_is_a_cache_hit(self):
+        get_user_dashboard_data(self.user)
+        with self.assertNumQueries(0):
+            dataset = get_user_dashboard_data(self.user)
+        self.assertEqual(dataset['pending_leaves'], 1)
+        self.assertEqual(cache.stats()['hits'], 1)
+        self.assertEqual(cache.stats()['misses'], 1)
+
+    @override_settings(DASHBOARD_CACHE_STATS_SAMPLE=4)
+    def test_sampled_reads_are_counted_with_their_weight(self):
+        with mock.patch('dashboard.cache.random.randrange', side_effect=[0, 0, 3]):
+            for _ in range(3):
+                get_user_dashboard_data(self.user)
+        self.assertEqual((cache.stats()['misses'], cache.stats()['hits']), (4, 4))
+
+    def test_transition_invalidates_only_that_user(self):
+        get_user_dashboard_data(self.user)
+        get_user_dashboard_data(self.other)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.leave.approve_leave
+
+        self.assertEqual(get_user_dashboard_data(self.user)['approved_leaves'], 1)
+        with self.assertNumQueries(0):
+            get_user_dashboard_data(self.other)
+
+    def test_rebuilds_and_recounts_invalidate_the_dashboards(self):
+        versions = cache.user_version(self.user.pk), cache.user_version(self.other.pk), cache.version(cache.GLOBAL_VERSION_KEY)
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('rebuild_leave_balances', stdout=io.StringIO())
+        rebuilt = cache.user_version(self.user.pk), cache.user_version(self.other.pk), cache.version(cache.GLOBAL_VERSION_KEY)
+        self.assertTrue(all(after > before for before, after in zip(versions, rebuilt)))
+
+        Leave.objects.filter(pk=self.leave.pk).update(duration=9) # counted under other settings
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(durations.recount(), 1)
+        self.assertGreater(cache.user_version(self.user.pk), rebuilt[0])
+        self.assertEqual(cache.user_version(self.other.pk), rebuilt[1])
+
+    @override_settings(DASHBOARD_CACHE_STATS_SAMPLE=1)
+    def test_stats_command_names_the_backend_and_its_limits(self):
+        get_user_dashboard_data(self.user)
+        get_user_dashboard_data(self.user)
+        stdout, stderr = io.StringIO(), io.StringIO()
+        call_command('dashboard_cache_stats', stdout=stdout, stderr=stderr)
+        self.assertIn('backend: django.core.cache.backends.locmem.LocMemCache', stdout.getvalue())
+        self.assertIn('hits: 1\nmisses: 1', stdout.getvalue())
+        self.assertIn('process-local', stderr.getvalue())
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        with self.settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': directory}}):
+            stderr = io.StringIO()
+            call_command('dashboard_cache_stats', stdout=stdout, stderr=stderr)
+            self.assertIn('atomically', stderr.getvalue())
+
+    def test_deploy_check_requires_a_shared_atomic_backend(self):
+        self.assertEqual([error.id for error in checks.check_shared_cache(None)], ['dashboard.E001'])
+        with self.settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://localhost'}}):
+            self.assertEqual(checks.check_shared_cache(None), [])
+
+
+class KeysetPaginatorTest(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(username='abena')
+        today = datetime.date.today()
+        Leave.objects.bulk_create([Leave(user=self.user, startdate=today, enddate=today, duration=1) for _ in range(7)])
+        # identical timestamps make the id tie-breaker matter
+        Leave.objects.update(created=timezone.now())
+        self.expected = list(Leave.objects.order_by('-created', '-id').values_list('id', flat=True))
+
+    def ids(self, page):
+        return [leave.id for leave in page]
+
+    def test_walks_forward_and_back(self):
+        paginator = KeysetPaginator(Leave.objects.filter(user=self.user), 3)
+        first = paginator.get_page(None)
+        second = paginator.get_page(first.next_token)
+        third = paginator.get_page(second.next_token)
+
+        self.assertEqual(self.ids(first) + self.ids(second) + self.ids(third), self.expected)
+        self.assertEqual((first.has_previous, first.has_next), (False, True))
+        self.assertEqual((third.has_previous, third.has_next), (True, False))
+
+        back = paginator.get_page(third.previous_token)
+        self.assertEqual(self.ids(back), self.ids(second))
+        self.assertEqual(self.ids(paginator.get_page(back.previous_token)), self.ids(first))
+        self.assertFalse(paginator.get_page(back.previous_token).has_previous)
+
+    def test_ranked_pages_keep_the_rank_order(self):
+        ranked = [self.expected[index] for index in (3, 0, 6, 5, 1, 2)] # one leave did not match
+        paginator = RankedPaginator(Leave.objects.exclude(pk=ranked[2]), ranked, 2)
+        first = paginator.get_page(None)
+        second = paginator.get_page(first.next_token)
+        third = paginator.get_page(second.next_token)
+
+        self.assertEqual(self.ids(first) + self.ids(second) + self.ids(third), ranked[:2] + ranked[3:])
+        self.assertEqual((third.has_previous, third.has_next), (True, False))
+        self.assertEqual(self.ids(paginator.get_page(third.previous_token)), self.ids(second))
+        self.assertEqual(paginator.count(), 5)
+
+    def test_bad_token_falls_back_to_first_page(self):
+        paginator = KeysetPaginator(Leave.objects.all(), 3)
+        self.assertEqual(self.ids(paginator.get_page('not-a-token')), self.expected[:3])
+
+    def test_capped_count(self):
+        paginator = KeysetPaginator(Leave.objects.all(), 3)
+        self.assertEqual(paginator.count(), 7)
+        self.assertEqual(paginator.count(limit=5), 6)
+
+    def test_leave_history_page(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('dashboard:leave_history'), {'status': 'pending'})
+        self.assertEqual(len(response.context['leaves']), 7)
+        self.assertEqual(response.context['summary']['total'], 7)
+
+    def test_leave_history_summary_is_one_query_and_memoised(self):
+        django_cache.clear()
+        self.client.force_login(self.user)
+        url = reverse('dashboard:leave_history')
+        self.client.get(url)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.context['summary']['statuses']['pending'], 7)
+        self.assertFalse(any('SUM' in query['sql'] for query in queries.captured_queries))
+
+    def test_summary(self):
+        self.assertEqual(aggregates.summary(Leave.objects.all()), {
+            'total': 7, 'total_days': 7,
+            'statuses': {'pending': 7, 'approved': 0, 'rejected': 0, 'cancelled': 0},
+            'types': {'sick': 7},
+        })
+
+
+class LeaveTableQueryCountTest(TestCase):
+    '''
+    every leave table renders with the same number of queries for 2 or 20 rows
+    '''
+
+    def setUp(self):
+        self.admin = User.objects.create(username='admin', is_staff=True, is_superuser=True)
+        self.department = Department.objects.create(name='Ops')
+
+    def add_leaves(self, count):
+        today = datetime.date.today()
+        for index in range(count):
+            user, _ = make_employee('staff{0}'.format(Leave.objects.count()), self.department)
+            for status in aggregates.STATUSES:
+                Leave.objects.create(user=user, startdate=today, enddate=today, status=status,
+                                     is_rejected=(status == 'rejected'))
+            Leave.objects.create(user=self.admin, startdate=today, enddate=today)
+
+    def queries_for(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_leave_tables_have_fixed_query_count(self):
+        self.client.force_login(self.admin)
+        urls = [reverse('dashboard:' + name) for name in
+                ('leaveslist', 'approvedleaveslist', 'canceleaveslist', 'leavesrejected', 'staffleavetable')]
+
+        self.add_leaves(2)
+        few = [self.queries_for(url) for url in urls]
+        self.add_leaves(18)
+        many = [self.queries_for(url) for url in urls]
+        self.assertEqual(few, many)
+
+    def test_pretty_leave_resolved_in_one_query(self):
+        self.add_leaves(3)
+        employee = Employee.objects.get(user__username='staff0')
+        employee.othername = 'Q'
+        employee.save()
+
+        with self.assertNumQueries(1):
+            pretty = [leave.pretty_leave for leave in Leave.objects.for_list()]
+        self.assertEqual(len(pretty), 15)
+        self.assertIn('{0} - sick'.format(employee.get_full_name), pretty)
+        self.assertIn('Unknown Employee - sick', pretty)
+
+        leave = Leave.objects.filter(user=employee.user).first()
+        self.assertEqual(Leave.objects.with_employee().get(pk=leave.pk).pretty_leave, leave.pretty_leave)
+
+
+class SearchIndexTest(TestCase):
+    '''
+    the FTS5 index follows saves and deletes once they commit
+    '''
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.settings_override = override_settings(SEARCH_INDEX=os.path.join(directory, 'search.sqlite3'))
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        self.department = Department.objects.create(name='Finance')
+
+    def create_employee(self, username, **fields):
+        with self.captureOnCommitCallbacks(execute=True):
+            user, employee = make_employee(username, self.department)
+            for name, value in fields.items():
+                setattr(employee, name, value)
+            employee.save()
+        return user, employee
+
+    def test_employee_documents(self):
+        _, jane = self.create_employee('jane', employeeid='A0091', othername='Amara')
+        _, john = self.create_employee('john')
+
+        self.assertEqual(jane.employeeid, 'RGL/A0/091')
+        self.assertEqual(search.search('jan', 'employee'), [jane.pk])
+        self.assertEqual(search.search('amara test', 'employee'), [jane.pk])
+        for code in ('A0091', 'RGLA0091', 'RGL/A0/091'):
+            self.assertEqual(search.search(code, 'employee'), [jane.pk])
+        self.assertEqual(set(search.search('finance', 'employee')), {jane.pk, john.pk})
+        self.assertEqual(search.search('finance', 'leave'), [])
+        self.assertEqual(search.search('"*', 'employee'), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.department.name = 'Treasury'
+            self.department.save()
+            john.role = Role.objects.create(name='Auditor')
+            john.save()
+        self.assertEqual(search.search('finance', 'employee'), [])
+        self.assertEqual(set(search.search('treasury', 'employee')), {jane.pk, john.pk})
+        self.assertEqual(search.search('auditor', 'employee'), [john.pk])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            john.is_deleted = True
+            john.save()
+            jane.delete()
+        self.assertEqual(search.search('treasury', 'employee'), [])
+
+    def test_leave_reasons_ranked_per_owner(self):
+        jane, _ = self.create_employee('jane')
+        john, _ = self.create_employee('john')
+        today = datetime.date.today()
+        with self.captureOnCommitCallbacks(execute=True):
+            flu = Leave.objects.create(user=jane, startdate=today, enddate=today, reason='flu')
+            trip = Leave.objects.create(user=jane, startdate=today, enddate=today, reason='family trip, flu shot first')
+            other = Leave.objects.create(user=john, startdate=today, enddate=today, reason='flu')
+
+        self.assertEqual(search.search('flu', 'leave', owner=jane.pk), [flu.pk, trip.pk])
+        self.assertEqual(search.search('flu', 'leave', owner=john.pk), [other.pk])
+
+        self.client.force_login(jane)
+        response = self.client.get(reverse('dashboard:leave_history'), {'q': 'family'})
+        self.assertEqual([leave.pk for leave in response.context['leaves']], [trip.pk])
+
+        # best match first, not newest first; beyond the limit the page says so
+        response = self.client.get(reverse('dashboard:leave_history'), {'q': 'flu'})
+        self.assertEqual([leave.pk for leave in response.context['leaves']], [flu.pk, trip.pk])
+        self.assertFalse(response.context['search_truncated'])
+        with mock.patch('dashboard.views.SEARCH_LIMIT', 1):
+            response = self.client.get(reverse('dashboard:leave_history'), {'q': 'flu'})
+        self.assertEqual([leave.pk for leave in response.context['leaves']], [flu.pk])
+        self.assertContains(response, 'only the 1 best matches are listed')
+        export = b''.join(self.client.get(reverse('dashboard:leave_history_export'), {'q': 'flu'}).streaming_content).decode()
+        self.assertLess(export.index(',flu'), export.index('family trip'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            trip.delete()
+            flu.reason = 'dentist'
+            flu.save()
+        self.assertEqual(search.search('flu', 'leave', owner=jane.pk), [])
+        self.assertEqual(search.rebuild(), 4)
+        self.assertEqual(search.search('dentist', 'leave'), [flu.pk])
+
+
+class AvailabilityTest(TemporarySearchIndex, TestCase):
+
+    def setUp(self):
+        django_cache.clear()
+        self.department = Department.objects.create(name='Ops')
+        self.other_department = Department.objects.create(name='Sales')
+        self.ama, _ = make_employee('ama', self.department)
+        self.kofi, _ = make_employee('kofi', self.department)
+        self.esi, _ = make_employee('esi', self.other_department)
+        self.month = datetime.date(2024, 3, 1)
+
+    def leave(self, user, start, end, status='approved', leavetype='sick'):
+        return Leave.objects.create(user=user, startdate=start, enddate=end, status=status, leavetype=leavetype)
+
+    def test_sweep_counts_each_person_once_per_day(self):
+        self.leave(self.ama, datetime.date(2024, 2, 27), datetime.date(2024, 3, 2))
+        self.leave(self.ama, datetime.date(2024, 3, 2), datetime.date(2024, 3, 3), leavetype='casual')
+        self.leave(self.kofi, datetime.date(2024, 3, 31), datetime.date(2024, 4, 5))
+        self.leave(self.kofi, datetime.date(2024, 3, 10), datetime.date(2024, 3, 12), status='pending')
+        self.leave(self.esi, datetime.date(2024, 3, 1), datetime.date(2024, 3, 31))
+
+        with self.assertNumQueries(2):
+            data = availability.compute(self.department.id, self.month)
+        days = {day['date']: day for day in data['days']}
+        self.assertEqual((data['month'], data['headcount'], len(data['days'])), ('2024-03', 2, 31))
+        self.assertEqual(days['2024-03-01']['out'], [{'user_id': self.ama.pk, 'leavetype': 'sick'}])
+        self.assertEqual(len(days['2024-03-02']['out']), 1)
+        self.assertEqual(days['2024-03-03']['out'], [{'user_id': self.ama.pk, 'leavetype': 'casual'}])
+        self.assertEqual(days['2024-03-04']['available'], 2)
+        self.assertEqual(days['2024-03-11']['available'], 2)
+        self.assertEqual(days['2024-03-31']['out'], [{'user_id': self.kofi.pk, 'leavetype': 'sick'}])
+        self.assertEqual(data['employees'][self.ama.pk], 'ama Test')
+
+    def test_cached_per_department_and_invalidated_by_status_changes(self):
+        pending = self.leave(self.kofi, datetime.date(2024, 3, 5), datetime.date(2024, 3, 6), status='pending')
+        availability.month_availability(self.department.id, self.month)
+        availability.month_availability(self.other_department.id, self.month)
+        with self.assertNumQueries(0):
+            availability.month_availability(self.department.id, self.month)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Leave.objects.filter(pk=pending.pk).first().approve_leave
+        with self.assertNumQueries(0):
+            availability.month_availability(self.other_department.id, self.month)
+        data = availability.month_availability(self.department.id, self.month)
+        self.assertEqual(data['days'][4]['available'], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            leave = Leave.objects.get(pk=pending.pk)
+            leave.reason = 'unchanged dates and status'
+            leave.save()
+        with self.assertNumQueries(0):
+            availability.month_availability(self.department.id, self.month)
+
+    def test_json_endpoint_and_widget(self):
+        today = datetime.date.today()
+        self.leave(self.kofi, today, today)
+        self.client.force_login(self.ama)
+
+        response = self.client.get(reverse('dashboard:team_availability_json'), {'month': today.strftime('%Y-%m'), 'department': self.other_department.id})
+        self.assertEqual(response.json()['department'], self.department.id) # not an admin, own department only
+        self.assertEqual(response.json()['days'][today.day - 1]['available'], 1)
+
+        response = self.client.get(reverse('dashboard:dashboard'))
+        self.assertEqual(response.context['out_today']['out'], [{'name': 'kofi Test', 'leavetype': 'sick'}])
+        self.assertContains(response, "Who's Out Today")
+
+        response = self.client.get(reverse('dashboard:team_availability'))
+        self.assertContains(response, 'kofi Test (sick)')
+
+
+class ExportTest(TestCase):
+
+    def setUp(self):
+        self.department = Department.objects.create(name='Ops')
+        self.ama, self.ama_employee = make_employee('ama', self.department)
+        self.kofi, _ = make_employee('kofi', self.department)
+        Leave.objects.create(user=self.ama, startdate=datetime.date(2024, 3, 4), enddate=datetime.date(2024, 3, 5),
+                             leavetype='casual', reason='=HYPERLINK("http://example.com")')
+        Leave.objects.create(user=self.ama, startdate=datetime.date(2023, 3, 4), enddate=datetime.date(2023, 3, 4), status='approved')
+        Leave.objects.create(user=self.kofi, startdate=datetime.date(2024, 3, 4), enddate=datetime.date(2024, 3, 4))
+
+    def csv_rows(self, response):
+        self.assertTrue(response.streaming)
+        content = b''.join(response.streaming_content).decode('utf-8')
+        self.assertTrue(content.startswith('\ufeff'))
+        return list(csv.reader(io.StringIO(content[1:])))
+
+    def test_history_export_applies_filters(self):
+        self.client.force_login(self.ama)
+        response = self.client.get(reverse('dashboard:leave_history_export'), {'year': '2024'})
+        self.assertIn('attachment; filename="leave-history-', response['Content-Disposition'])
+        rows = self.csv_rows(response)
+        self.assertEqual(rows[0][:6], ['ID', 'Employee', 'Username', 'Department', 'Leave type', 'Status'])
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[1][1:10], ['ama Test', 'ama', 'Ops', 'Casual Leave', 'pending', '2024-03-04', '2024-03-05', '2', "'=HYPERLINK(\"http://example.com\")"])
+
+    def test_admin_export(self):
+        self.client.force_login(self.ama)
+        self.assertEqual(self.client.get(reverse('dashboard:admin_leave_export')).status_code, 302)
+
+        admin = User.objects.create_superuser('admin', 'admin@example.com', 'secret')
+        self.client.force_login(admin)
+        rows = self.csv_rows(self.client.get(reverse('dashboard:admin_leave_export')))
+        self.assertEqual(len(rows), 4)
+        rows = self.csv_rows(self.client.get(reverse('dashboard:admin_leave_export'), {'start_date': '2024-01-01', 'end_date': '2024-12-31'}))
+        self.assertEqual(sorted(row[2] for row in rows[1:]), ['ama', 'kofi'])
+
+    def test_employee_export_is_one_query(self):
+        self.ama_employee.role = Role.objects.create(name='Clerk')
+        self.ama_employee.employeeid = 'A0091'
+        self.ama_employee.save()
+        for index in range(20):
+            make_employee('extra{0}'.format(index), self.department)
+
+        with self.assertNumQueries(1):
+            rows = list(exports.employee_rows(Employee.objects.order_by('id')))
+        self.assertEqual(len(rows), 23)
+        self.assertEqual(rows[1][1:10], ('RGL/A0/091', 'ama', 'Test', None, 'ama', '', 'Ops', 'Clerk', None))
+
+    @skipUnless(openpyxl, 'openpyxl is not installed')
+    def test_xlsx_export(self):
+        admin = User.objects.create_superuser('admin', 'admin@example.com', 'secret')
+        self.client.force_login(admin)
+        response = self.client.get(reverse('dashboard:employeesexport'), {'format': 'xlsx'})
+        self.assertEqual(response['Content-Type'], exports.XLSX_CONTENT_TYPE)
+        workbook = openpyxl.load_workbook(io.BytesIO(b''.join(response.streaming_content)), read_only=True)
+        rows = list(workbook.worksheets[0].iter_rows(values_only=True))
+        self.assertEqual(rows[0][:3], ('ID', 'Employee ID', 'Firstname'))
+        self.assertEqual(len(rows), 3)
+
+
+class OutboxTest(TestCase):
+
+    def setUp(self):
+        self.department = Department.objects.create(name='Ops')
+        self.ama, self.ama_employee = make_employee('ama', self.department)
+        self.leave = Leave.objects.create(user=self.ama, startdate=datetime.date(2024, 3, 4), enddate=datetime.date(2024, 3, 5))
+
+    def events(self, topic=None):
+        events = OutboxEvent.objects.all()
+        if topic:
+            events = events.filter(topic=topic)
+        return list(events.values_list('topic', 'key', 'action'))
+
+    def event(self, id, age=0, topic=OutboxEvent.LEAVE, key=1):
+        return OutboxEvent.objects.create(id=id, topic=topic, key=key, action='updated', data={'id': key},
+                                          created=timezone.now() - datetime.timedelta(seconds=age))
+
+    def test_changes_are_recorded_with_their_transaction(self):
+        self.assertEqual(self.events(), [
+            ('employee', self.ama_employee.pk, 'created'),
+            ('leave', self.leave.pk, 'created'),
+        ])
+        self.assertEqual(OutboxEvent.objects.last().data['reason'], None)
+
+        try:
+            with transaction.atomic():
+                self.leave.reason = 'Wedding'
+                self.leave.save()
+                raise ValueError('rolled back')
+        except ValueError:
+            pass
+        self.assertEqual(OutboxEvent.objects.count(), 2)
+
+        pk = self.leave.pk
+        self.leave.reason = 'Wedding'
+        self.leave.save()
+        self.leave.delete()
+        self.assertEqual(self.events('leave')[1:], [('leave', pk, 'updated'), ('leave', pk, 'deleted')])
+        self.assertEqual(OutboxEvent.objects.filter(action='updated').get().data['reason'], 'Wedding')
+        self.assertEqual(OutboxEvent.objects.filter(action='deleted').get().data, {'id': pk})
+
+    def test_employee_change_rolls_back_with_its_event(self):
+        self.ama_employee.firstname = 'Adwoa'
+        with mock.patch.object(outbox, 'record', side_effect=RuntimeError('outbox down')):
+            with self.assertRaises(RuntimeError):
+                self.ama_employee.save()
+        self.ama_employee.refresh_from_db()
+        self.assertEqual(self.ama_employee.firstname, 'ama')
+        self.assertEqual(len(self.events('employee')), 1)
+
+    def test_bulk_writes_are_recorded(self):
+        other = Leave.objects.create(user=self.ama, startdate=datetime.date(2024, 4, 1), enddate=datetime.date(2024, 4, 1))
+        transitions.transition(self.leave, 'approve')
+        transitions.bulk_transition('cancel', [self.leave.pk, other.pk])
+        self.assertEqual(self.events('leave')[-2:], [('leave', self.leave.pk, 'approve'), ('leave', other.pk, 'cancel')])
+        self.assertEqual(OutboxEvent.objects.last().data['status'], 'cancelled')
+
+        report = import_employees(io.BytesIO(b'username,firstname,lastname,birthday\nkofi,Kofi,Mensah,1991-02-03\n'), 'staff.csv')
+        self.assertEqual(report.created, 1)
+        event = OutboxEvent.objects.last()
+        self.assertEqual((event.topic, event.action, event.data['firstname']), ('employee', 'created', 'Kofi'))
+
+    def test_recounts_and_detaching_deletes_are_recorded(self):
+        Leave.objects.filter(pk=self.leave.pk).update(duration=9)
+        self.assertEqual(durations.recount(), 1)
+        event = OutboxEvent.objects.last()
+        self.assertEqual((event.topic, event.key, event.action, event.data['duration']), ('leave', self.leave.pk, 'updated', 2))
+
+        role = Role.objects.create(name='Analyst')
+        Employee.objects.filter(pk=self.ama_employee.pk).update(role=role)
+        self.department.delete()
+        role.delete()
+        self.assertEqual(self.events('employee')[-2:], [('employee', self.ama_employee.pk, 'updated')] * 2)
+        self.assertEqual(OutboxEvent.objects.last().data['department_id'], None)
+        self.assertEqual(OutboxEvent.objects.last().data['role_id'], None)
+
+    def test_feed_pages_by_cursor(self):
+        admin = User.objects.create_superuser('admin', 'admin@example.com', 'secret')
+        make_employee('kofi', self.department)
+        self.client.force_login(self.ama)
+        self.assertEqual(self.client.get(reverse('dashboard:change_feed')).status_code, 403)
+
+        self.client.force_login(admin)
+        response = self.client.get(reverse('dashboard:change_feed'), {'limit': 2})
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = [json.loads(line) for line in response.content.decode().splitlines()]
+        self.assertEqual([line['topic'] for line in lines], ['employee', 'leave'])
+
+        response = self.client.get(reverse('dashboard:change_feed'), {'after': response['X-Feed-Next'], 'topic': 'employee'})
+        lines = [json.loads(line) for line in response.content.decode().splitlines()]
+        self.assertEqual([line['data']['firstname'] for line in lines], ['kofi'])
+        self.assertEqual(int(response['X-Feed-Next']), lines[-1]['id'])
+
+    def test_feed_holds_back_recent_gaps(self):
+        OutboxEvent.objects.all().delete()
+        self.event(1, age=120)
+        self.event(2)
+        self.event(4) # 3 is still in flight, or was rolled back
+        self.assertEqual([event.id for event in outbox.read(0)], [1, 2])
+        self.assertEqual(outbox.read(2), [])
+
+        OutboxEvent.objects.filter(id=4).update(created=timezone.now() - datetime.timedelta(minutes=5))
+        self.assertEqual([event.id for event in outbox.read(2)], [4])
+
+    def test_consumer_offsets_only_move_forward(self):
+        admin = User.objects.create_superuser('admin', 'admin@example.com', 'secret')
+        self.client.force_login(admin)
+        first = OutboxEvent.objects.first().id
+        response = self.client.post(reverse('dashboard:change_feed_ack'), {'consumer': 'payroll', 'position': first})
+        self.assertEqual(response.json(), {'consumer': 'payroll', 'position': first})
+        self.assertEqual(outbox.acknowledge('payroll', 0), first)
+        self.assertEqual(self.client.post(reverse('dashboard:change_feed_ack'), {'consumer': 'Pay roll', 'position': 1}).status_code, 400)
+
+        response = self.client.get(reverse('dashboard:change_feed'), {'consumer': 'payroll'})
+        self.assertTrue(all(json.loads(line)['id'] > first for line in response.content.decode().splitlines()))
+
+    def test_compaction_keeps_latest_and_unread_events(self):
+        OutboxEvent.objects.all().delete()
+        old = 10 * 24 * 3600
+        self.event(1, age=old, key=1)
+        self.event(2, age=old, key=1)
+        self.event(3, age=old, key=2)
+        self.event(4, key=1)
+        FeedConsumer.objects.create(name='payroll', position=2)
+
+        self.assertEqual(outbox.compact(), (2, 0)) # 1 and 2 are superseded by 4, 3 is unread
+        FeedConsumer.objects.update(position=4)
+        call_command('compact_outbox', stdout=io.StringIO())
+        self.assertEqual(list(OutboxEvent.objects.values_list('id', flat=True)), [4])
+
+
+class ConditionalPageTest(TemporarySearchIndex, TestCase):
+
+    def setUp(self):
+        django_cache.clear()
+        self.department = Department.objects.create(name='Ops')
+        self.ama, self.ama_employee = make_employee('ama', self.department)
+        self.kofi, _ = make_employee('kofi', Department.objects.create(name='Sales'))
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', None)
+        self.leave = Leave.objects.create(user=self.ama, startdate=datetime.date(2024, 3, 4), enddate=datetime.date(2024, 3, 5))
+
+    def revalidate(self, name, response, **params):
+        return self.client.get(reverse(name), params, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_welcome_revalidates_until_the_users_data_changes(self):
+        self.client.force_login(self.ama)
+        response = self.client.get(reverse('dashboard:dashboard'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('private', response['Cache-Control'])
+        self.assertTrue(response.has_header('Last-Modified'))
+
+        not_modified = self.revalidate('dashboard:dashboard', response)
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified.content, b'')
+        self.assertEqual(self.client.get(reverse('dashboard:dashboard'), HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304)
+
+        # a leave in another department leaves ama's page alone
+        with self.captureOnCommitCallbacks(execute=True):
+            Leave.objects.create(user=self.kofi, startdate=datetime.date(2024, 5, 6), enddate=datetime.date(2024, 5, 6))
+        self.assertEqual(self.revalidate('dashboard:dashboard', response).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            transitions.transition(self.leave, 'approve')
+        self.assertEqual(self.revalidate('dashboard:dashboard', response).status_code, 200)
+
+    def test_etag_is_per_user_and_query(self):
+        self.client.force_login(self.ama)
+        response = self.client.get(reverse('dashboard:leave_history'))
+        self.assertEqual(self.revalidate('dashboard:leave_history', response).status_code, 304)
+        self.assertEqual(self.revalidate('dashboard:leave_history', response, status='approved').status_code, 200)
+
+        self.client.force_login(self.kofi)
+        self.assertEqual(self.revalidate('dashboard:leave_history', response).status_code, 200)
+
+    def test_pending_list_follows_leaves_and_user_names(self):
+        self.client.force_login(self.ama)
+        self.assertFalse(self.client.get(reverse('dashboard:leaveslist')).has_header('ETag'))
+
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('dashboard:leaveslist'))
+        self.assertEqual(self.revalidate('dashboard:leaveslist', response).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ama.username = 'ama.owusu'
+            self.ama.save()
+        response = self.revalidate('dashboard:leaveslist', response)
+        self.assertContains(response, 'ama.owusu')
+        self.assertEqual(self.revalidate('dashboard:leaveslist', response).status_code, 304)
+
+    def test_pending_messages_are_always_rendered(self):
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('dashboard:leaveslist'))
+        self.client.post(reverse('dashboard:leavesbulkaction'), {'action': 'approve'}) # nothing ticked
+
+        shown = self.revalidate('dashboard:leaveslist', response)
+        self.assertContains(shown, 'Select leaves and an action first.')
+        self.assertFalse(shown.has_header('ETag'))
+        self.assertEqual(self.revalidate('dashboard:leaveslist', response).status_code, 304)
+
+
+class TemplateFragmentCacheTest(TemporarySearchIndex, TestCase):
+
+    def setUp(self):
+        django_cache.clear()
+        self.ama, _ = make_employee('ama', Department.objects.create(name='Ops'))
+        self.kofi, _ = make_employee('kofi', Department.objects.create(name='Sales'))
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', None)
+        Leave.objects.create(user=self.ama, startdate=datetime.date(2024, 3, 4), enddate=datetime.date(2024, 3, 5))
+
+    def test_dashboard_fragments_follow_the_data(self):
+        self.client.force_login(self.admin)
+        self.assertContains(self.client.get(reverse('dashboard:dashboard')), 'By: ama')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Leave.objects.create(user=self.kofi, startdate=datetime.date(2024, 5, 6), enddate=datetime.date(2024, 5, 6))
+        self.assertContains(self.client.get(reverse('dashboard:dashboard')), 'By: kofi')
+
+        # the admin's fragments are never served to an employee
+        self.client.force_login(self.ama)
+        self.assertNotContains(self.client.get(reverse('dashboard:dashboard')), 'By: ')
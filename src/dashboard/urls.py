@@ -11,10 +11,17 @@ urlpatterns = [
     path('enhanced/', views.enhanced_dashboard, name='enhanced_dashboard'),
     path('simple/', views.simple_dashboard, name='simple_dashboard'),
     path('history/', views.leave_history, name='leave_history'),
+    path('history/export/', views.leave_history_export, name='leave_history_export'),
     path('analytics/', views.admin_leave_analytics, name='admin_leave_analytics'),
+    path('analytics/export/', views.admin_leave_export, name='admin_leave_export'),
+    path('team/availability/', views.team_availability, name='team_availability'),
+    path('team/availability.json', views.team_availability_json, name='team_availability_json'),
+    path('feed/', views.change_feed, name='change_feed'),
+    path('feed/ack/', views.change_feed_ack, name='change_feed_ack'),
 
     # Employee
     path('employees/all/',views.dashboard_employees,name='employees'),
+    path('employees/export/',views.employees_export,name='employeesexport'),
     path('employee/create/',views.dashboard_employees_create,name='employeecreate'),
     path('employee/profile/<int:id>/',views.dashboard_employee_info,name='employeeinfo'),
     path('employee/profile/edit/<int:id>/',views.employee_edit_data,name='edit'),
@@ -34,6 +41,7 @@ urlpatterns = [
     # path('bank/edit/<int:id>/',views.employee_bank_account_update,name='accountedit'),
     path('leave/apply/',views.leave_creation,name='createleave'),
     path('leaves/pending/all/',views.leaves_list,name='leaveslist'),
+    path('leaves/pending/bulk/',views.leaves_bulk_action,name='leavesbulkaction'),
     path('leaves/approved/all/',views.leaves_approved_list,name='approvedleaveslist'),
     path('leaves/cancel/all/',views.cancel_leaves_list,name='canceleaveslist'),
     path('leaves/all/view/<int:id>/',views.leaves_view,name='userleaveview'),
@@ -1,21 +1,38 @@
-from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
 from django.shortcuts import render,redirect,get_object_or_404
-from django.http import HttpResponse,HttpResponseRedirect
+from django.http import HttpResponse,HttpResponseRedirect,JsonResponse
 from django.contrib.auth.models import User
 from django.conf import settings
-from django.db.models import Q, Count, Sum, Avg
+from django.db.models import Case, Count, IntegerField, Sum, Value, When
 import datetime
-from django.core.mail import send_mail
 from django.contrib import messages
 from django.urls import reverse
+from django.utils.http import urlencode
+from django.utils.text import slugify
 from employee.forms import EmployeeCreateForm
-from leave.models import Leave, LEAVE_TYPE
+from leave.models import Leave, LeaveBalance, LeaveStatistic, LEAVE_TYPE
 from employee.models import *
 from leave.forms import LeaveCreationForm
+from leave import transitions
 from collections import defaultdict
-import calendar
+from . import aggregates, availability, cache, exports, outbox, search
+from .conditional import conditional_page
+from .pagination import KeysetPaginator, RankedPaginator
 
 
+SEARCH_LIMIT = 500 # best matches a search narrows a list to
+
+
+def welcome_versions(request):
+    user = request.user
+    keys = [cache.GLOBAL_VERSION_KEY if user.is_superuser and user.is_staff else cache.VERSION_KEY.format(user.pk)]
+    department_id = Employee.objects.filter(user = user).values_list('department_id', flat = True).first()
+    if department_id:
+        # who's out today
+        keys += [availability.GLOBAL_VERSION_KEY, availability.DEPARTMENT_VERSION_KEY.format(department_id)]
+    return keys
+
+
+@conditional_page(welcome_versions)
 def dashboard(request):
     """
     Enhanced dashboard with leave statistics and visualizations
@@ -33,6 +50,10 @@ def dashboard(request):
         # Regular User Dashboard - Personal leave statistics
         dataset = get_user_dashboard_data(user)
     
+    department_id = Employee.objects.filter(user = user).values_list('department_id', flat = True).first()
+    if department_id:
+        dataset['out_today'] = availability.out_today(department_id)
+    dataset['data_version'] = cache.page_version(user)
     dataset['title'] = 'Dashboard'
     return render(request,'dashboard/basic_dashboard.html',dataset)
 
@@ -55,6 +76,7 @@ def enhanced_dashboard(request):
         # Regular User Dashboard - Personal leave statistics
         dataset = get_user_dashboard_data(user)
     
+    dataset['data_version'] = cache.page_version(user)
     dataset['title'] = 'Enhanced Dashboard'
     return render(request,'dashboard/enhanced_dashboard.html',dataset)
 
@@ -72,26 +94,26 @@ def simple_dashboard(request):
     
     if user.is_superuser and user.is_staff:
         # Super User Dashboard - Basic statistics
-        all_leaves = Leave.objects.all()
-        all_employees = Employee.objects.all()
-        
+        counts = aggregates.status_counts(LeaveStatistic.objects.all())
+
         dataset.update({
-            'total_employees': all_employees.count(),
-            'total_leaves': all_leaves.count(),
-            'pending_leaves': all_leaves.filter(status='pending').count(),
-            'approved_leaves': all_leaves.filter(status='approved').count(),
-            'rejected_leaves': all_leaves.filter(status='rejected').count(),
+            'total_employees': Employee.objects.count(),
+            'total_leaves': counts['total'],
+            'pending_leaves': counts['pending'],
+            'approved_leaves': counts['approved'],
+            'rejected_leaves': counts['rejected'],
             'user_type': 'superuser'
         })
     else:
         # Regular User Dashboard - Basic personal statistics
         user_leaves = Leave.objects.filter(user=user)
-        
+        counts = aggregates.status_counts(user_leaves)
+
         dataset.update({
-            'total_leaves': user_leaves.count(),
-            'approved_leaves': user_leaves.filter(status='approved').count(),
-            'pending_leaves': user_leaves.filter(status='pending').count(),
-            'rejected_leaves': user_leaves.filter(status='rejected').count(),
+            'total_leaves': counts['total'],
+            'approved_leaves': counts['approved'],
+            'pending_leaves': counts['pending'],
+            'rejected_leaves': counts['rejected'],
             'recent_leaves': user_leaves.order_by('-created')[:5],
             'user_type': 'regular'
         })
@@ -101,6 +123,11 @@ def simple_dashboard(request):
 
 
 def get_user_dashboard_data(user):
+    """Dashboard data for regular users, cached until one of their leaves changes"""
+    return cache.get_or_compute(user, compute_user_dashboard_data)
+
+
+def compute_user_dashboard_data(user):
     """Generate dashboard data for regular users"""
     dataset = dict()
     
@@ -108,53 +135,32 @@ def get_user_dashboard_data(user):
     user_leaves = Leave.objects.filter(user=user)
     
     # Basic statistics
-    total_leaves = user_leaves.count()
-    approved_leaves = user_leaves.filter(status='approved').count()
-    pending_leaves = user_leaves.filter(status='pending').count()
-    rejected_leaves = user_leaves.filter(status='rejected').count()
-    cancelled_leaves = user_leaves.filter(status='cancelled').count()
+    counts = aggregates.status_counts(user_leaves)
     
     # Leave statistics by type
-    leave_types = {}
-    for leave_type, _ in LEAVE_TYPE:
-        count = user_leaves.filter(leavetype=leave_type).count()
-        if count > 0:
-            leave_types[leave_type] = count
+    leave_types = aggregates.type_counts(user_leaves)
     
     # Monthly leave statistics for current year
-    current_year = datetime.datetime.now().year
-    monthly_data = []
-    for month in range(1, 13):
-        month_name = calendar.month_abbr[month]
-        count = user_leaves.filter(
-            startdate__year=current_year,
-            startdate__month=month
-        ).count()
-        monthly_data.append({'month': month_name, 'count': count})
+    monthly_data = aggregates.monthly_counts(user_leaves)
     
     # Recent leave requests (last 5)
-    recent_leaves = user_leaves.order_by('-created')[:5]
+    recent_leaves = list(user_leaves.order_by('-created')[:5])
     
-    # Calculate total leave days used
-    approved_leaves_qs = user_leaves.filter(status='approved')
-    total_days_used = 0
-    for leave in approved_leaves_qs:
-        if leave.leave_days:
-            total_days_used += leave.leave_days + 1  # +1 to include both start and end dates
-    
-    # Default leave days per year (can be customized per user)
-    default_days = 30
-    days_remaining = default_days - total_days_used
+    # Leave days used and remaining this year, from the balance ledger
+    balance = LeaveBalance.objects.balance_for(user)
+    total_days_used = balance.used
+    default_days = balance.entitlement
+    days_remaining = balance.remaining
     
     # Calculate leave usage percentage
     leave_usage_percentage = (total_days_used / default_days * 100) if default_days > 0 else 0
     
     dataset.update({
-        'total_leaves': total_leaves,
-        'approved_leaves': approved_leaves,
-        'pending_leaves': pending_leaves,
-        'rejected_leaves': rejected_leaves,
-        'cancelled_leaves': cancelled_leaves,
+        'total_leaves': counts['total'],
+        'approved_leaves': counts['approved'],
+        'pending_leaves': counts['pending'],
+        'rejected_leaves': counts['rejected'],
+        'cancelled_leaves': counts['cancelled'],
         'leave_types': leave_types,
         'monthly_data': monthly_data,
         'recent_leaves': recent_leaves,
@@ -172,55 +178,26 @@ def get_superuser_dashboard_data():
     """Generate dashboard data for super users"""
     dataset = dict()
     
-    # Overall organization statistics
+    # Overall organization statistics, read from the monthly rollups
     all_leaves = Leave.objects.all()
-    all_employees = Employee.objects.all()
+    statistics = LeaveStatistic.objects.all()
     
     # Basic counts
-    total_employees = all_employees.count()
-    total_leaves = all_leaves.count()
-    pending_leaves = all_leaves.filter(status='pending').count()
-    approved_leaves = all_leaves.filter(status='approved').count()
-    rejected_leaves = all_leaves.filter(status='rejected').count()
+    total_employees = Employee.objects.count()
+    counts = aggregates.status_counts(statistics)
     
     # Leave status distribution for charts
-    status_distribution = {
-        'pending': pending_leaves,
-        'approved': approved_leaves,
-        'rejected': rejected_leaves,
-        'cancelled': all_leaves.filter(status='cancelled').count()
-    }
+    status_distribution = {status: counts[status] for status in aggregates.STATUSES}
     
     # Department-wise leave statistics
-    department_stats = []
-    for department in Department.objects.all():
-        dept_employees = all_employees.filter(department=department)
-        dept_leaves = all_leaves.filter(user__employee__department=department)
-        department_stats.append({
-            'name': department.name,
-            'employees': dept_employees.count(),
-            'leaves': dept_leaves.count(),
-            'pending': dept_leaves.filter(status='pending').count(),
-            'approved': dept_leaves.filter(status='approved').count()
-        })
+    department_stats = aggregates.department_stats(statistics)
     
     # Monthly leave trends (current year)
-    current_year = datetime.datetime.now().year
-    monthly_trends = []
-    for month in range(1, 13):
-        month_name = calendar.month_abbr[month]
-        count = all_leaves.filter(
-            startdate__year=current_year,
-            startdate__month=month
-        ).count()
-        monthly_trends.append({'month': month_name, 'count': count})
+    monthly_trends = aggregates.monthly_counts(statistics)
     
     # Leave type distribution
-    leave_type_stats = {}
-    for leave_type, display_name in LEAVE_TYPE:
-        count = all_leaves.filter(leavetype=leave_type).count()
-        if count > 0:
-            leave_type_stats[display_name] = count
+    leave_type_stats = aggregates.type_counts(statistics, display=True)
+    leave_type_days = aggregates.type_days(statistics, display=True)
     
     # Recent leave requests (last 10)
     recent_leaves = all_leaves.order_by('-created')[:10]
@@ -232,14 +209,15 @@ def get_superuser_dashboard_data():
     
     dataset.update({
         'total_employees': total_employees,
-        'total_leaves': total_leaves,
-        'pending_leaves': pending_leaves,
-        'approved_leaves': approved_leaves,
-        'rejected_leaves': rejected_leaves,
+        'total_leaves': counts['total'],
+        'pending_leaves': counts['pending'],
+        'approved_leaves': counts['approved'],
+        'rejected_leaves': counts['rejected'],
         'status_distribution': status_distribution,
         'department_stats': department_stats,
         'monthly_trends': monthly_trends,
         'leave_type_stats': leave_type_stats,
+        'leave_type_days': leave_type_days,
         'recent_leaves': recent_leaves,
         'top_leave_takers': top_leave_takers,
         'user_type': 'superuser'
@@ -248,39 +226,78 @@ def get_superuser_dashboard_data():
     return dataset
 
 
+def search_ranking(query, kind, **kwargs):
+    """
+    best matches of a search, best first -> (primary keys, truncated)
+    truncated: more than SEARCH_LIMIT documents matched and the rest were dropped
+    """
+    pks = search.search(query, kind, limit = SEARCH_LIMIT + 1, **kwargs)
+    return pks[:SEARCH_LIMIT], len(pks) > SEARCH_LIMIT
+
+
+def in_rank_order(queryset, pks):
+    """queryset narrowed to pks, in their (search rank) order"""
+    if not pks:
+        return queryset.none()
+    rank = Case(*[When(pk = pk, then = Value(index)) for index, pk in enumerate(pks)], output_field = IntegerField())
+    return queryset.filter(pk__in = pks).order_by(rank)
+
+
+def history_filters(request):
+    """
+    leaves of the user narrowed by the leave_history filters -> (queryset, filters, ranking)
+    filters: {'status', 'type', 'year', 'q'} as given in the query string
+    ranking: search_ranking of q, None without one
+    """
+    filters = {name: request.GET.get(name, '').strip() for name in ('status', 'type', 'year', 'q')}
+    user_leaves = Leave.objects.filter(user=request.user).order_by('-created')
+
+    if filters['status']:
+        user_leaves = user_leaves.filter(status=filters['status'])
+    if filters['type']:
+        user_leaves = user_leaves.filter(leavetype=filters['type'])
+    if filters['year'].isdigit():
+        year = int(filters['year'])
+        user_leaves = user_leaves.filter(startdate__range=(datetime.date(year, 1, 1), datetime.date(year, 12, 31)))
+    ranking = None
+    if filters['q']:
+        ranking = search_ranking(filters['q'], 'leave', owner=request.user.id)
+        user_leaves = user_leaves.filter(pk__in=ranking[0])
+    return user_leaves, filters, ranking
+
+
+@conditional_page(lambda request: [cache.VERSION_KEY.format(request.user.pk)])
 def leave_history(request):
     """Detailed leave history for users"""
     if not request.user.is_authenticated:
         return redirect('accounts:login')
     
-    user_leaves = Leave.objects.filter(user=request.user).order_by('-created')
-    
     # Filtering
-    status_filter = request.GET.get('status', '')
-    type_filter = request.GET.get('type', '')
-    year_filter = request.GET.get('year', '')
-    
-    if status_filter:
-        user_leaves = user_leaves.filter(status=status_filter)
-    if type_filter:
-        user_leaves = user_leaves.filter(leavetype=type_filter)
-    if year_filter:
-        user_leaves = user_leaves.filter(startdate__year=year_filter)
+    user_leaves, filters, ranking = history_filters(request)
     
-    # Pagination
-    paginator = Paginator(user_leaves, 15)
-    page = request.GET.get('page')
-    leaves_paginated = paginator.get_page(page)
+    # Keyset pagination on (created, id) - no OFFSET, no COUNT; search results keep their rank
+    if ranking:
+        paginator = RankedPaginator(user_leaves, ranking[0], 15)
+    else:
+        paginator = KeysetPaginator(user_leaves, 15)
+    leaves_paginated = paginator.get_page(request.GET.get('cursor'))
     
-    # Calculate statistics for filtered results
-    total_days = sum([(leave.leave_days + 1) if leave.leave_days else 0 for leave in user_leaves])
+    # Totals for the filtered results in one query, memoised per filter combination
+    key = 'history:{status}:{type}:{year}:{q}'.format(**filters)
+    summary = cache.get_or_compute(request.user, lambda user: aggregates.summary(user_leaves), name=key)
     
     context = {
         'leaves': leaves_paginated,
-        'status_filter': status_filter,
-        'type_filter': type_filter,
-        'year_filter': year_filter,
-        'total_days': total_days,
+        'summary': summary,
+        'status_filter': filters['status'],
+        'type_filter': filters['type'],
+        'year_filter': filters['year'],
+        'search_filter': filters['q'],
+        'search_truncated': bool(ranking and ranking[1]),
+        'search_limit': SEARCH_LIMIT,
+        'export_query': urlencode({name: value for name, value in filters.items() if value}),
+        'years': [str(year) for year in range(datetime.date.today().year - 5, datetime.date.today().year + 2)],
+        'total_days': summary['total_days'],
         'leave_types': LEAVE_TYPE,
         'title': 'Leave History'
     }
@@ -288,32 +305,192 @@ def leave_history(request):
     return render(request, 'dashboard/leave_history.html', context)
 
 
+def leave_history_export(request):
+    """The user's leave history as CSV (or ?format=xlsx), with the history filters applied"""
+    if not request.user.is_authenticated:
+        return redirect('accounts:login')
+    user_leaves, _, ranking = history_filters(request)
+    if ranking:
+        user_leaves = in_rank_order(user_leaves, ranking[0])
+    return exports.export_response(exports.leave_rows(user_leaves), 'leave-history', request.GET.get('format'))
+
+
+def availability_scope(request):
+    '''
+    department and month of a team availability request -> (department or None, date)
+    admins pick any department with ?department=, everyone else gets their own
+    ?month=YYYY-MM, the current month by default
+    '''
+    try:
+        month = datetime.datetime.strptime(request.GET.get('month', ''), '%Y-%m').date()
+    except ValueError:
+        month = datetime.date.today().replace(day = 1)
+
+    department = None
+    if request.user.is_superuser and request.user.is_staff:
+        department_id = request.GET.get('department', '')
+        if department_id.isdigit():
+            department = Department.objects.filter(id = department_id).first()
+        department = department or Department.objects.first()
+    else:
+        employee = Employee.objects.filter(user = request.user).select_related('department').first()
+        department = employee.department if employee else None
+    return department, month
+
+
+def team_availability(request):
+    """Who is out on each day of the month in a department"""
+    if not request.user.is_authenticated:
+        return redirect('accounts:login')
+
+    department, month = availability_scope(request)
+    days = []
+    data = None
+    if department:
+        data = availability.month_availability(department.id, month)
+        days = [
+            {
+                'date': datetime.date.fromisoformat(day['date']),
+                'out': [{'name': data['employees'][entry['user_id']], 'leavetype': entry['leavetype']} for entry in day['out']],
+                'available': day['available'],
+            }
+            for day in data['days']
+        ]
+
+    previous_month = (month - datetime.timedelta(days = 1)).replace(day = 1)
+    next_month = (month + datetime.timedelta(days = 32)).replace(day = 1)
+    context = {
+        'department': department,
+        'departments': Department.objects.all() if request.user.is_superuser else [],
+        'month': month,
+        'previous_month': '{0:%Y-%m}'.format(previous_month),
+        'next_month': '{0:%Y-%m}'.format(next_month),
+        'headcount': data['headcount'] if data else 0,
+        'days': days,
+        'title': 'Team Availability',
+    }
+    return render(request, 'dashboard/team_availability.html', context)
+
+
+def team_availability_json(request):
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'authentication required'}, status = 401)
+    department, month = availability_scope(request)
+    if department is None:
+        return JsonResponse({'error': 'no department'}, status = 404)
+    return JsonResponse(availability.month_availability(department.id, month))
+
+
+def feed_number(value, default):
+    return int(value) if value and value.isdigit() else default
+
+
+def change_feed(request):
+    """
+    Leave and employee changes after ?after= (or a ?consumer='s stored offset) as NDJSON,
+    one event per line, oldest first; X-Feed-Next is the cursor of the next page
+    """
+    if not (request.user.is_authenticated and request.user.is_superuser and request.user.is_staff):
+        return JsonResponse({'error': 'forbidden'}, status = 403)
+    topic = request.GET.get('topic') or None
+    if topic and topic not in outbox.TOPICS:
+        return JsonResponse({'error': 'unknown topic'}, status = 400)
+
+    consumer = request.GET.get('consumer')
+    after = feed_number(request.GET.get('after'), None)
+    if after is None:
+        after = outbox.position(consumer) if consumer else 0
+    events = outbox.read(after, feed_number(request.GET.get('limit'), outbox.MAX_LIMIT), topic)
+
+    response = HttpResponse(''.join(outbox.serialize(event) + '\n' for event in events), content_type='application/x-ndjson')
+    response['X-Feed-Next'] = events[-1].id if events else after
+    return response
+
+
+def change_feed_ack(request):
+    """
+    POST consumer=&position= -> moves the consumer's stored offset forward
+    """
+    if not (request.user.is_authenticated and request.user.is_superuser and request.user.is_staff):
+        return JsonResponse({'error': 'forbidden'}, status = 403)
+    if request.method != 'POST':
+        return JsonResponse({'error': 'POST required'}, status = 405)
+    consumer = request.POST.get('consumer', '')
+    position = feed_number(request.POST.get('position'), None)
+    if not consumer or position is None:
+        return JsonResponse({'error': 'consumer and position are required'}, status = 400)
+    if slugify(consumer) != consumer:
+        return JsonResponse({'error': 'consumer must be a slug'}, status = 400)
+    return JsonResponse({'consumer': consumer, 'position': outbox.acknowledge(consumer, position)})
+
+
+def analytics_range(request):
+    """
+    ?start_date=&end_date= of the analytics page -> (start, end) dates, or None unless both are valid
+    """
+    try:
+        start_date = datetime.date.fromisoformat(request.GET.get('start_date', ''))
+        end_date = datetime.date.fromisoformat(request.GET.get('end_date', ''))
+    except ValueError:
+        return None
+    return start_date, end_date
+
+
+def analytics_leaves(request):
+    leaves = Leave.objects.all()
+    date_range = analytics_range(request)
+    if date_range:
+        leaves = leaves.filter(startdate__range=date_range)
+    return leaves
+
+
 def admin_leave_analytics(request):
     """Admin analytics dashboard"""
     if not (request.user.is_authenticated and request.user.is_superuser):
         return redirect('/')
     
     # Date range filtering
-    start_date = request.GET.get('start_date')
-    end_date = request.GET.get('end_date')
-    
-    leaves = Leave.objects.all()
-    if start_date and end_date:
-        leaves = leaves.filter(startdate__range=[start_date, end_date])
+    leaves = analytics_leaves(request)
+    statistics = LeaveStatistic.objects.all()
+    if analytics_range(request):
+        # rollups are monthly, exact day ranges need the leave table
+        statistics = leaves
     
     # Calculate various analytics
+    counts = aggregates.status_counts(statistics)
     context = {
-        'total_leaves': leaves.count(),
-        'approved_rate': (leaves.filter(status='approved').count() / leaves.count() * 100) if leaves.count() > 0 else 0,
-        'most_common_leave_type': leaves.values('leavetype').annotate(count=Count('leavetype')).order_by('-count').first(),
-        'average_leave_duration': leaves.filter(status='approved').aggregate(avg_duration=Avg('leave_days'))['avg_duration'],
+        'total_leaves': counts['total'],
+        'pending_leaves': counts['pending'],
+        'approved_rate': (counts['approved'] / counts['total'] * 100) if counts['total'] > 0 else 0,
+        'most_common_leave_type': aggregates.most_common_type(statistics),
+        'department_stats': aggregates.department_stats(statistics),
+        'average_leave_duration': aggregates.day_totals(leaves.filter(status='approved'))['average_days'],
         'leaves': leaves.order_by('-created')[:20],
+        'export_query': urlencode(dict(zip(('start_date', 'end_date'), analytics_range(request) or ()))),
         'title': 'Leave Analytics'
     }
     
     return render(request, 'dashboard/simple_analytics.html', context)
 
 
+def admin_leave_export(request):
+    """Every leave as CSV (or ?format=xlsx), with the analytics date range applied"""
+    if not (request.user.is_authenticated and request.user.is_superuser):
+        return redirect('/')
+    return exports.export_response(exports.leave_rows(analytics_leaves(request).order_by('-created', '-id')), 'leaves', request.GET.get('format'))
+
+
+def search_employees(employees, query):
+    """
+    names, employee IDs, department and role names through the search index
+    -> (employees, ranking); ranking: search_ranking of query, None without one
+    """
+    if not query:
+        return employees, None
+    ranking = search_ranking(query, 'employee')
+    return employees.filter(pk__in = ranking[0]), ranking
+
+
 def dashboard_employees(request):
     if not (request.user.is_authenticated and request.user.is_superuser and request.user.is_staff):
         return redirect('/')
@@ -324,26 +501,39 @@ def dashboard_employees(request):
 
     #pagination
     query = request.GET.get('search')
-    if query:
-        employees = employees.filter(
-            Q(firstname__icontains = query) |
-            Q(lastname__icontains = query)
-        )
-
-    paginator = Paginator(employees, 10) #show 10 employee lists per page
+    employees, ranking = search_employees(employees, query)
 
-    page = request.GET.get('page')
-    employees_paginated = paginator.get_page(page)
+    # keyset on id alone: Employee.created is nullable and would drop rows from the cursor
+    if ranking:
+        paginator = RankedPaginator(employees, ranking[0], 10) # best matches first
+    else:
+        paginator = KeysetPaginator(employees, 10, ordering=('-id',)) #show 10 employee lists per page
+    employees_paginated = paginator.get_page(request.GET.get('cursor'))
 
     blocked_employees = Employee.objects.all_blocked_employees()
 
     dataset['employees'] = employees_paginated
+    dataset['employee_count'] = paginator.count(limit=1000)
+    dataset['count_limit'] = 1000
+    dataset['search'] = query or ''
+    dataset['search_truncated'] = bool(ranking and ranking[1])
+    dataset['search_limit'] = SEARCH_LIMIT
     dataset['departments'] = departments
     dataset['blocked_employees'] = blocked_employees
 
     return render(request,'dashboard/employee_app.html',dataset)
 
 
+def employees_export(request):
+    """Active employees as CSV (or ?format=xlsx), narrowed by ?search= like the employee list"""
+    if not (request.user.is_authenticated and request.user.is_superuser and request.user.is_staff):
+        return redirect('/')
+    employees, ranking = search_employees(Employee.objects.order_by('-id'), request.GET.get('search'))
+    if ranking:
+        employees = in_rank_order(employees, ranking[0])
+    return exports.export_response(exports.employee_rows(employees), 'employees', request.GET.get('format'))
+
+
 def dashboard_employees_create(request):
     if not (request.user.is_authenticated and request.user.is_superuser and request.user.is_staff):
         return redirect('/')
@@ -463,6 +653,7 @@ def dashboard_employee_info(request,id):
     
     dataset = dict()
     dataset['employee'] = employee
+    dataset['data_version'] = cache.page_version()
     dataset['title'] = 'profile - {0}'.format(employee.get_full_name)
     return render(request,'dashboard/employee_detail.html',dataset)
 
@@ -473,7 +664,7 @@ def leave_creation(request):
     if not request.user.is_authenticated:
         return redirect('accounts:login')
     if request.method == 'POST':
-        form = LeaveCreationForm(data = request.POST)
+        form = LeaveCreationForm(data = request.POST, user = request.user)
         if form.is_valid():
             instance = form.save(commit = False)
             user = request.user
@@ -483,6 +674,8 @@ def leave_creation(request):
             messages.success(request,'Leave Request Sent,wait for Admins response',extra_tags = 'alert alert-success alert-dismissible show')
             return redirect('dashboard:createleave')
 
+        for error in form.non_field_errors():
+            messages.error(request,error,extra_tags = 'alert alert-warning alert-dismissible show')
         messages.error(request,'failed to Request a Leave,please check entry dates',extra_tags = 'alert alert-warning alert-dismissible show')
         return redirect('dashboard:createleave')
 
@@ -493,17 +686,42 @@ def leave_creation(request):
     return render(request,'dashboard/create_leave.html',dataset)
 
 
+@conditional_page(lambda request: [cache.GLOBAL_VERSION_KEY] if request.user.is_staff and request.user.is_superuser else None)
 def leaves_list(request):
     if not (request.user.is_staff and request.user.is_superuser):
         return redirect('/')
-    leaves = Leave.objects.all_pending_leaves()
+    leaves = Leave.objects.all_pending_leaves().for_list()
     return render(request,'dashboard/leaves_recent.html',{'leave_list':leaves,'title':'leaves list - pending'})
 
 
+def leaves_bulk_action(request):
+    '''
+    approve, reject or cancel the pending leaves ticked in the pending list
+    '''
+    if request.method != 'POST':
+        return redirect('dashboard:leaveslist')
+    if not (request.user.is_staff and request.user.is_superuser):
+        return redirect('/')
+
+    action = request.POST.get('action')
+    ids = [leave_id for leave_id in request.POST.getlist('leave_ids') if leave_id.isdigit()]
+    if action not in transitions.BULK_ACTIONS or not ids:
+        messages.error(request, 'Select leaves and an action first.', extra_tags='alert alert-warning alert-dismissible show')
+        return redirect('dashboard:leaveslist')
+
+    moved = transitions.bulk_transition(action, [int(leave_id) for leave_id in ids])
+    skipped = len(ids) - len(moved)
+    message = '{0} leave(s) {1}'.format(len(moved), transitions.TRANSITIONS[action][1]['status'])
+    if skipped:
+        message += ', {0} skipped (no longer pending)'.format(skipped)
+    messages.success(request, message, extra_tags='alert alert-success alert-dismissible show')
+    return redirect('dashboard:leaveslist')
+
+
 def leaves_approved_list(request):
     if not (request.user.is_superuser and request.user.is_staff):
         return redirect('/')
-    leaves = Leave.objects.all_approved_leaves()
+    leaves = Leave.objects.all_approved_leaves().for_list()
     return render(request,'dashboard/leaves_approved.html',{'leave_list':leaves,'title':'approved leave list'})
 
 
@@ -511,8 +729,8 @@ def leaves_view(request,id):
     if not (request.user.is_authenticated):
         return redirect('/')
 
-    leave = get_object_or_404(Leave, id = id)
-    employee = Employee.objects.filter(user = leave.user).first()
+    leave = get_object_or_404(Leave.objects.select_related('user'), id = id)
+    employee = Employee.objects.filter(user_id = leave.user_id).first()
     if not employee:
         messages.error(request, 'No employee profile found for this user.', extra_tags='alert alert-warning alert-dismissible show')
         return redirect('dashboard:leaveslist')
@@ -525,22 +743,22 @@ def approve_leave(request,id):
         return redirect('dashboard:leaveslist')
     if not (request.user.is_superuser and request.user.is_authenticated):
         return redirect('/')
-    leave = get_object_or_404(Leave, id = id)
-    user = leave.user
-    employee = Employee.objects.filter(user = user).first()
-    if not employee:
+    leave = get_object_or_404(Leave.objects.with_employee(), id = id)
+    if leave.employee_pk is None:
         messages.error(request, 'No employee profile found for this user.', extra_tags='alert alert-warning alert-dismissible show')
         return redirect('dashboard:leaveslist')
     
-    leave.approve_leave
-    messages.success(request,'Leave successfully approved for {0}'.format(employee.get_full_name),extra_tags = 'alert alert-success alert-dismissible show')
+    if not leave.approve_leave:
+        messages.warning(request,'Leave is {0}, only pending leaves can be approved'.format(leave.status),extra_tags = 'alert alert-warning alert-dismissible show')
+        return redirect('dashboard:userleaveview', id = id)
+    messages.success(request,'Leave successfully approved for {0}'.format(leave.employee_name),extra_tags = 'alert alert-success alert-dismissible show')
     return redirect('dashboard:userleaveview', id = id)
 
 
 def cancel_leaves_list(request):
     if not (request.user.is_superuser and request.user.is_authenticated):
         return redirect('/')
-    leaves = Leave.objects.all_cancel_leaves()
+    leaves = Leave.objects.all_cancel_leaves().for_list()
     return render(request,'dashboard/leaves_cancel.html',{'leave_list_cancel':leaves,'title':'Cancel leave list'})
 
 
@@ -556,8 +774,8 @@ def cancel_leave(request,id):
     if not (request.user.is_superuser and request.user.is_authenticated):
         return redirect('/')
     leave = get_object_or_404(Leave, id = id)
-    leave.leaves_cancel
-    messages.success(request,'Leave is canceled',extra_tags = 'alert alert-success alert-dismissible show')
+    if leave.leaves_cancel:
+        messages.success(request,'Leave is canceled',extra_tags = 'alert alert-success alert-dismissible show')
     return redirect('dashboard:canceleaveslist')
 
 
@@ -565,16 +783,14 @@ def uncancel_leave(request,id):
     if not (request.user.is_superuser and request.user.is_authenticated):
         return redirect('/')
     leave = get_object_or_404(Leave, id = id)
-    leave.status = 'pending'
-    leave.is_approved = False
-    leave.save()
-    messages.success(request,'Leave is uncanceled,now in pending list',extra_tags = 'alert alert-success alert-dismissible show')
+    if transitions.transition(leave, 'uncancel'):
+        messages.success(request,'Leave is uncanceled,now in pending list',extra_tags = 'alert alert-success alert-dismissible show')
     return redirect('dashboard:canceleaveslist')
 
 
 def leave_rejected_list(request):
     dataset = dict()
-    leave = Leave.objects.all_rejected_leaves()
+    leave = Leave.objects.all_rejected_leaves().for_list()
     dataset['leave_list_rejected'] = leave
     return render(request,'dashboard/rejected_leaves_list.html',dataset)
 
@@ -582,25 +798,23 @@ def leave_rejected_list(request):
 def reject_leave(request,id):
     dataset = dict()
     leave = get_object_or_404(Leave, id = id)
-    leave.reject_leave
-    messages.success(request,'Leave is rejected',extra_tags = 'alert alert-success alert-dismissible show')
+    if leave.reject_leave:
+        messages.success(request,'Leave is rejected',extra_tags = 'alert alert-success alert-dismissible show')
     return redirect('dashboard:leavesrejected')
 
 
 def unreject_leave(request,id):
     leave = get_object_or_404(Leave, id = id)
-    leave.status = 'pending'
-    leave.is_approved = False
-    leave.save()
-    messages.success(request,'Leave is now in pending list ',extra_tags = 'alert alert-success alert-dismissible show')
+    if transitions.transition(leave, 'unreject'):
+        messages.success(request,'Leave is now in pending list ',extra_tags = 'alert alert-success alert-dismissible show')
     return redirect('dashboard:leavesrejected')
 
 
 def view_my_leave_table(request):
     if request.user.is_authenticated:
         user = request.user
-        leaves = Leave.objects.filter(user = user)
-        employee = Employee.objects.filter(user = user).first()
+        leaves = Leave.objects.filter(user = user).for_list()
+        employee = Employee.objects.filter(user = user).only('id','firstname','lastname','othername').first()
         dataset = dict()
         dataset['leave_list'] = leaves
         dataset['employee'] = employee
@@ -1,9 +1,57 @@
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path
+
+from employee.importer import ImportFileError, import_employees
 from employee.models import Role,Department,Employee
 
 
+class EmployeeImportForm(forms.Form):
+    file = forms.FileField(help_text='.csv or .xlsx with a header row: username, firstname, lastname, birthday (required), '
+                                     'email, othername, department, role, religion, nationality, startdate, employeetype, employeeid, dateissued')
+    dry_run = forms.BooleanField(required=False, help_text='only validate the rows')
+
+
+class EmployeeAdmin(admin.ModelAdmin):
+    change_list_template = 'admin/employee/employee/change_list.html'
+    list_display = ('__str__', 'employeeid', 'department', 'role', 'employeetype', 'user')
+    list_select_related = ('department', 'role', 'user')
+
+    def get_urls(self):
+        return [
+            path('import/', self.admin_site.admin_view(self.import_view), name='employee_employee_import'),
+        ] + super().get_urls()
+
+    def import_view(self, request):
+        if not self.has_add_permission(request):
+            return redirect('admin:employee_employee_changelist')
+
+        report = None
+        form = EmployeeImportForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            upload = form.cleaned_data['file']
+            try:
+                report = import_employees(upload, upload.name, dry_run=form.cleaned_data['dry_run'])
+            except ImportFileError as error:
+                form.add_error('file', str(error))
+            else:
+                level = messages.SUCCESS if report.ok else messages.WARNING
+                self.message_user(request, '{0} {1} of {2} employees ({3} new users), {4} rows rejected'.format(
+                    'Validated' if form.cleaned_data['dry_run'] else 'Imported', report.created, report.rows,
+                    report.users_created, len(report.errors)), level)
+                if report.ok and not form.cleaned_data['dry_run']:
+                    return redirect('admin:employee_employee_changelist')
+
+        context = dict(
+            self.admin_site.each_context(request),
+            title='Import employees', opts=self.model._meta, form=form, report=report,
+        )
+        return TemplateResponse(request, 'admin/employee/employee/import.html', context)
+
 
 admin.site.register(Role)
 admin.site.register(Department)
 
-admin.site.register(Employee)
+admin.site.register(Employee, EmployeeAdmin)
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class EmployeeConfig(AppConfig):
     name = 'employee'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,274 @@
+"""
+Bulk employee import from CSV or XLSX files.
+
+Rows are read as a stream and handled in chunks: departments, roles,
+religions and nationalities are resolved by name from dictionaries
+loaded once, employee IDs go through employee.utility.code_format and
+are checked for duplicates (in the file and in the table) in the same
+pass, and each chunk is written with bulk_create. Users that do not
+exist yet are created without a usable password. Rows that fail are
+skipped and reported with their line number; the rest is imported.
+
+    report = import_employees(open('staff.csv', 'rb'), 'staff.csv')
+    report.created, report.errors -> 1999, [(14, 'unknown department "Fnance"')]
+"""
+import codecs
+import csv
+import datetime
+import os
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils.dateparse import parse_date
+
+from .models import Department, Employee, Nationality, Religion, Role
+from .signals import employees_imported
+from .utility import code_format
+
+
+COLUMNS = (
+    'username', 'email', 'firstname', 'lastname', 'othername', 'birthday', 'department', 'role',
+    'religion', 'nationality', 'startdate', 'employeetype', 'employeeid', 'dateissued',
+)
+REQUIRED = ('username', 'firstname', 'lastname', 'birthday')
+LOOKUPS = (('department', Department), ('role', Role), ('religion', Religion), ('nationality', Nationality))
+CHUNK_SIZE = 1000
+
+
+class ImportFileError(Exception):
+    '''
+    the file itself cannot be read: unknown format, missing columns
+    '''
+
+
+class ImportReport:
+    def __init__(self):
+        self.rows = 0
+        self.created = 0
+        self.users_created = 0
+        self.errors = [] # [(line, message), ...]
+
+    @property
+    def ok(self):
+        return not self.errors
+
+
+# ---------------- reading ----------------
+
+def _header(row):
+    header = [str(cell or '').strip().lower() for cell in row]
+    missing = [column for column in REQUIRED if column not in header]
+    if missing:
+        raise ImportFileError('missing column(s): {0}'.format(', '.join(missing)))
+    return header
+
+
+def read_csv(file):
+    '''
+    binary CSV file -> (line, {column: value}) for every data row, utf-8 (BOM tolerated)
+    '''
+    reader = csv.reader(codecs.iterdecode(file, 'utf-8-sig'))
+    header = _header(next(reader, []))
+    for line, row in enumerate(reader, start=2):
+        if any(cell.strip() for cell in row):
+            yield line, dict(zip(header, row))
+
+
+def read_xlsx(file):
+    '''
+    XLSX file -> (line, {column: value}) for every data row of the first sheet,
+    read in openpyxl's streaming (read-only) mode
+    '''
+    try:
+        import openpyxl
+    except ModuleNotFoundError:
+        raise ImportFileError('reading .xlsx files requires openpyxl')
+
+    workbook = openpyxl.load_workbook(file, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = _header(next(rows, ()))
+        for line, row in enumerate(rows, start=2):
+            if any(cell not in (None, '') for cell in row):
+                yield line, dict(zip(header, row))
+    finally:
+        workbook.close()
+
+
+def read_rows(file, name):
+    extension = os.path.splitext(name)[1].lower()
+    if extension == '.csv':
+        return read_csv(file)
+    if extension == '.xlsx':
+        return read_xlsx(file)
+    raise ImportFileError('unsupported file type "{0}", expected .csv or .xlsx'.format(extension))
+
+
+# ---------------- importing ----------------
+
+def _text(value):
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        value = int(value) # numeric cells of spreadsheets
+    return str(value).strip()
+
+
+def _date(value, column, required=False):
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    text = _text(value)
+    if not text:
+        if required:
+            raise ValueError('{0} is required'.format(column))
+        return None
+    try:
+        date = parse_date(text)
+    except ValueError:
+        date = None
+    if date is None:
+        raise ValueError('{0} "{1}" is not a date (YYYY-MM-DD)'.format(column, text))
+    return date
+
+
+class EmployeeImporter:
+    '''
+    one import run; lookups and the known employee IDs are loaded once, in __init__
+    '''
+
+    def __init__(self, dry_run=False):
+        self.dry_run = dry_run
+        self.report = ImportReport()
+        self.lookups = {
+            column: {name.strip().lower(): pk for pk, name in model.objects.values_list('pk', 'name')}
+            for column, model in LOOKUPS
+        }
+        self.employee_types = {value.lower(): value for value, _ in Employee.EMPLOYEETYPE}
+        self.employee_ids = set(Employee.objects.all_employees().exclude(employeeid=None).values_list('employeeid', flat=True))
+        self.usernames = set()
+        self.user_ids = []
+
+    def parse(self, row):
+        '''
+        {column: cell} -> (unsaved Employee without user, username, email); raises ValueError
+        '''
+        values = {column: row.get(column) for column in COLUMNS}
+        for column in REQUIRED:
+            if not _text(values[column]):
+                raise ValueError('{0} is required'.format(column))
+
+        username = _text(values['username'])
+        if username.lower() in self.usernames:
+            raise ValueError('username "{0}" appears twice in the file'.format(username))
+
+        related = {}
+        for column, _ in LOOKUPS:
+            name = _text(values[column])
+            if name:
+                if name.lower() not in self.lookups[column]:
+                    raise ValueError('unknown {0} "{1}"'.format(column, name))
+                related[column + '_id'] = self.lookups[column][name.lower()]
+
+        employeetype = _text(values['employeetype'])
+        if employeetype and employeetype.lower() not in self.employee_types:
+            raise ValueError('unknown employeetype "{0}"'.format(employeetype))
+
+        employeeid = None
+        raw_id = _text(values['employeeid'])
+        if raw_id:
+            compact = raw_id.upper().replace('/', '')
+            employeeid = code_format(compact[3:] if compact.startswith('RGL') else compact)
+            if not employeeid or len(employeeid) > Employee._meta.get_field('employeeid').max_length:
+                raise ValueError('employeeid "{0}" is not a valid ID (eg. A0091)'.format(raw_id))
+            if employeeid in self.employee_ids:
+                raise ValueError('duplicate employeeid {0}'.format(employeeid))
+
+        employee = Employee(
+            firstname=_text(values['firstname']), lastname=_text(values['lastname']),
+            othername=_text(values['othername']) or None,
+            birthday=_date(values['birthday'], 'birthday', required=True),
+            startdate=_date(values['startdate'], 'startdate'),
+            dateissued=_date(values['dateissued'], 'dateissued'),
+            employeetype=self.employee_types.get(employeetype.lower(), Employee.FULL_TIME),
+            employeeid=employeeid, **related
+        )
+        # claimed only once the whole row is valid
+        self.usernames.add(username.lower())
+        if employeeid:
+            self.employee_ids.add(employeeid)
+        return employee, username, _text(values['email'])
+
+    def import_chunk(self, chunk):
+        '''
+        chunk: [(line, row), ...] -> parses, links users and bulk inserts the valid rows
+        '''
+        parsed = []
+        for line, row in chunk:
+            try:
+                parsed.append((line,) + self.parse(row))
+            except ValueError as error:
+                self.report.errors.append((line, str(error)))
+        if not parsed:
+            return
+
+        users = {user.username: user for user in User.objects.filter(username__in=[username for _, _, username, _ in parsed]).only('id', 'username')}
+        profiled = set(Employee.objects.filter(user__in=users.values()).values_list('user_id', flat=True))
+
+        rows, new_users = [], []
+        for line, employee, username, email in parsed:
+            user = users.get(username)
+            if user is not None and user.pk in profiled:
+                self.report.errors.append((line, 'user "{0}" already has an employee profile'.format(username)))
+                self.employee_ids.discard(employee.employeeid)
+                continue
+            if user is None:
+                user = User(username=username, email=email, first_name=employee.firstname[:150], last_name=employee.lastname[:150])
+                user.set_unusable_password()
+                new_users.append(user)
+                users[username] = user
+            rows.append((employee, username))
+
+        if self.dry_run:
+            self.report.created += len(rows)
+            self.report.users_created += len(new_users)
+            return
+
+        if new_users:
+            User.objects.bulk_create(new_users)
+            users.update(User.objects.filter(username__in=[user.username for user in new_users]).only('id', 'username').in_bulk(field_name='username'))
+        for employee, username in rows:
+            employee.user_id = users[username].pk
+        Employee.objects.bulk_create([employee for employee, _ in rows])
+
+        self.user_ids += [employee.user_id for employee, _ in rows]
+        self.report.created += len(rows)
+        self.report.users_created += len(new_users)
+
+    def run(self, rows):
+        '''
+        rows: (line, {column: value}) iterable -> ImportReport; the file is imported in one transaction
+        '''
+        with transaction.atomic():
+            chunk = []
+            for line, row in rows:
+                self.report.rows += 1
+                chunk.append((line, row))
+                if len(chunk) == CHUNK_SIZE:
+                    self.import_chunk(chunk)
+                    chunk = []
+            self.import_chunk(chunk)
+
+            if self.user_ids:
+                employees_imported.send(sender=Employee, user_ids=self.user_ids)
+        self.report.errors.sort()
+        return self.report
+
+
+def import_employees(file, name, dry_run=False):
+    '''
+    imports a .csv or .xlsx file (opened in binary mode) -> ImportReport
+    raises ImportFileError when the file cannot be read at all
+    '''
+    return EmployeeImporter(dry_run=dry_run).run(read_rows(file, name))
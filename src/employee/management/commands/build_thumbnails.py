@@ -0,0 +1,41 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from employee import thumbnails
+from employee.models import Employee
+
+
+class Command(BaseCommand):
+    help = 'Write the missing profile image thumbnails of every employee, decoding images in a process pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count(), help='worker processes (default: one per CPU)')
+        parser.add_argument('--force', action='store_true', help='rewrite thumbnails that exist already')
+        parser.add_argument('--strict', action='store_true', help='exit non-zero when any image could not be read')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        names = sorted(set(Employee._base_manager.exclude(image='').exclude(image__isnull=True).values_list('image', flat=True)))
+
+        # the workers only touch the media storage; do not hand them the open connections
+        connections.close_all()
+        workers = max(1, options['workers'] or 1)
+        written, errors = 0, []
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            build = partial(thumbnails.build, force=options['force'])
+            for _, names_written, error in pool.map(build, names, chunksize=max(1, len(names) // (workers * 4))):
+                written += len(names_written)
+                if error:
+                    errors.append(error)
+
+        for error in errors:
+            self.stderr.write(error)
+        self.stdout.write(self.style.SUCCESS('{0} thumbnails written for {1} images with {2} workers, {3} unreadable, in {4:.1f}s'.format(
+            written, len(names), workers, len(errors), time.perf_counter() - started)))
+        if errors and options['strict']:
+            raise CommandError('{0} images could not be read'.format(len(errors)))
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from employee.importer import ImportFileError, import_employees
+
+
+class Command(BaseCommand):
+    help = 'Import employees (and their user accounts) from a .csv or .xlsx file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='.csv or .xlsx file with a header row, see employee.importer.COLUMNS')
+        parser.add_argument('--dry-run', action='store_true', help='validate every row without writing anything')
+        parser.add_argument('--strict', action='store_true', help='exit non-zero when any row was rejected')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            with open(options['path'], 'rb') as file:
+                report = import_employees(file, options['path'], dry_run=options['dry_run'])
+        except (OSError, ImportFileError) as error:
+            raise CommandError(error)
+
+        for line, message in report.errors:
+            self.stderr.write('line {0}: {1}'.format(line, message))
+        self.stdout.write(self.style.SUCCESS('{0} {1} of {2} employees ({3} new users), {4} rows rejected in {5:.1f}s'.format(
+            'Validated' if options['dry_run'] else 'Imported', report.created, report.rows,
+            report.users_created, len(report.errors), time.perf_counter() - started)))
+        if report.errors and options['strict']:
+            raise CommandError('{0} rows rejected'.format(len(report.errors)))
@@ -1,7 +1,24 @@
 from django.db import models
 import datetime
 
-class EmployeeManager(models.Manager):
+
+LIST_FIELDS = (
+    'id', 'firstname', 'lastname', 'othername', 'employeeid', 'image', 'is_blocked', 'created',
+    'user__id', 'user__username', 'user__is_active', 'user__is_superuser',
+    'department__id', 'department__name', 'role__id', 'role__name',
+)
+
+
+class EmployeeQuerySet(models.QuerySet):
+    def for_list(self):
+        '''
+        Employee.objects.for_list() -> projection for employee/user tables
+        joins user, department and role and loads only the columns the tables render
+        '''
+        return self.select_related('user', 'department', 'role').only(*LIST_FIELDS)
+
+
+class EmployeeManager(models.Manager.from_queryset(EmployeeQuerySet)):
     def get_queryset(self):
         '''
         Employee.objects.all() -> returns only active employees ie.is_deleted = False
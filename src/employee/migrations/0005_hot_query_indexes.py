@@ -0,0 +1,21 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('employee', '0004_nationality_religion_employee_nationality_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='employee',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['department'], name='employee_active_dept_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='employee',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['-created'], name='employee_active_created_idx'),
+        ),
+    ]
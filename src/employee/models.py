@@ -1,12 +1,13 @@
 import datetime
-from django.db import models
+from django.db import models, transaction
 from django.utils.translation import gettext_lazy as _
 from django.contrib.auth.models import User
 from phonenumber_field.modelfields import PhoneNumberField
 
+from employee import thumbnails
 from employee.utility import code_format
 from employee.managers import EmployeeManager
-from leave.models import Leave
+from leave.models import Leave, LeaveBalance
 
 
 # ---------------------------------------------------------
@@ -191,6 +192,11 @@ class Employee(models.Model):
         verbose_name = _('Employee')
         verbose_name_plural = _('Employees')
         ordering = ['-created']
+        indexes = [
+            # partial indexes over active employees, the rows EmployeeManager returns
+            models.Index(fields=['department'], condition=models.Q(is_deleted=False), name='employee_active_dept_idx'),
+            models.Index(fields=['-created'], condition=models.Q(is_deleted=False), name='employee_active_created_idx'),
+        ]
 
     def __str__(self):
         return self.get_full_name or "Unnamed Employee"
@@ -224,26 +230,40 @@ class Employee(models.Model):
             age -= 1
         return age
 
+    # -----------------------------------------------------
+    # THUMBNAILS
+    # -----------------------------------------------------
+    @property
+    def thumbnails(self):
+        """
+        URLs of the profile image thumbnails, see employee.thumbnails:
+        {{ employee.thumbnails.large.webp }}, {{ employee.thumbnails.small.jpeg }}
+        """
+        if not self.image:
+            return None
+        return thumbnails.urls(self.image.name)
+
     # -----------------------------------------------------
     # CAN APPLY LEAVE (Future Use)
     # -----------------------------------------------------
     @property
     def can_apply_leave(self):
         """
-        Placeholder for leave-logic.
-        You can add logic like:
-        Count leave for current year, compare with allowed days etc.
+        True while the employee has leave days left to request this year
+        (one indexed read of the leave balance ledger).
         """
-        return True
+        return LeaveBalance.objects.balance_for(self.user_id).available > 0
 
     # -----------------------------------------------------
     # SAVE (override)
     # -----------------------------------------------------
     def save(self, *args, **kwargs):
         """
-        Auto-formatting employee ID before saving model.
+        Auto-formatting employee ID before saving model; the post_save
+        receivers (change feed outbox) run in the same transaction.
         """
         if self.employeeid:
             self.employeeid = code_format(self.employeeid)
 
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
@@ -0,0 +1,30 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_save, pre_save
+from django.dispatch import Signal, receiver
+
+from . import thumbnails
+from .models import Employee
+
+
+# sent by employee.importer inside the import transaction, instead of a post_save per
+# employee; like post_save, receivers defer side effects with on_commit
+# kwargs: user_ids of the imported employees
+employees_imported = Signal()
+
+
+@receiver(pre_save, sender=Employee)
+def remember_new_image(sender, instance, raw=False, **kwargs):
+    '''
+    an image assigned from an upload is not committed to storage until the save
+    '''
+    instance._new_image = bool(not raw and instance.image and not instance.image._committed)
+
+
+@receiver(post_save, sender=Employee)
+def generate_thumbnails(sender, instance, raw=False, **kwargs):
+    if getattr(instance, '_new_image', False):
+        instance._new_image = False
+        # build() rather than generate(): an upload that is not a readable image keeps only its original
+        transaction.on_commit(partial(thumbnails.build, instance.image.name))
@@ -1,3 +1,225 @@
-from django.test import TestCase
+import datetime
+import io
+import os
+import shutil
+import tempfile
+from unittest import skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from PIL import Image
+
+from dashboard import search
+from dashboard.testing import TemporarySearchIndex
+from leave import balances, durations, rollups
+from leave.models import Leave, LeaveStatistic
+from . import thumbnails
+from .importer import ImportFileError, import_employees
+from .models import Department, Employee, Role
+
+try:
+    import openpyxl
+except ModuleNotFoundError:
+    openpyxl = None
+
+
+HEADER = 'username,email,firstname,lastname,birthday,department,role,employeetype,employeeid\n'
+
+
+def csv_file(*rows):
+    return io.BytesIO((HEADER + ''.join(row + '\n' for row in rows)).encode())
+
+
+class EmployeeImportTest(TemporarySearchIndex, TestCase):
+
+    def setUp(self):
+        self.finance = Department.objects.create(name='Finance')
+        self.role = Role.objects.create(name='Accountant')
+
+    def test_csv_rows_are_imported(self):
+        existing = User.objects.create(username='ama')
+        with self.captureOnCommitCallbacks(execute=True):
+            report = import_employees(csv_file(
+                'ama,,Ama,Mensah,1990-01-01,finance,Accountant,part-time,A0091',
+                'kofi,kofi@example.com,Kofi,Boateng,1988-05-04,,,,rgl/b1/002',
+            ), 'staff.csv')
+
+        self.assertEqual((report.rows, report.created, report.users_created, report.errors), (2, 2, 1, []))
+        ama = Employee.objects.get(user=existing)
+        self.assertEqual((ama.department, ama.role, ama.employeetype, ama.employeeid), (self.finance, self.role, Employee.PART_TIME, 'RGL/A0/091'))
+        kofi = Employee.objects.get(user__username='kofi')
+        self.assertEqual((kofi.employeeid, kofi.birthday, kofi.employeetype), ('RGL/B1/002', datetime.date(1988, 5, 4), Employee.FULL_TIME))
+        self.assertFalse(kofi.user.has_usable_password())
+        self.assertEqual(search.search('kofi', 'employee'), [kofi.pk])
+
+    @override_settings(LEAVE_WORK_WEEKS={None: 'Mon Tue Wed Thu Fri', 'Part-Time': 'Mon Tue'}, LEAVE_HOLIDAY_COUNTRY=None)
+    def test_leaves_of_existing_users_move_to_the_imported_profile(self):
+        existing = User.objects.create(username='ama')
+        Leave.objects.create(user=existing, startdate=datetime.date(2024, 3, 4), enddate=datetime.date(2024, 3, 8), status='approved')
+
+        import_employees(csv_file('ama,,Ama,Mensah,1990-01-01,Finance,,part-time,'), 'staff.csv')
+
+        self.assertEqual(Leave.objects.get().duration, 2)
+        self.assertEqual(list(LeaveStatistic.objects.filter(days__gt=0).values_list('department', 'days')), [(self.finance.pk, 2)])
+        self.assertEqual((rollups.drift(), balances.drift(), durations.drift()), ({}, {}, {}))
+
+    def test_bad_rows_are_reported_and_skipped(self):
+        user = User.objects.create(username='yaw')
+        Employee.objects.create(user=user, firstname='Yaw', lastname='Asante', birthday=datetime.date(1990, 1, 1), employeeid='A0001')
+
+        report = import_employees(csv_file(
+            'esi,,Esi,Owusu,1991-02-03,Finance,,,A0002',
+            'efua,,Efua,Owusu,1991-02-03,Finance,,,RGLA0002',
+            'abena,,Abena,Osei,1991-02-03,Fnance,,,',
+            'kwame,,Kwame,Osei,03/02/1991,,,,',
+            'esi,,Esi,Darko,1991-02-03,,,,',
+            'yaw,,Yaw,Asante,1990-01-01,,,,',
+            'kojo,,Kojo,Asante,1990-01-01,,,,a0001',
+            ',,Nobody,Here,1990-01-01,,,,',
+        ), 'staff.csv')
+
+        self.assertEqual(report.created, 1)
+        self.assertEqual(report.errors, [
+            (3, 'duplicate employeeid RGL/A0/002'),
+            (4, 'unknown department "Fnance"'),
+            (5, 'birthday "03/02/1991" is not a date (YYYY-MM-DD)'),
+            (6, 'username "esi" appears twice in the file'),
+            (7, 'user "yaw" already has an employee profile'),
+            (8, 'duplicate employeeid RGL/A0/001'),
+            (9, 'username is required'),
+        ])
+        self.assertEqual(Employee.objects.count(), 2)
+
+    def test_dry_run_writes_nothing(self):
+        report = import_employees(csv_file('esi,,Esi,Owusu,1991-02-03,,,,'), 'staff.csv', dry_run=True)
+        self.assertEqual((report.created, report.users_created), (1, 1))
+        self.assertFalse(User.objects.exists())
+
+    def test_unreadable_files_raise(self):
+        with self.assertRaises(ImportFileError):
+            import_employees(io.BytesIO(b'name\nAma\n'), 'staff.csv')
+        with self.assertRaises(ImportFileError):
+            import_employees(io.BytesIO(b''), 'staff.txt')
+
+    def test_queries_do_not_grow_with_rows(self):
+        rows = ['user{0},,First,Last,1990-01-01,Finance,,,'.format(index) for index in range(300)]
+        with CaptureQueriesContext(connection) as queries:
+            report = import_employees(csv_file(*rows), 'staff.csv')
+        self.assertEqual((report.created, report.errors), (300, []))
+        # 4 lookups and the employee IDs, the users before and after their bulk insert, the
+        # imported rows for the change feed, and their profiles and leaves for the leave statistics
+        # and durations; the rest are bulk INSERTs, split only by the backend's parameter limit
+        selects = [query['sql'] for query in queries if query['sql'].startswith('SELECT')]
+        self.assertEqual(len(selects), 11)
+
+    @skipUnless(openpyxl, 'openpyxl is not installed')
+    def test_xlsx_rows_are_imported(self):
+        workbook = openpyxl.Workbook()
+        sheet = workbook.active
+        sheet.append(['Username', 'Firstname', 'Lastname', 'Birthday', 'EmployeeID'])
+        sheet.append(['esi', 'Esi', 'Owusu', datetime.datetime(1991, 2, 3), 'A0003'])
+        content = io.BytesIO()
+        workbook.save(content)
+        content.seek(0)
+
+        report = import_employees(content, 'staff.xlsx')
+        self.assertEqual((report.created, report.errors), (1, []))
+        self.assertEqual(Employee.objects.get().birthday, datetime.date(1991, 2, 3))
+
+    def test_command(self):
+        path = os.path.join(tempfile.mkdtemp(), 'staff.csv')
+        with open(path, 'wb') as file:
+            file.write(csv_file('esi,,Esi,Owusu,1991-02-03,,,,', 'ato,,Ato,Owusu,yesterday,,,,').getvalue())
+        stdout, stderr = io.StringIO(), io.StringIO()
+        call_command('import_employees', path, stdout=stdout, stderr=stderr)
+        self.assertIn('Imported 1 of 2 employees', stdout.getvalue())
+        self.assertIn('line 3: birthday "yesterday" is not a date', stderr.getvalue())
+
+    def test_admin_upload(self):
+        admin = User.objects.create_superuser('admin', 'admin@example.com', 'secret')
+        self.client.force_login(admin)
+        upload = SimpleUploadedFile('staff.csv', csv_file('esi,,Esi,Owusu,1991-02-03,,,,', 'ato,,Ato,Owusu,,,,,').getvalue())
+        response = self.client.post(reverse('admin:employee_employee_import'), {'file': upload})
+        self.assertContains(response, 'birthday is required')
+        self.assertTrue(Employee.objects.filter(user__username='esi').exists())
+
+
+def photo(orientation=6):
+    '''
+    400x200 JPEG, red left half and blue right half, with EXIF orientation and metadata
+    '''
+    image = Image.new('RGB', (400, 200), 'blue')
+    image.paste((255, 0, 0), (0, 0, 200, 200))
+    exif = Image.Exif()
+    exif[0x0112] = orientation
+    exif[0x013B] = 'Ama Mensah' # Artist
+    content = io.BytesIO()
+    image.save(content, 'JPEG', exif=exif)
+    return content.getvalue()
+
+
+class ThumbnailTest(TemporarySearchIndex, TestCase):
+
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        self.settings_override = override_settings(MEDIA_ROOT=media)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        self.media = media
+
+    def create_employee(self, username, image):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Employee.objects.create(user=User.objects.create(username=username), firstname=username, lastname='Test',
+                                           birthday=datetime.date(1990, 1, 1), image=image)
+
+    def thumbnail_paths(self, name):
+        return [os.path.join(self.media, thumbnail) for thumbnail in thumbnails.thumbnail_names(name)]
+
+    def test_upload_writes_stripped_thumbnails(self):
+        employee = self.create_employee('ama', SimpleUploadedFile('ama.jpg', photo()))
+
+        self.assertEqual(employee.thumbnails['large'], {'webp': '/media/profiles/ama_320.webp', 'jpeg': '/media/profiles/ama_320.jpg'})
+        for label, size in thumbnails.SIZES.items():
+            for format, kind in (('webp', 'WEBP'), ('jpeg', 'JPEG')):
+                with Image.open(os.path.join(self.media, 'profiles', 'ama_{0}{1}'.format(size, thumbnails.EXTENSIONS[format]))) as image:
+                    self.assertEqual((image.format, image.size), (kind, (size, size)))
+                    self.assertEqual(len(image.getexif()), 0)
+                    # turned upright before the crop: red on top, blue below
+                    red, _, blue = image.convert('RGB').getpixel((size // 2, 2))
+                    self.assertGreater(red, 200)
+                    self.assertLess(blue, 60)
+
+        # saving again without a new upload does not touch them
+        modified = os.stat(self.thumbnail_paths(employee.image.name)[0]).st_mtime_ns
+        with self.captureOnCommitCallbacks(execute=True):
+            employee.save()
+        self.assertEqual(os.stat(self.thumbnail_paths(employee.image.name)[0]).st_mtime_ns, modified)
+
+    def test_unreadable_upload_keeps_only_the_original(self):
+        employee = self.create_employee('kofi', SimpleUploadedFile('kofi.jpg', b'not an image'))
+        self.assertTrue(os.path.exists(os.path.join(self.media, employee.image.name)))
+        self.assertFalse(any(os.path.exists(path) for path in self.thumbnail_paths(employee.image.name)))
+        # the templates show the original instead of a thumbnail that does not exist
+        original = '/media/' + employee.image.name
+        self.assertEqual(employee.thumbnails, {label: {'webp': original, 'jpeg': original} for label in thumbnails.SIZES})
+
+    def test_build_thumbnails_command(self):
+        ama = self.create_employee('ama', SimpleUploadedFile('ama.jpg', photo()))
+        self.create_employee('yaw', 'profiles/missing.jpg')
+        for path in self.thumbnail_paths(ama.image.name)[:3]:
+            os.remove(path)
+
+        stdout, stderr = io.StringIO(), io.StringIO()
+        call_command('build_thumbnails', workers=2, stdout=stdout, stderr=stderr)
+        self.assertIn('3 thumbnails written for 2 images with 2 workers, 1 unreadable', stdout.getvalue())
+        self.assertIn('profiles/missing.jpg: file not found', stderr.getvalue())
+        self.assertTrue(all(os.path.exists(path) for path in self.thumbnail_paths(ama.image.name)))
+
+        call_command('build_thumbnails', workers=2, force=True, stdout=stdout, stderr=stderr)
+        self.assertIn('6 thumbnails written for 2 images', stdout.getvalue())
@@ -0,0 +1,126 @@
+"""
+Profile image thumbnails.
+
+Avatars are shown at a few fixed sizes, so each uploaded Employee.image
+is decoded once and written again as square thumbnails in SIZES, in
+WebP and in JPEG (for browsers without WebP), next to the original:
+
+    profiles/avatar-3.jpg -> profiles/avatar-3_64.webp, profiles/avatar-3_64.jpg, ...
+
+The camera orientation is applied to the pixels and the metadata (EXIF,
+GPS, ICC, comments) is not carried over. Names follow from the original
+name, so templates build the URLs without a lookup (Employee.thumbnails)
+beyond one existence check: an unreadable upload keeps only its original
+and media older than the backfill has none yet, both are served the
+original instead. An upload gets a name of its own, so a thumbnail never
+changes once written. employee.signals writes them when an upload commits, the
+build_thumbnails command backfills existing media.
+
+This module does not import models, so build() can run in the worker
+processes of the backfill command.
+"""
+import io
+import os
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+
+SIZES = {'small': 64, 'medium': 160, 'large': 320} # pixels, square
+FORMATS = {'webp': ('WEBP', {'quality': 80, 'method': 6}), 'jpeg': ('JPEG', {'quality': 85, 'optimize': True, 'progressive': True})}
+EXTENSIONS = {'webp': '.webp', 'jpeg': '.jpg'}
+
+
+class ThumbnailError(Exception):
+    pass
+
+
+def thumbnail_name(name, size, format):
+    '''
+    original name -> name of its thumbnail; 'profiles/a.png', 160, 'webp' -> 'profiles/a_160.webp'
+    '''
+    return '{0}_{1}{2}'.format(os.path.splitext(name)[0], size, EXTENSIONS[format])
+
+
+def thumbnail_names(name):
+    return [thumbnail_name(name, size, format) for size in SIZES.values() for format in FORMATS]
+
+
+def urls(name, storage=default_storage):
+    '''
+    original name -> {'small': {'webp': url, 'jpeg': url}, 'medium': ..., 'large': ...}
+    every url is the original's while the thumbnails are missing; generate() writes the smallest JPEG last
+    '''
+    if not storage.exists(thumbnail_name(name, min(SIZES.values()), 'jpeg')):
+        original = storage.url(name)
+        return {label: {format: original for format in FORMATS} for label in SIZES}
+    return {
+        label: {format: storage.url(thumbnail_name(name, size, format)) for format in FORMATS}
+        for label, size in SIZES.items()
+    }
+
+
+def open_image(name, storage):
+    try:
+        with storage.open(name, 'rb') as file:
+            image = Image.open(io.BytesIO(file.read()))
+            # decode big JPEGs at the smallest scale that still covers the largest thumbnail
+            image.draft('RGB', (max(SIZES.values()),) * 2)
+            image = ImageOps.exif_transpose(image)
+            image.load()
+    except FileNotFoundError:
+        raise ThumbnailError('{0}: file not found'.format(name))
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError) as error:
+        raise ThumbnailError('{0}: not a readable image ({1})'.format(name, error))
+    if image.mode in ('P', 'LA') or (image.mode == 'RGB' and 'transparency' in image.info):
+        image = image.convert('RGBA')
+    elif image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGB')
+    return image
+
+
+def encode(image, format):
+    if format == 'jpeg' and image.mode == 'RGBA':
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+    kind, options = FORMATS[format]
+    output = io.BytesIO()
+    image.save(output, kind, **options) # no exif/icc_profile passed: the metadata is dropped
+    return output.getvalue()
+
+
+def generate(name, storage=default_storage, force=False):
+    '''
+    writes the thumbnails of the image stored under name -> [names written]
+    existing thumbnails are kept unless force; raises ThumbnailError for a missing or unreadable image
+    '''
+    missing = [
+        (size, format) for size in SIZES.values() for format in FORMATS
+        if force or not storage.exists(thumbnail_name(name, size, format))
+    ]
+    if not missing:
+        return []
+
+    image = open_image(name, storage)
+    written = []
+    for size in sorted({size for size, _ in missing}, reverse=True):
+        thumbnail = ImageOps.fit(image, (size, size), Image.LANCZOS)
+        for format in [format for missing_size, format in missing if missing_size == size]:
+            target = thumbnail_name(name, size, format)
+            if storage.exists(target):
+                storage.delete(target) # save() would pick another name
+            written.append(storage.save(target, ContentFile(encode(thumbnail, format))))
+    return written
+
+
+def build(name, force=False):
+    '''
+    generate() for a worker process -> (name, [names written], error message or None)
+    '''
+    try:
+        return name, generate(name, force=force), None
+    except ThumbnailError as error:
+        return name, [], str(error)
@@ -24,6 +24,13 @@ EMAIL_HOST_PASSWORD = 'yencommerce'#test
 EMAIL_PORT = 587
 EMAIL_USE_TLS = True
 
+# leave e-mails are queued (leave.LeaveNotification) and sent by the
+# send_leave_notifications worker; a failed send is retried after
+# RETRY_DELAY * 2**(attempts - 1) seconds, up to MAX_ATTEMPTS sends in all
+LEAVE_NOTIFICATION_MAX_ATTEMPTS = 5
+LEAVE_NOTIFICATION_RETRY_DELAY = 60
+LEAVE_NOTIFICATION_BATCH_SIZE = 100
+
 
 
 # Application definition
@@ -42,12 +49,15 @@ INSTALLED_APPS = [
     'crispy_bootstrap4',
     'phonenumber_field',
     'widget_tweaks',
+    'rest_framework',
+    'rest_framework.authtoken',
 
     # PROJECT APPS
     'dashboard',
     'accounts',
     'employee',
     'leave',
+    'api',
     
 ]
 
@@ -67,7 +77,6 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR, 'templates'),],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.debug',
@@ -75,6 +84,14 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
             ],
+            # templates are parsed once per process, whatever DEBUG says; runserver's
+            # autoreloader clears them when a template file changes
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
         },
     },
 ]
@@ -93,6 +110,81 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# dashboard data versions and hit counters, template fragments and API tokens are
+# invalidated through the cache, so in production every worker process and
+# management command (rebuilds, imports) must share one with atomic incr/add:
+# set REDIS_URL or MEMCACHED_LOCATION (`manage.py check --deploy` fails otherwise).
+# The locmem fallback is for development and tests only.
+
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+elif os.environ.get('MEMCACHED_LOCATION'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+            'LOCATION': os.environ['MEMCACHED_LOCATION'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# seconds a user's dashboard dataset stays cached; leave changes invalidate it earlier
+DASHBOARD_CACHE_TIMEOUT = 60 * 60
+# one dashboard read in this many updates the hit/miss counters (weighted to match),
+# so a cache hit does not pay a counter write each time
+DASHBOARD_CACHE_STATS_SAMPLE = 20
+
+# working days charged for leave (leave.workdays): the numpy weekmask of each
+# Employee.employeetype (None: anyone else), and the country (ISO code,
+# `holidays` package) whose public holidays are not charged
+LEAVE_WORK_WEEKS = {
+    None: 'Mon Tue Wed Thu Fri',
+    'Full-Time': 'Mon Tue Wed Thu Fri',
+    'Part-Time': 'Mon Tue Wed Thu Fri',
+    'Contract': 'Mon Tue Wed Thu Fri',
+    'Intern': 'Mon Tue Wed Thu Fri',
+}
+LEAVE_HOLIDAY_COUNTRY = 'GH'
+
+# change feed (dashboard.outbox): events behind a gap in the ids are held back
+# this long, superseded events are compacted after OUTBOX_COMPACT_AFTER_HOURS,
+# and events every consumer has read are dropped after OUTBOX_RETENTION_DAYS
+OUTBOX_SETTLE_SECONDS = 30
+OUTBOX_COMPACT_AFTER_HOURS = 24
+OUTBOX_RETENTION_DAYS = 7
+
+# JSON API (api): token calls skip the session table, and the token's user is cached
+# this many seconds (api.authentication); /api/<version>/ picks the version
+REST_FRAMEWORK = {
+    'DEFAULT_AUTHENTICATION_CLASSES': (
+        'api.authentication.CachedTokenAuthentication',
+        'rest_framework.authentication.SessionAuthentication',
+    ),
+    'DEFAULT_PERMISSION_CLASSES': ('rest_framework.permissions.IsAuthenticated',),
+    'DEFAULT_RENDERER_CLASSES': ('rest_framework.renderers.JSONRenderer',),
+    'DEFAULT_VERSIONING_CLASS': 'rest_framework.versioning.URLPathVersioning',
+    'ALLOWED_VERSIONS': ('v1',),
+}
+# api.signals drops a cached token on commit of the change, in every worker as the
+# cache is shared (see CACHES); the timeout bounds how long a deactivated user's token
+# could keep working if that delete is lost (cache unreachable, raw SQL updates)
+API_TOKEN_CACHE_TIMEOUT = 60
+
+# full-text search index (dashboard.search), an SQLite FTS5 file of its own
+SEARCH_INDEX = os.path.join(BASE_DIR, 'search_index.sqlite3')
+
+
 # Password validation
 # https://docs.djangoproject.com/en/2.1/ref/settings/#auth-password-validators
 
@@ -145,6 +237,14 @@ STATICFILES_DIRS = [
     os.path.join(BASE_DIR,'static_in_proj','our_static'),
 ]
 
+# collectstatic is the build step: content-hashed names plus .gz/.br copies, see hrsuit/staticfiles.py
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'hrsuit.staticfiles.CompressedManifestStaticFilesStorage'},
+}
+STATIC_IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60 # hashed names never change
+STATIC_MAX_AGE = 60 # names without a hash, revalidated after this
+
 
 # MEDIA - UPLOADED FILES/IMAGES
 MEDIA_URL = '/media/'
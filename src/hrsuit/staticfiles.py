@@ -0,0 +1,178 @@
+"""
+Fingerprinted, pre-compressed static files.
+
+Build step: `python manage.py collectstatic --noinput`. With
+CompressedManifestStaticFilesStorage as the staticfiles storage it copies
+every asset to STATIC_ROOT under a content-hashed name (css/demo.css ->
+css/demo.5e0f3a9c1b2d.css, url() references in CSS rewritten to match),
+records the names in staticfiles.json, and writes a .gz copy (and a .br
+copy when the optional `brotli` package is installed) of every text
+asset next to it. {% static %} looks names up in the manifest, so a
+changed file gets a new URL and an unchanged one keeps its URL across
+deploys.
+
+Serving: in production the front proxy serves STATIC_ROOT at STATIC_URL
+itself, with the headers serve() would send, e.g. for nginx:
+
+    location /static/ {
+        alias <STATIC_ROOT>/;
+        gzip_static on;  # and brotli_static on; with the brotli module
+        add_header Cache-Control "public, max-age=60";  # STATIC_MAX_AGE
+        location ~ "[.][0-9a-f]{12}[.][a-z0-9]+$" {
+            add_header Cache-Control "public, max-age=31536000, immutable";  # STATIC_IMMUTABLE_MAX_AGE
+        }
+    }
+
+serve() is the fallback for deployments without such a proxy (and for
+development and the tests): it answers STATIC_URL from STATIC_ROOT. A
+fingerprinted name can never change, so it is sent with a far-future
+immutable Cache-Control and browsers do not ask again; other names get
+STATIC_MAX_AGE and are revalidated with If-Modified-Since. The smallest
+pre-compressed variant the client accepts is sent as is, nothing is
+compressed per request. The fingerprinted names are collected into a set
+once, when the storage loads the manifest.
+
+Until collectstatic has written a manifest (a development checkout, the
+tests) names are served as they are.
+"""
+import gzip
+import mimetypes
+import os
+import posixpath
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+try:
+    import brotli
+except ModuleNotFoundError: # optional, without it only .gz variants are written
+    brotli = None
+
+
+# text formats; images and web fonts other than eot/ttf are compressed already
+COMPRESSIBLE = {'.css', '.js', '.map', '.json', '.svg', '.txt', '.html', '.xml', '.eot', '.ttf', '.otf', '.ico'}
+ENCODINGS = (('br', '.br'), ('gzip', '.gz')) # preferred first
+MIN_SAVING = 0.05 # a variant less than 5% smaller is not worth a second file
+
+
+# ---------------- build ----------------
+
+def compress(path):
+    '''
+    writes the missing .gz/.br variants of the file at path -> [variant paths written]
+    '''
+    with open(path, 'rb') as file:
+        content = file.read()
+    compressors = [('.gz', lambda data: gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        compressors.append(('.br', lambda data: brotli.compress(data, quality=11)))
+
+    written = []
+    for suffix, compressor in compressors:
+        if os.path.exists(path + suffix):
+            continue # hashed names are content addressed, an existing variant is up to date
+        compressed = compressor(content)
+        if len(compressed) <= len(content) * (1 - MIN_SAVING):
+            with open(path + suffix, 'wb') as file:
+                file.write(compressed)
+            written.append(path + suffix)
+    return written
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    '''
+    ManifestStaticFilesStorage that also pre-compresses the hashed files
+    fingerprinted: the hashed names, as a set for serve()
+    '''
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fingerprinted = frozenset(self.hashed_files.values())
+
+    def post_process(self, *args, **kwargs):
+        yield from super().post_process(*args, **kwargs)
+        if kwargs.get('dry_run'):
+            return
+        self.fingerprinted = frozenset(self.hashed_files.values())
+        for name in sorted(self.fingerprinted):
+            if os.path.splitext(name)[1].lower() in COMPRESSIBLE:
+                compress(self.path(name))
+
+    def url_converter(self, *args, **kwargs):
+        converter = super().url_converter(*args, **kwargs)
+
+        def convert(matchobj):
+            try:
+                return converter(matchobj)
+            except ValueError:
+                # the CSS references a file that is not shipped (bootstrap's glyphicons), it is
+                # a 404 either way: leave the reference alone instead of failing the build
+                return matchobj.group(0)
+        return convert
+
+    def stored_name(self, name):
+        if not self.hashed_files:
+            return name # collectstatic has not run
+        return super().stored_name(name)
+
+
+# ---------------- serving ----------------
+
+def accepted_encodings(request):
+    '''
+    Accept-Encoding -> {coding} the client takes (q > 0)
+    '''
+    accepted = set()
+    for part in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        coding, _, params = part.partition(';')
+        quality = params.strip().lower()
+        if quality.startswith('q='):
+            try:
+                if float(quality[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        if coding.strip():
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+def is_fingerprinted(name):
+    return name in getattr(staticfiles_storage, 'fingerprinted', ())
+
+
+def serve(request, path):
+    name = posixpath.normpath(path).lstrip('/')
+    try:
+        fullpath = safe_join(settings.STATIC_ROOT, name)
+    except SuspiciousFileOperation:
+        raise Http404('"{0}" does not exist'.format(path))
+    if not os.path.isfile(fullpath):
+        raise Http404('"{0}" does not exist'.format(path))
+
+    modified = os.stat(fullpath).st_mtime
+    variants = [(coding, fullpath + suffix) for coding, suffix in ENCODINGS if os.path.isfile(fullpath + suffix)]
+    if not was_modified_since(request.META.get('HTTP_IF_MODIFIED_SINCE'), modified):
+        response = HttpResponseNotModified()
+    else:
+        accepted = accepted_encodings(request)
+        coding, filepath = next(((coding, variant) for coding, variant in variants if coding in accepted), (None, fullpath))
+        content_type, _ = mimetypes.guess_type(name)
+        response = FileResponse(open(filepath, 'rb'), content_type=content_type or 'application/octet-stream', filename=os.path.basename(name))
+        response['Last-Modified'] = http_date(modified)
+        if coding:
+            response['Content-Encoding'] = coding
+
+    if variants:
+        patch_vary_headers(response, ['Accept-Encoding'])
+    if is_fingerprinted(name):
+        patch_cache_control(response, public=True, max_age=settings.STATIC_IMMUTABLE_MAX_AGE, immutable=True)
+    else:
+        patch_cache_control(response, public=True, max_age=settings.STATIC_MAX_AGE)
+    return response
@@ -0,0 +1,91 @@
+import gzip
+import os
+import shutil
+import tempfile
+
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management import call_command
+from django.templatetags.static import static
+from django.test import TestCase, override_settings
+
+from . import staticfiles
+
+
+CSS = 'body { background: url("../img/bg.png"); }\n@font-face { src: url("../fonts/missing.eot"); }\n' + '.row { margin: 0 auto; }\n' * 200
+
+
+class StaticPipelineTest(TestCase):
+    '''
+    collectstatic fingerprints and pre-compresses, serve() sends the variants with long-lived headers
+    '''
+
+    def setUp(self):
+        source, self.root = tempfile.mkdtemp(), tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, source)
+        self.addCleanup(shutil.rmtree, self.root)
+        for name, content in (('css/site.css', CSS.encode()), ('img/bg.png', b'\x89PNG' + bytes(range(256)))):
+            os.makedirs(os.path.join(source, os.path.dirname(name)), exist_ok=True)
+            with open(os.path.join(source, name), 'wb') as file:
+                file.write(content)
+
+        self.settings_override = override_settings(
+            STATICFILES_DIRS=[source], STATIC_ROOT=self.root,
+            STATICFILES_FINDERS=['django.contrib.staticfiles.finders.FileSystemFinder'],
+        )
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+
+    def collect(self):
+        call_command('collectstatic', interactive=False, verbosity=0)
+
+    def test_names_are_plain_until_collected(self):
+        self.assertEqual(static('css/site.css'), '/static/css/site.css')
+
+    def test_collectstatic_fingerprints_and_compresses(self):
+        self.collect()
+        css, png = staticfiles_storage.stored_name('css/site.css'), staticfiles_storage.stored_name('img/bg.png')
+        self.assertRegex(css, r'^css/site\.[0-9a-f]{12}\.css$')
+        self.assertEqual(static('css/site.css'), '/static/' + css)
+
+        with open(os.path.join(self.root, css)) as file:
+            content = file.read()
+        self.assertIn('../img/' + os.path.basename(png), content)
+        self.assertIn('../fonts/missing.eot', content) # not shipped, left alone
+        with gzip.open(os.path.join(self.root, css + '.gz'), 'rt') as file:
+            self.assertEqual(file.read(), content)
+        self.assertFalse(os.path.exists(os.path.join(self.root, png + '.gz'))) # compressed already
+
+        # the hashed names are read into a set once, with the manifest
+        self.assertTrue(staticfiles.is_fingerprinted(css))
+        self.assertFalse(staticfiles.is_fingerprinted('css/site.css'))
+        self.assertEqual(staticfiles.CompressedManifestStaticFilesStorage().fingerprinted, {css, png})
+
+    def test_serve_sends_the_compressed_variant_with_immutable_headers(self):
+        self.collect()
+        url = static('css/site.css')
+
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='br;q=0, gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('max-age=31536000', response['Cache-Control'])
+        self.assertIn('Accept-Encoding', response['Vary'])
+        compressed = b''.join(response.streaming_content)
+        self.assertEqual(gzip.decompress(compressed).decode(), CSS.replace('../img/bg.png', '../img/' + os.path.basename(staticfiles_storage.stored_name('img/bg.png'))))
+
+        plain = self.client.get(url)
+        self.assertFalse(plain.has_header('Content-Encoding'))
+        self.assertGreater(int(plain['Content-Length']), len(compressed))
+
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304)
+
+        unhashed = self.client.get('/static/css/site.css')
+        self.assertNotIn('immutable', unhashed['Cache-Control'])
+        self.assertIn('max-age=60', unhashed['Cache-Control'])
+
+        self.assertEqual(self.client.get('/static/../hrsuit/settings.py').status_code, 404)
+        self.assertEqual(self.client.get('/static/css/none.css').status_code, 404)
+
+    def test_accepted_encodings(self):
+        request = type('Request', (), {'META': {'HTTP_ACCEPT_ENCODING': 'gzip;q=0.5, br, identity;q=0, x;q=oops'}})
+        self.assertEqual(staticfiles.accepted_encodings(request), {'gzip', 'br'})
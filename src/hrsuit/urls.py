@@ -13,11 +13,13 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+import re
+
 from django.conf import settings
 from django.conf.urls.static import static
 from django.contrib import admin
-from django.urls import path,include
-from .import views
+from django.urls import path,re_path,include
+from .import staticfiles, views
 
 
 urlpatterns = [
@@ -25,12 +27,14 @@ urlpatterns = [
     path('',views.index_view,name='home'),
     path('accounts/',include('accounts.urls',namespace='accounts')),
     path('dashboard/',include('dashboard.urls',namespace='dashboard')),
+    re_path(r'^api/(?P<version>v1)/',include('api.urls',namespace='api')),
+    # fallback only: in production the front proxy serves STATIC_ROOT, see hrsuit/staticfiles.py
+    re_path(r'^{0}(?P<path>.*)$'.format(re.escape(settings.STATIC_URL.lstrip('/'))),staticfiles.serve,name='static'),
 ]
 
 
 
 if settings.DEBUG:
-    urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
 
 
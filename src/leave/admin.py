@@ -1,6 +1,8 @@
 from django.contrib import admin
-from .models import Leave
+from django.utils import timezone
+from .models import Leave, LeaveBalance, LeaveNotification
 from .forms import LeaveAdminForm
+from . import transitions
 # from .models import Comment
 
 
@@ -11,12 +13,62 @@ class LeaveAdmin(admin.ModelAdmin):
             'fields': ('user', 'startdate', 'enddate', 'leavetype', 'reason', 'defaultdays', 'status', 'is_approved', 'is_rejected')
         }),
     )
-    list_display = ('user', 'startdate', 'enddate', 'leavetype', 'status', 'is_approved', 'is_rejected')
+    list_display = ('user', 'employee', 'startdate', 'enddate', 'leavetype', 'status', 'is_approved', 'is_rejected')
     list_filter = ('status', 'is_approved', 'is_rejected')
     search_fields = ('user__username', 'leavetype')
+    actions = ('approve_selected', 'reject_selected', 'cancel_selected')
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('user').with_employee()
+
+    @admin.display(description='Employee')
+    def employee(self, obj):
+        return obj.employee_name or '-'
+
+    def transition_selected(self, request, queryset, action):
+        selected = list(queryset.values_list('pk', flat=True))
+        moved = transitions.bulk_transition(action, selected)
+        self.message_user(request, '{0} leave(s) {1}, {2} skipped (not pending)'.format(
+            len(moved), transitions.TRANSITIONS[action][1]['status'], len(selected) - len(moved)))
+
+    @admin.action(description='Approve selected pending leaves')
+    def approve_selected(self, request, queryset):
+        self.transition_selected(request, queryset, 'approve')
+
+    @admin.action(description='Reject selected pending leaves')
+    def reject_selected(self, request, queryset):
+        self.transition_selected(request, queryset, 'reject')
+
+    @admin.action(description='Cancel selected pending leaves')
+    def cancel_selected(self, request, queryset):
+        self.transition_selected(request, queryset, 'cancel')
 
     class Media:
         js = ('leave/admin/js/admin.js',)
 
 admin.site.register(Leave, LeaveAdmin)
+
+
+class LeaveBalanceAdmin(admin.ModelAdmin):
+    list_display = ('user', 'year', 'entitlement', 'used', 'pending', 'remaining')
+    list_filter = ('year',)
+    search_fields = ('user__username',)
+    readonly_fields = ('used', 'pending')
+
+admin.site.register(LeaveBalance, LeaveBalanceAdmin)
+
+
+class LeaveNotificationAdmin(admin.ModelAdmin):
+    list_display = ('leave', 'event', 'status', 'attempts', 'available_at', 'sent', 'last_error')
+    list_filter = ('status', 'event')
+    list_select_related = ('leave__user',)
+    readonly_fields = ('leave', 'event', 'attempts', 'last_error', 'created', 'sent')
+    actions = ('requeue_selected',)
+
+    @admin.action(description='Send selected notifications again')
+    def requeue_selected(self, request, queryset):
+        count = queryset.exclude(status=LeaveNotification.SENT).update(status=LeaveNotification.QUEUED, attempts=0, available_at=timezone.now())
+        self.message_user(request, '{0} notification(s) queued again'.format(count))
+
+admin.site.register(LeaveNotification, LeaveNotificationAdmin)
 # admin.site.register(Comment)
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class LeaveConfig(AppConfig):
     name = 'leave'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,184 @@
+"""
+Incremental maintenance of the LeaveBalance ledger.
+
+Approved leaves count as used days and pending leaves as pending days,
+in working days (leave.workdays) split across the years they cover.
+Like leave.rollups, changes are applied as old/new deltas inside the
+saving transaction.
+"""
+import datetime
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Leave, LeaveBalance
+from .rollups import BATCH_SIZE, STATE_FIELDS, merge, profile_of, profiles_of
+from . import workdays
+
+
+LEDGER_STATUSES = ('approved', 'pending')
+
+
+def year_ranges(startdate, enddate):
+	'''
+	splits an inclusive date range by year -> [(year, first day, last day), ...]
+	'''
+	return [
+		(year, max(startdate, datetime.date(year, 1, 1)), min(enddate, datetime.date(year, 12, 31)))
+		for year in range(startdate.year, enddate.year + 1)
+	]
+
+
+
+def contributions_of(items):
+	'''
+	ledger rows of many leaves -> items: [(state, work week), ...]
+	-> [{(user_id, year): [used, pending]}, ...] in the same order, counted in one vectorised pass
+	'''
+	results, slots, ranges = [], [], []
+	for state, weekmask in items:
+		rows = {}
+		results.append(rows)
+		startdate, enddate = state['startdate'], state['enddate']
+		if state['status'] not in LEDGER_STATUSES or not (startdate and enddate) or startdate > enddate:
+			continue
+		column = LEDGER_STATUSES.index(state['status'])
+		for year, first, last in year_ranges(startdate, enddate):
+			slots.append((rows, (state['user_id'], year), column))
+			ranges.append((first, last, weekmask))
+
+	for (rows, key, column), days in zip(slots, workdays.count_ranges(ranges)):
+		if days:
+			rows.setdefault(key, [0, 0])[column] += days
+	return results
+
+
+
+def contributions(state, weekmask=workdays.DEFAULT_WORK_WEEK):
+	'''
+	ledger rows of a single leave -> {(user_id, year): [used, pending]}
+	'''
+	return contributions_of([(state, weekmask)])[0]
+
+
+
+def record_changes(changes, profiles=None):
+	'''
+	moves the contributions of many leaves from their old to their new state -> changes: [(old_state, new_state), ...]
+	profiles (rollups.profiles_of) may be passed in when the caller already has them
+	'''
+	changes = [(old_state, new_state) for old_state, new_state in changes if old_state != new_state]
+	if not changes:
+		return
+
+	if profiles is None:
+		profiles = profiles_of({state['user_id'] for change in changes for state in change if state})
+
+	signs, items = [], []
+	for old_state, new_state in changes:
+		for sign, state in ((-1, old_state), (1, new_state)):
+			if state:
+				signs.append(sign)
+				items.append((state, profile_of(profiles, state['user_id'])[1]))
+
+	totals = {}
+	for sign, rows in zip(signs, contributions_of(items)):
+		merge(totals, rows, sign)
+	write(totals)
+
+
+
+def move_profiles(old_profiles, new_profiles, user_ids):
+	'''
+	recounts the users' ledger days when their work week changed -> old_profiles, new_profiles:
+	rollups.profiles_of results taken before and after the change
+	'''
+	user_ids = {user_id for user_id in user_ids if profile_of(old_profiles, user_id)[1] != profile_of(new_profiles, user_id)[1]}
+	if not user_ids:
+		return
+
+	totals, signs, items = {}, [], []
+	leaves = Leave.objects.order_by().filter(user_id__in=user_ids, status__in=LEDGER_STATUSES).values(*STATE_FIELDS)
+	for state in leaves.iterator(chunk_size=BATCH_SIZE):
+		for sign, profiles in ((-1, old_profiles), (1, new_profiles)):
+			signs.append(sign)
+			items.append((state, profile_of(profiles, state['user_id'])[1]))
+	for sign, rows in zip(signs, contributions_of(items)):
+		merge(totals, rows, sign)
+	write(totals)
+
+
+
+def write(totals):
+	'''
+	adds merged deltas to the ledger rows -> totals: {(user_id, year): [used, pending]}
+	'''
+	with transaction.atomic():
+		now = timezone.now() # update() skips auto_now, API ETags are derived from updated
+		for (user_id, year), (used, pending) in totals.items():
+			if not (used or pending):
+				continue
+			LeaveBalance.objects.get_or_create(user_id=user_id, year=year)
+			LeaveBalance.objects.filter(user_id=user_id, year=year).update(used=F('used') + used, pending=F('pending') + pending, updated=now)
+
+
+
+def compute():
+	'''
+	ledger recomputed from the leave table -> {(user_id, year): [used, pending]}
+	'''
+	profiles = profiles_of()
+	totals, batch = {}, []
+	leaves = Leave.objects.order_by().filter(status__in=LEDGER_STATUSES).values(*STATE_FIELDS)
+	for state in leaves.iterator(chunk_size=BATCH_SIZE):
+		batch.append((state, profile_of(profiles, state['user_id'])[1]))
+		if len(batch) == BATCH_SIZE:
+			for rows in contributions_of(batch):
+				merge(totals, rows)
+			batch = []
+	for rows in contributions_of(batch):
+		merge(totals, rows)
+	return totals
+
+
+
+def stored():
+	return {
+		(user_id, year): [used, pending]
+		for user_id, year, used, pending in LeaveBalance.objects.values_list('user_id', 'year', 'used', 'pending').iterator()
+	}
+
+
+
+def rebuild():
+	'''
+	recomputes used and pending days of every ledger row, entitlements are kept -> rows written
+	'''
+	totals = compute()
+	with transaction.atomic():
+		balances = {(balance.user_id, balance.year): balance for balance in LeaveBalance.objects.select_for_update()}
+		now = timezone.now()
+		for key, balance in balances.items():
+			balance.used, balance.pending = totals.get(key, [0, 0])
+			balance.updated = now
+		LeaveBalance.objects.bulk_update(balances.values(), ['used', 'pending', 'updated'], batch_size=500)
+		LeaveBalance.objects.bulk_create([
+			LeaveBalance(user_id=user_id, year=year, used=used, pending=pending)
+			for (user_id, year), (used, pending) in totals.items() if (user_id, year) not in balances
+		], batch_size=500)
+	return len(set(totals) | set(balances))
+
+
+
+def drift():
+	'''
+	ledger rows whose used/pending days differ from the leave table -> {key: (stored, expected)}
+	'''
+	expected, actual = compute(), stored()
+	drifted = {}
+	for key in set(expected) | set(actual):
+		have, want = actual.get(key, [0, 0]), expected.get(key, [0, 0])
+		if have != want:
+			drifted[key] = (have, want)
+	return drifted
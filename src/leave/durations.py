@@ -0,0 +1,83 @@
+"""
+Recounting of the stored Leave.duration.
+
+Leave.save stores the working days of a leave (leave.workdays) with the
+work week and public holidays in force when it is saved. When those
+change (an employee's employeetype, LEAVE_WORK_WEEKS,
+LEAVE_HOLIDAY_COUNTRY) the stored durations go stale; recount() counts
+the leaves again in vectorised batches and writes back only the ones
+that differ. The rebuild_leave_statistics and rebuild_leave_balances
+commands run it first, and leave.signals runs it for the leaves of an
+employee whose work week changed. bulk_update sends no post_save, so
+recount() sends leaves_recounted for the leaves it rewrote.
+"""
+from django.db import transaction
+from django.dispatch import Signal
+from django.utils import timezone
+
+from .models import Leave
+from .rollups import BATCH_SIZE, profile_of, profiles_of
+from . import workdays
+
+
+# sent by recount() inside its transaction, once per call that rewrote durations; like
+# post_save, receivers defer side effects with on_commit
+# kwargs: pks and user_ids of the leaves recounted
+leaves_recounted = Signal()
+
+
+def drift(user_ids=None, profiles=None):
+	'''
+	leaves whose stored duration differs from a fresh count -> {pk: (stored, expected)}
+	profiles (rollups.profiles_of of user_ids) may be passed in when the caller already has them
+	'''
+	return {pk: (stored, want) for pk, (stored, want, _) in _drift(user_ids, profiles).items()}
+
+
+
+def _drift(user_ids, profiles):
+	'''
+	drift() with the owner of each leave -> {pk: (stored, expected, user_id)}
+	'''
+	if profiles is None:
+		profiles = profiles_of(user_ids)
+	leaves = Leave.objects.order_by()
+	if user_ids is not None:
+		leaves = leaves.filter(user_id__in=user_ids)
+
+	drifted, batch = {}, []
+
+	def flush():
+		ranges = [(row[2], row[3], profile_of(profiles, row[1])[1]) for row in batch]
+		countable = [index for index, (startdate, enddate, _) in enumerate(ranges) if startdate and enddate and startdate <= enddate]
+		counted = dict(zip(countable, workdays.count_ranges([ranges[index] for index in countable])))
+		for index, (pk, user_id, _, _, stored) in enumerate(batch):
+			want = counted.get(index)
+			if stored != want:
+				drifted[pk] = (stored, want, user_id)
+		batch.clear()
+
+	for row in leaves.values_list('pk', 'user_id', 'startdate', 'enddate', 'duration').iterator(chunk_size=BATCH_SIZE):
+		batch.append(row)
+		if len(batch) == BATCH_SIZE:
+			flush()
+	flush()
+	return drifted
+
+
+
+def recount(user_ids=None, profiles=None):
+	'''
+	writes the fresh duration of every leave (of user_ids) whose stored one is stale -> leaves updated
+	'''
+	drifted = _drift(user_ids, profiles)
+	if not drifted:
+		return 0
+	now = timezone.now() # bulk_update skips auto_now, API ETags are derived from updated
+	with transaction.atomic():
+		Leave.objects.bulk_update(
+			[Leave(pk=pk, duration=want, updated=now) for pk, (_, want, _) in drifted.items()],
+			['duration', 'updated'], batch_size=500,
+		)
+		leaves_recounted.send(sender=Leave, pks=list(drifted), user_ids=sorted({user_id for _, _, user_id in drifted.values()}))
+	return len(drifted)
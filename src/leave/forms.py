@@ -1,5 +1,6 @@
 from django import forms
-from .models import Leave
+from .models import Leave, LeaveBalance
+from .workdays import work_weeks_of, working_days
 import datetime
 
 class LeaveCreationForm(forms.ModelForm):
@@ -9,6 +10,14 @@ class LeaveCreationForm(forms.ModelForm):
 		exclude = ['user','defaultdays','hrcomments','status','is_approved','updated','created']
 
 
+	def __init__(self, *args, user=None, **kwargs):
+		'''
+		pass user to check the request against the user's leave balance
+		'''
+		self.user = user
+		super().__init__(*args, **kwargs)
+
+
 
 	def clean_enddate(self):
 		enddate = self.cleaned_data['enddate']
@@ -24,6 +33,26 @@ class LeaveCreationForm(forms.ModelForm):
 		return enddate
 
 
+
+	def clean(self):
+		cleaned_data = super().clean()
+		startdate = cleaned_data.get('startdate')
+		enddate = cleaned_data.get('enddate')
+
+		if self.user is not None and startdate and enddate:
+			overlap = Leave.objects.filter(user=self.user).overlapping(startdate, enddate).exclude(pk=self.instance.pk).order_by('startdate').first()
+			if overlap:
+				raise forms.ValidationError("These dates overlap your {0} {1} from {2:%d %b %Y} to {3:%d %b %Y}".format(
+					overlap.status, overlap.get_leavetype_display().lower(), overlap.startdate, overlap.enddate))
+
+			balance = LeaveBalance.objects.balance_for(self.user, startdate.year)
+			requested = working_days(startdate, enddate, work_weeks_of([self.user.pk])[self.user.pk]) or 0
+			if requested > balance.available:
+				raise forms.ValidationError("Not enough leave days left for {0}: {1} working days requested, {2} available".format(startdate.year, requested, balance.available))
+
+		return cleaned_data
+
+
 class LeaveAdminForm(forms.ModelForm):
     class Meta:
         model = Leave
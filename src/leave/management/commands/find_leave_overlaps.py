@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from leave.overlaps import overlapping_pairs
+
+
+class Command(BaseCommand):
+	help = 'List every pair of pending/approved leaves of the same user that share a day'
+
+	def add_arguments(self, parser):
+		parser.add_argument('--check', action='store_true', help='exit non-zero when any overlap is found')
+
+	def handle(self, *args, **options):
+		pairs = overlapping_pairs()
+		for user_id, first, second in pairs:
+			self.stdout.write('user={0}: leave {1} overlaps leave {2}'.format(user_id, first, second))
+		if pairs and options['check']:
+			raise CommandError('{0} overlapping leave pairs'.format(len(pairs)))
+		self.stdout.write(self.style.SUCCESS('{0} overlapping leave pairs'.format(len(pairs))))
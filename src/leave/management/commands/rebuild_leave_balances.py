@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from leave import balances, durations
+from leave.models import Leave
+from leave.signals import leave_totals_rebuilt
+
+
+class Command(BaseCommand):
+	help = 'Recompute used and pending days of the leave balance ledger, or check it for drift'
+
+	def add_arguments(self, parser):
+		parser.add_argument('--check', action='store_true', help='only report ledger rows that drifted, exit non-zero if any')
+
+	def handle(self, *args, **options):
+		if options['check']:
+			stale = durations.drift()
+			if stale:
+				raise CommandError('{0} leave durations are stale, run without --check to recount them'.format(len(stale)))
+			drifted = balances.drift()
+			for (user_id, year), (have, want) in sorted(drifted.items()):
+				self.stdout.write('user={0} {1}: stored used={2} pending={3}, expected used={4} pending={5}'.format(
+					user_id, year, have[0], have[1], want[0], want[1]))
+			if drifted:
+				raise CommandError('{0} leave balance rows drifted, run without --check to rebuild'.format(len(drifted)))
+			self.stdout.write(self.style.SUCCESS('Leave balances are up to date'))
+			return
+
+		# durations first: they were counted with the work weeks and holidays of their save
+		recounted = durations.recount()
+		if recounted:
+			self.stdout.write('Recounted the duration of {0} leaves'.format(recounted))
+		count = balances.rebuild()
+		leave_totals_rebuilt.send(sender=Leave, user_ids=None)
+		self.stdout.write(self.style.SUCCESS('Rebuilt {0} leave balance rows'.format(count)))
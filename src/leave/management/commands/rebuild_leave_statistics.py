@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from leave import durations, rollups
+from leave.models import Leave
+from leave.signals import leave_totals_rebuilt
+
+
+class Command(BaseCommand):
+	help = 'Rebuild the monthly leave statistics rollups from the leave table, or check them for drift'
+
+	def add_arguments(self, parser):
+		parser.add_argument('--check', action='store_true', help='only report rollup rows that drifted, exit non-zero if any')
+
+	def handle(self, *args, **options):
+		if options['check']:
+			stale = durations.drift()
+			if stale:
+				raise CommandError('{0} leave durations are stale, run without --check to recount them'.format(len(stale)))
+			drifted = rollups.drift()
+			for (month, department_id, leavetype, status), (have, want) in sorted(drifted.items(), key=str):
+				self.stdout.write('{0:%Y-%m} department={1} {2}/{3}: stored leaves={4} days={5}, expected leaves={6} days={7}'.format(
+					month, department_id, leavetype, status, have[0], have[1], want[0], want[1]))
+			if drifted:
+				raise CommandError('{0} leave statistic rows drifted, run without --check to rebuild'.format(len(drifted)))
+			self.stdout.write(self.style.SUCCESS('Leave statistics are up to date'))
+			return
+
+		# durations first: they were counted with the work weeks and holidays of their save
+		recounted = durations.recount()
+		if recounted:
+			self.stdout.write('Recounted the duration of {0} leaves'.format(recounted))
+		count = rollups.rebuild()
+		leave_totals_rebuilt.send(sender=Leave, user_ids=[]) # organisation-wide pages only
+		self.stdout.write(self.style.SUCCESS('Rebuilt {0} leave statistic rows'.format(count)))
@@ -0,0 +1,33 @@
+import time
+
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from leave import notifications
+
+
+class Command(BaseCommand):
+	help = 'Send queued leave e-mails; keeps polling the queue unless --once is given'
+
+	def add_arguments(self, parser):
+		parser.add_argument('--once', action='store_true', help='drain what is due now and exit')
+		parser.add_argument('--batch-size', type=int, default=None, help='notifications claimed per batch')
+		parser.add_argument('--interval', type=float, default=5.0, help='seconds between polls of an empty queue')
+
+	def handle(self, *args, **options):
+		connection = get_connection()
+		while True:
+			close_old_connections()
+			try:
+				sent, failed = notifications.drain(options['batch_size'], connection)
+			except OSError as error:
+				# the SMTP server is unreachable, the claimed batch was handed back
+				self.stderr.write('SMTP connection failed: {0}'.format(error))
+				sent = failed = 0
+			if sent or failed:
+				self.stdout.write('{0} leave notifications sent, {1} failed'.format(sent, failed))
+			if options['once']:
+				self.stdout.write(self.style.SUCCESS('Leave notification queue drained'))
+				return
+			time.sleep(options['interval'])
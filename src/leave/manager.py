@@ -1,7 +1,57 @@
+from django.apps import apps
 from django.db import models
+from django.db.models import CharField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Concat, Trim
 import datetime
 
-class LeaveManager(models.Manager):
+
+BLOCKING_STATUSES = ('pending','approved') # leaves a new request must not overlap
+LIST_FIELDS = ('id','user__id','user__username','startdate','enddate','duration','leavetype','status','is_approved','is_rejected','created')
+
+
+class LeaveQuerySet(models.QuerySet):
+	def for_list(self):
+		'''
+		projection for leave tables -> Leave.objects.all_pending_leaves().for_list()
+		joins the user and loads only the columns the tables render, so a table costs
+		the same number of queries whatever its length
+		'''
+		return self.select_related('user').only(*LIST_FIELDS).with_employee()
+
+
+
+	def overlapping(self, startdate, enddate, statuses=BLOCKING_STATUSES):
+		'''
+		leaves sharing at least one day with startdate..enddate (both included)
+		-> Leave.objects.filter(user=user).overlapping(start, end).exists()
+		per user this is a range scan of leave_user_status_end_idx over the leaves
+		ending on or after startdate, however long the user's history
+		'''
+		return self.filter(status__in=statuses, enddate__gte=startdate, startdate__lte=enddate)
+
+
+
+	def with_employee(self):
+		'''
+		annotates employee_pk and employee_name (Employee.get_full_name) of the leave's user
+		-> Leave.objects.with_employee(); both are None when the user has no active employee
+		resolved in the same SELECT, so pretty_leave costs no query per row
+		'''
+		Employee = apps.get_model('employee', 'Employee')
+		employees = Employee.objects.filter(user=OuterRef('user_id')).order_by('-created')
+		full_name = Trim(Concat(
+			'firstname', Value(' '), 'lastname', Value(' '), Coalesce('othername', Value('')),
+			output_field=CharField(),
+		))
+		return self.annotate(
+			employee_pk=Subquery(employees.values('pk')[:1]),
+			employee_name=Subquery(employees.annotate(full_name=full_name).values('full_name')[:1], output_field=CharField()),
+		)
+
+
+
+
+class LeaveManager(models.Manager.from_queryset(LeaveQuerySet)):
 	def get_queryset(self):
 		'''
 		overrides objects.all() 
@@ -47,7 +97,21 @@ class LeaveManager(models.Manager):
 		this include leave approved,pending,rejected,cancelled
 
 		'''
-		return super().get_queryset().filter(startdate__year = datetime.date.today().year)
+		year = datetime.date.today().year
+		return super().get_queryset().filter(startdate__range = (datetime.date(year, 1, 1), datetime.date(year, 12, 31)))# range so leave_startdate_idx is used
+
+
 
 
 
+class LeaveBalanceManager(models.Manager):
+	def balance_for(self, user, year=None):
+		'''
+		LeaveBalance.objects.balance_for(user) -> the user's ledger row for year (default: current year)
+		an unsaved row with the default entitlement is returned when none exists yet
+		'''
+		year = year or datetime.date.today().year
+		balance = self.get_queryset().filter(user=user, year=year).first()
+		if balance is None:
+			balance = self.model(user_id=getattr(user, 'pk', user), year=year)
+		return balance
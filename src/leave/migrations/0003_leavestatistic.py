@@ -0,0 +1,95 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:10
+
+import datetime
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# frozen copies of the leave.rollups helpers as of this migration (calendar days)
+STATE_FIELDS = ('user_id', 'startdate', 'enddate', 'leavetype', 'status')
+
+
+def month_spans(startdate, enddate):
+    spans = []
+    current = startdate
+    while current <= enddate:
+        month = current.replace(day=1)
+        next_month = (month + datetime.timedelta(days=32)).replace(day=1)
+        last = min(enddate, next_month - datetime.timedelta(days=1))
+        spans.append((month, (last - current).days + 1))
+        current = next_month
+    return spans
+
+
+def contributions(state, department_id):
+    rows = {}
+    startdate, enddate = state['startdate'], state['enddate']
+    if not startdate:
+        return rows
+
+    def key(month):
+        return (month, department_id, state['leavetype'], state['status'])
+
+    rows[key(startdate.replace(day=1))] = [1, 0]
+    if enddate and enddate >= startdate:
+        for month, days in month_spans(startdate, enddate):
+            rows.setdefault(key(month), [0, 0])[1] += days
+    return rows
+
+
+def merge(totals, rows):
+    for key, (leaves, days) in rows.items():
+        entry = totals.setdefault(key, [0, 0])
+        entry[0] += leaves
+        entry[1] += days
+    return totals
+
+
+def backfill_leave_statistics(apps, schema_editor):
+    Employee = apps.get_model('employee', 'Employee')
+    Leave = apps.get_model('leave', 'Leave')
+    LeaveStatistic = apps.get_model('leave', 'LeaveStatistic')
+
+    departments = {}
+    for user_id, department_id in Employee.objects.order_by('-created').values_list('user_id', 'department_id'):
+        departments.setdefault(user_id, department_id)
+
+    totals = {}
+    for state in Leave.objects.order_by().values(*STATE_FIELDS).iterator():
+        merge(totals, contributions(state, departments.get(state['user_id'])))
+
+    LeaveStatistic.objects.bulk_create([
+        LeaveStatistic(month=month, department_id=department_id, leavetype=leavetype, status=status, leaves=leaves, days=days)
+        for (month, department_id, leavetype, status), (leaves, days) in totals.items()
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('employee', '0004_nationality_religion_employee_nationality_and_more'),
+        ('leave', '0002_leave_is_rejected_alter_leave_id_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaveStatistic',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(verbose_name='Month')),
+                ('leavetype', models.CharField(choices=[('sick', 'Sick Leave'), ('casual', 'Casual Leave'), ('emergency', 'Emergency Leave'), ('study', 'Study Leave'), ('maternity', 'Maternity Leave'), ('bereavement', 'Bereavement Leave'), ('quarantine', 'Self Quarantine'), ('compensatory', 'Compensatory Leave'), ('sabbatical', 'Sabbatical Leave')], max_length=25, null=True)),
+                ('status', models.CharField(max_length=12)),
+                ('leaves', models.IntegerField(default=0)),
+                ('days', models.IntegerField(default=0)),
+                ('department', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='employee.department')),
+            ],
+            options={
+                'verbose_name': 'Leave Statistic',
+                'verbose_name_plural': 'Leave Statistics',
+                'ordering': ['-month'],
+                'unique_together': {('month', 'department', 'leavetype', 'status')},
+            },
+        ),
+        migrations.RunPython(backfill_leave_statistics, migrations.RunPython.noop),
+    ]
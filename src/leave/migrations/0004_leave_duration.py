@@ -0,0 +1,39 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:12
+
+from django.db import migrations, models
+
+
+def inclusive_days(startdate, enddate):
+    # frozen copy of leave.models.inclusive_days as of this migration
+    if not (startdate and enddate) or startdate > enddate:
+        return None
+    return (enddate - startdate).days + 1
+
+
+def backfill_duration(apps, schema_editor):
+    Leave = apps.get_model('leave', 'Leave')
+    last_id = 0
+    while True:
+        batch = list(Leave.objects.filter(id__gt=last_id).order_by('id').only('id', 'startdate', 'enddate')[:2000])
+        if not batch:
+            break
+        for leave in batch:
+            leave.duration = inclusive_days(leave.startdate, leave.enddate)
+        Leave.objects.bulk_update(batch, ['duration'])
+        last_id = batch[-1].id
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leave', '0003_leavestatistic'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='leave',
+            name='duration',
+            field=models.PositiveIntegerField(blank=True, editable=False, help_text='start and end date included', null=True, verbose_name='Duration (days)'),
+        ),
+        migrations.RunPython(backfill_duration, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,88 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:13
+
+import datetime
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# frozen copies of the leave.balances and leave.rollups helpers as of this migration (calendar days)
+STATE_FIELDS = ('user_id', 'startdate', 'enddate', 'leavetype', 'status')
+LEDGER_STATUSES = ('approved', 'pending')
+
+
+def month_spans(startdate, enddate):
+    spans = []
+    current = startdate
+    while current <= enddate:
+        month = current.replace(day=1)
+        next_month = (month + datetime.timedelta(days=32)).replace(day=1)
+        last = min(enddate, next_month - datetime.timedelta(days=1))
+        spans.append((month, (last - current).days + 1))
+        current = next_month
+    return spans
+
+
+def contributions(state):
+    rows = {}
+    startdate, enddate = state['startdate'], state['enddate']
+    if state['status'] not in LEDGER_STATUSES or not (startdate and enddate) or startdate > enddate:
+        return rows
+
+    column = LEDGER_STATUSES.index(state['status'])
+    for month, days in month_spans(startdate, enddate):
+        rows.setdefault((state['user_id'], month.year), [0, 0])[column] += days
+    return rows
+
+
+def merge(totals, rows):
+    for key, values in rows.items():
+        entry = totals.setdefault(key, [0, 0])
+        entry[0] += values[0]
+        entry[1] += values[1]
+    return totals
+
+
+def backfill_leave_balances(apps, schema_editor):
+    Leave = apps.get_model('leave', 'Leave')
+    LeaveBalance = apps.get_model('leave', 'LeaveBalance')
+
+    totals = {}
+    for state in Leave.objects.order_by().filter(status__in=LEDGER_STATUSES).values(*STATE_FIELDS).iterator():
+        merge(totals, contributions(state))
+
+    LeaveBalance.objects.bulk_create([
+        LeaveBalance(user_id=user_id, year=year, used=used, pending=pending)
+        for (user_id, year), (used, pending) in totals.items()
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('leave', '0004_leave_duration'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaveBalance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveIntegerField(verbose_name='Year')),
+                ('entitlement', models.PositiveIntegerField(default=30, verbose_name='Leave days entitled')),
+                ('used', models.IntegerField(default=0)),
+                ('pending', models.IntegerField(default=0)),
+                ('updated', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Leave Balance',
+                'verbose_name_plural': 'Leave Balances',
+                'ordering': ['-year'],
+                'unique_together': {('user', 'year')},
+            },
+        ),
+        migrations.RunPython(backfill_leave_balances, migrations.RunPython.noop),
+    ]
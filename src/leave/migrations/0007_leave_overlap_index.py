@@ -0,0 +1,22 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leave', '0006_hot_query_indexes'),
+    ]
+
+    operations = [
+        # the new index covers the (user, status) prefix of the one it replaces
+        migrations.AddIndex(
+            model_name='leave',
+            index=models.Index(fields=['user', 'status', 'enddate'], name='leave_user_status_end_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='leave',
+            name='leave_user_status_idx',
+        ),
+    ]
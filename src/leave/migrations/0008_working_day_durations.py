@@ -0,0 +1,147 @@
+import datetime
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+# frozen copies of the leave.workdays, leave.rollups and leave.balances helpers as of
+# this migration: working days of the employee type's work week (LEAVE_WORK_WEEKS)
+# minus the public holidays of LEAVE_HOLIDAY_COUNTRY
+STATE_FIELDS = ('user_id', 'startdate', 'enddate', 'leavetype', 'status')
+LEDGER_STATUSES = ('approved', 'pending')
+DEFAULT_WORK_WEEK = 'Mon Tue Wed Thu Fri'
+BATCH_SIZE = 2000
+
+
+def work_week(employeetype):
+    weeks = getattr(settings, 'LEAVE_WORK_WEEKS', {})
+    return weeks.get(employeetype) or weeks.get(None) or DEFAULT_WORK_WEEK
+
+
+def count_ranges(ranges, calendars):
+    '''
+    [(startdate, enddate, weekmask), ...] -> [working days, ...], both dates included
+    '''
+    import holidays
+    import numpy
+
+    country = getattr(settings, 'LEAVE_HOLIDAY_COUNTRY', None)
+    by_week = {}
+    for index, (startdate, enddate, weekmask) in enumerate(ranges):
+        by_week.setdefault(weekmask, []).append((index, startdate, enddate))
+
+    days = [0] * len(ranges)
+    for weekmask, rows in by_week.items():
+        indexes, starts, ends = zip(*rows)
+        years = range(min(starts).year, max(ends).year + 2)
+        key = (weekmask, years.start, years.stop)
+        if key not in calendars:
+            dates = sorted(holidays.country_holidays(country, years=list(years))) if country else []
+            calendars[key] = numpy.busdaycalendar(weekmask=weekmask, holidays=dates)
+        counted = numpy.busday_count(
+            numpy.asarray(starts, dtype='datetime64[D]'), numpy.asarray(ends, dtype='datetime64[D]') + 1, busdaycal=calendars[key],
+        )
+        for index, value in zip(indexes, counted):
+            days[index] = max(int(value), 0)
+    return days
+
+
+def month_ranges(startdate, enddate):
+    ranges = []
+    current = startdate
+    while current <= enddate:
+        month = current.replace(day=1)
+        next_month = (month + datetime.timedelta(days=32)).replace(day=1)
+        ranges.append((month, current, min(enddate, next_month - datetime.timedelta(days=1))))
+        current = next_month
+    return ranges
+
+
+def year_ranges(startdate, enddate):
+    return [
+        (year, max(startdate, datetime.date(year, 1, 1)), min(enddate, datetime.date(year, 12, 31)))
+        for year in range(startdate.year, enddate.year + 1)
+    ]
+
+
+def recount_in_working_days(apps, schema_editor):
+    Employee = apps.get_model('employee', 'Employee')
+    Leave = apps.get_model('leave', 'Leave')
+    LeaveStatistic = apps.get_model('leave', 'LeaveStatistic')
+    LeaveBalance = apps.get_model('leave', 'LeaveBalance')
+
+    profiles = {}
+    for user_id, department_id, employeetype in Employee.objects.order_by('-created').values_list('user_id', 'department_id', 'employeetype'):
+        profiles.setdefault(user_id, (department_id, work_week(employeetype)))
+
+    calendars, statistics, ledger = {}, {}, {}
+    last_id = 0
+    while True:
+        batch = list(Leave.objects.filter(id__gt=last_id).order_by('id').only('id', *STATE_FIELDS)[:BATCH_SIZE])
+        if not batch:
+            break
+
+        # every range counted in this batch, tagged with what it feeds
+        slots, ranges = [], []
+        for leave in batch:
+            department_id, weekmask = profiles.get(leave.user_id) or (None, work_week(None))
+            leave.duration = None
+            startdate, enddate = leave.startdate, leave.enddate
+            if startdate:
+                key = (startdate.replace(day=1), department_id, leave.leavetype, leave.status)
+                statistics.setdefault(key, [0, 0])[0] += 1
+            if not (startdate and enddate and startdate <= enddate):
+                continue
+            leave.duration = 0
+            slots.append(('duration', leave))
+            ranges.append((startdate, enddate, weekmask))
+            for month, first, last in month_ranges(startdate, enddate):
+                slots.append(('statistic', (month, department_id, leave.leavetype, leave.status)))
+                ranges.append((first, last, weekmask))
+            if leave.status in LEDGER_STATUSES:
+                for year, first, last in year_ranges(startdate, enddate):
+                    slots.append(('ledger', ((leave.user_id, year), LEDGER_STATUSES.index(leave.status))))
+                    ranges.append((first, last, weekmask))
+
+        for (kind, target), days in zip(slots, count_ranges(ranges, calendars)):
+            if kind == 'duration':
+                target.duration = days
+            elif days and kind == 'statistic':
+                statistics.setdefault(target, [0, 0])[1] += days
+            elif days:
+                key, column = target
+                ledger.setdefault(key, [0, 0])[column] += days
+        Leave.objects.bulk_update(batch, ['duration'])
+        last_id = batch[-1].id
+
+    LeaveStatistic.objects.all().delete()
+    LeaveStatistic.objects.bulk_create([
+        LeaveStatistic(month=month, department_id=department_id, leavetype=leavetype, status=status, leaves=leaves, days=days)
+        for (month, department_id, leavetype, status), (leaves, days) in statistics.items()
+    ], batch_size=500)
+
+    existing = {(balance.user_id, balance.year): balance for balance in LeaveBalance.objects.all()}
+    for key, balance in existing.items():
+        balance.used, balance.pending = ledger.get(key, [0, 0])
+    LeaveBalance.objects.bulk_update(existing.values(), ['used', 'pending'], batch_size=500)
+    LeaveBalance.objects.bulk_create([
+        LeaveBalance(user_id=user_id, year=year, used=used, pending=pending)
+        for (user_id, year), (used, pending) in ledger.items() if (user_id, year) not in existing
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('employee', '0005_hot_query_indexes'),
+        ('leave', '0007_leave_overlap_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='leave',
+            name='duration',
+            field=models.PositiveIntegerField(blank=True, editable=False, help_text='working days, start and end date included', null=True, verbose_name='Duration (days)'),
+        ),
+        migrations.RunPython(recount_in_working_days, migrations.RunPython.noop),
+    ]
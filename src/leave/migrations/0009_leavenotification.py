@@ -0,0 +1,35 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:41
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leave', '0008_working_day_durations'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaveNotification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event', models.CharField(max_length=12)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('sent', 'Sent'), ('failed', 'Failed')], default='queued', max_length=8)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('available_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_error', models.TextField(blank=True, default='')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('sent', models.DateTimeField(blank=True, null=True)),
+                ('leave', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to='leave.leave')),
+            ],
+            options={
+                'verbose_name': 'Leave Notification',
+                'verbose_name_plural': 'Leave Notifications',
+                'ordering': ['-created'],
+                'indexes': [models.Index(condition=models.Q(('status', 'queued')), fields=['available_at'], name='leave_notification_due_idx')],
+            },
+        ),
+    ]
@@ -1,5 +1,5 @@
-from django.db import models
-from .manager import LeaveManager
+from django.db import models, transaction
+from .manager import LeaveManager, LeaveBalanceManager
 from django.utils.translation import gettext as _
 from django.contrib.auth.models import User
 from django.utils import timezone
@@ -39,6 +39,7 @@ class Leave(models.Model):
     leavetype = models.CharField(choices=LEAVE_TYPE,max_length=25,default=SICK,null=True,blank=False)
     reason = models.CharField(verbose_name=_('Reason for Leave'),max_length=255,help_text='add additional information for leave',null=True,blank=True)
     defaultdays = models.PositiveIntegerField(verbose_name=_('Leave days per year counter'),default=DAYS,null=True,blank=True)
+    duration = models.PositiveIntegerField(verbose_name=_('Duration (days)'),help_text='working days, start and end date included',null=True,blank=True,editable=False)
 
 
 
@@ -57,6 +58,11 @@ class Leave(models.Model):
         verbose_name = _('Leave')
         verbose_name_plural = _('Leaves')
         ordering = ['-created'] #recent objects
+        indexes = [
+            models.Index(fields=['status', '-created'], name='leave_status_created_idx'), #pending/approved lists
+            models.Index(fields=['user', 'status', 'enddate'], name='leave_user_status_end_idx'), #dashboards per user, overlap checks
+            models.Index(fields=['startdate'], name='leave_startdate_idx'), #year/month ranges
+        ]
 
 
 
@@ -65,28 +71,47 @@ class Leave(models.Model):
 
 
 
+    def save(self, *args, **kwargs):
+        '''
+        keeps duration (working days, leave.workdays) in step with the dates
+        and runs the post_save rollup update (leave.signals) in the same transaction;
+        the user's profile is read once here and reused by those receivers
+        '''
+        from .rollups import profile_of, profiles_of
+        from .workdays import working_days
+        self._profiles = {self.user_id: profile_of(profiles_of({self.user_id}), self.user_id)}
+        self.duration = working_days(self.startdate, self.enddate, self._profiles[self.user_id][1]) if self.startdate and self.enddate else None
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'startdate', 'enddate'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'duration'}
+
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+
+
 
     @property
     def pretty_leave(self):
         '''
         i don't like the __str__ of leave object - this is a pretty one :-)
+        uses the employee_name annotation of Leave.objects.with_employee() when present
         '''
         leave = self.leavetype
-        user = self.user
-        employee_obj = user.employee_set.first()
-        employee = employee_obj.get_full_name if employee_obj else 'Unknown Employee'
+        if hasattr(self, 'employee_name'):
+            employee = self.employee_name or 'Unknown Employee'
+        else:
+            employee_obj = self.user.employee_set.first()
+            employee = employee_obj.get_full_name if employee_obj else 'Unknown Employee'
         return ('{0} - {1}'.format(employee,leave))
     
 
     @property
     def leave_days(self):
-        days_count = ''
-        startdate = self.startdate
-        enddate = self.enddate
-        if startdate > enddate:
-            return
-        dates = (enddate - startdate)
-        return dates.days
+        '''
+        working days charged for the leave, see duration
+        '''
+        return self.duration
 
 
 
@@ -97,31 +122,28 @@ class Leave(models.Model):
 
 
 
+    # transitions are conditional single-statement updates (leave.transitions);
+    # each returns True when it applied, False when the leave had already moved on
+
     @property
     def approve_leave(self):
-        if not self.is_approved:
-            self.is_approved = True
-            self.status = 'approved'
-            self.save()
+        from .transitions import transition
+        return transition(self, 'approve')
 
 
 
 
     @property
     def unapprove_leave(self):
-        if self.is_approved:
-            self.is_approved = False
-            self.status = 'pending'
-            self.save()
+        from .transitions import transition
+        return transition(self, 'unapprove')
 
 
 
     @property
     def leaves_cancel(self):
-        if self.is_approved or not self.is_approved:
-            self.is_approved = False
-            self.status = 'cancelled'
-            self.save()
+        from .transitions import transition
+        return transition(self, 'cancel')
 
 
 
@@ -130,11 +152,126 @@ class Leave(models.Model):
 
     @property
     def reject_leave(self):
-        if self.is_approved or not self.is_approved:
-            self.is_approved = False
-            self.is_rejected = True
-            self.status = 'rejected'
-            self.save()
-            
+        from .transitions import transition
+        return transition(self, 'reject')
+
+
+
+
+class LeaveStatistic(models.Model):
+    '''
+    Monthly rollup of leaves keyed by (month, department, leavetype, status).
+    leaves -> requests starting in the month, days -> leave days falling in the month.
+    Kept current by leave.signals; rebuild with `manage.py rebuild_leave_statistics`.
+    '''
+    month = models.DateField(verbose_name=_('Month')) #first day of month
+    department = models.ForeignKey('employee.Department',on_delete=models.CASCADE,null=True,blank=True)
+    leavetype = models.CharField(choices=LEAVE_TYPE,max_length=25,null=True)
+    status = models.CharField(max_length=12)
+
+    leaves = models.IntegerField(default=0)
+    days = models.IntegerField(default=0)
+
+
+    class Meta:
+        verbose_name = _('Leave Statistic')
+        verbose_name_plural = _('Leave Statistics')
+        ordering = ['-month']
+        unique_together = ('month','department','leavetype','status')
+
+
+
+    def __str__(self):
+        return ('{0:%b %Y} - {1} - {2}'.format(self.month,self.leavetype,self.status))
+
+
+
+
+class LeaveBalance(models.Model):
+    '''
+    Per-employee, per-year leave ledger.
+    used -> approved leave days, pending -> days awaiting a decision.
+    Kept current by leave.signals; rebuild with `manage.py rebuild_leave_balances`.
+    '''
+    user = models.ForeignKey(User,on_delete=models.CASCADE)
+    year = models.PositiveIntegerField(verbose_name=_('Year'))
+    entitlement = models.PositiveIntegerField(verbose_name=_('Leave days entitled'),default=DAYS)
+
+    used = models.IntegerField(default=0)
+    pending = models.IntegerField(default=0)
+
+    updated = models.DateTimeField(auto_now=True, auto_now_add=False)
+
+
+    objects = LeaveBalanceManager()
 
 
+    class Meta:
+        verbose_name = _('Leave Balance')
+        verbose_name_plural = _('Leave Balances')
+        ordering = ['-year']
+        unique_together = ('user','year')
+
+
+
+    def __str__(self):
+        return ('{0} - {1}'.format(self.user,self.year))
+
+
+
+    @property
+    def remaining(self):
+        return max(0, self.entitlement - self.used)
+
+
+
+    @property
+    def available(self):
+        '''
+        days that can still be requested - pending requests are already spoken for
+        '''
+        return max(0, self.entitlement - self.used - self.pending)
+
+
+
+
+class LeaveNotification(models.Model):
+    '''
+    Durable queue of leave e-mails, one row per leave event.
+    Rows are inserted in the transaction that changes the leave and sent by
+    the `manage.py send_leave_notifications` worker (leave.notifications).
+    '''
+    QUEUED = 'queued'
+    SENT = 'sent'
+    FAILED = 'failed'
+
+    STATUS = (
+    (QUEUED,'Queued'),
+    (SENT,'Sent'),
+    (FAILED,'Failed')
+    )
+
+    leave = models.ForeignKey(Leave,on_delete=models.CASCADE,related_name='notifications')
+    event = models.CharField(max_length=12) # 'created' or the status the leave moved to
+    status = models.CharField(choices=STATUS,max_length=8,default=QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    available_at = models.DateTimeField(default=timezone.now) # not picked up by the worker before
+    last_error = models.TextField(blank=True,default='')
+
+    created = models.DateTimeField(auto_now_add=True)
+    sent = models.DateTimeField(null=True,blank=True)
+
+
+    class Meta:
+        verbose_name = _('Leave Notification')
+        verbose_name_plural = _('Leave Notifications')
+        ordering = ['-created']
+        indexes = [
+            # the worker's scan: queued rows that are due, oldest first
+            models.Index(fields=['available_at'], condition=models.Q(status='queued'), name='leave_notification_due_idx'),
+        ]
+
+
+
+    def __str__(self):
+        return ('{0} - {1} - {2}'.format(self.leave_id,self.event,self.status))
@@ -0,0 +1,172 @@
+"""
+Leave e-mails through a durable queue.
+
+A leave event (a new request, a status change) costs the request one
+INSERT into LeaveNotification, in the same transaction as the change,
+so a rolled back change queues nothing and a committed one is never
+lost. The send_leave_notifications worker drains the queue: it claims
+a batch of due rows, renders them with one query for the leaves, sends
+them over a single SMTP connection, opened with the first claimed batch
+and kept open across the batches that follow, and records the outcome
+with a couple of UPDATEs; polling an empty queue costs one query. Failed sends are retried with
+exponential backoff until LEAVE_NOTIFICATION_MAX_ATTEMPTS.
+"""
+import datetime
+import smtplib
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Leave, LeaveNotification
+
+
+CREATED = 'created'
+LEASE = datetime.timedelta(minutes=10) # a claimed row is hidden from other workers this long
+
+SUBJECTS = {
+	CREATED: 'New leave request from {name}',
+	'approved': 'Your leave request was approved',
+	'rejected': 'Your leave request was rejected',
+	'cancelled': 'Your leave request was cancelled',
+	'pending': 'Your leave request is pending again',
+}
+
+
+class NoRecipient(Exception):
+	pass
+
+
+
+def enqueue(leave_ids, event):
+	'''
+	queues one notification per leave -> a single INSERT whatever the number of leaves
+	'''
+	LeaveNotification.objects.bulk_create([LeaveNotification(leave_id=leave_id, event=event) for leave_id in leave_ids])
+
+
+
+def retry_delay(attempts):
+	'''
+	backoff before the next send once `attempts` sends failed: 1x, 2x, 4x ... RETRY_DELAY
+	'''
+	return datetime.timedelta(seconds=settings.LEAVE_NOTIFICATION_RETRY_DELAY * 2 ** (attempts - 1))
+
+
+
+def claim(batch_size):
+	'''
+	due queued notifications, oldest first -> [LeaveNotification]; their lease is moved
+	forward so a concurrent worker skips them (and picks them up again if this one dies)
+	'''
+	now = timezone.now()
+	with transaction.atomic():
+		due = LeaveNotification.objects.select_for_update(skip_locked=True).filter(status=LeaveNotification.QUEUED, available_at__lte=now).order_by('available_at', 'pk')
+		notifications = list(due[:batch_size])
+		if notifications:
+			LeaveNotification.objects.filter(pk__in=[notification.pk for notification in notifications]).update(available_at=now + LEASE)
+	return notifications
+
+
+
+# ---------------- messages ----------------
+
+def admin_addresses():
+	return list(User.objects.filter(is_superuser=True, is_active=True).exclude(email='').values_list('email', flat=True))
+
+
+
+def compose(notification, leave, admins):
+	'''
+	-> EmailMessage; raises NoRecipient when nobody has an address to send it to
+	'''
+	name = leave.employee_name or leave.user.get_full_name() or leave.user.username
+	details = '{0} from {1:%d %b %Y} to {2:%d %b %Y}, {3} working day(s)'.format(
+		leave.get_leavetype_display(), leave.startdate, leave.enddate, leave.duration or 0)
+
+	if notification.event == CREATED:
+		recipients = admins
+		body = '{0} requested {1}.\n\nReason: {2}\n'.format(name, details, leave.reason or '-')
+	else:
+		recipients = [leave.user.email] if leave.user.email else []
+		body = 'Hello {0},\n\nyour {1} is now {2}.\n'.format(name, details, notification.event)
+
+	if not recipients:
+		raise NoRecipient('no recipient address')
+	return EmailMessage(SUBJECTS.get(notification.event, 'Leave update').format(name=name), body, to=recipients)
+
+
+
+# ---------------- sending ----------------
+
+def send_batch(connection, batch_size=None):
+	'''
+	claims and sends one batch over connection -> (sent, failed), None when nothing is due
+	the connection is opened once there is something to send (a no-op while it is open);
+	when that fails the batch is handed back and the error raised
+	'''
+	notifications = claim(batch_size or settings.LEAVE_NOTIFICATION_BATCH_SIZE)
+	if not notifications:
+		return None
+	try:
+		connection.open()
+	except (smtplib.SMTPException, OSError):
+		LeaveNotification.objects.filter(pk__in=[notification.pk for notification in notifications]).update(available_at=timezone.now())
+		raise
+
+	leaves = Leave.objects.select_related('user').with_employee().in_bulk({notification.leave_id for notification in notifications})
+	admins = admin_addresses() if any(notification.event == CREATED for notification in notifications) else []
+
+	sent, failed = [], []
+	for notification in notifications:
+		leave = leaves.get(notification.leave_id)
+		if leave is None:
+			continue # deleted since it was claimed, its notifications went with it
+		try:
+			message = compose(notification, leave, admins)
+			message.connection = connection
+			try:
+				message.send()
+			except smtplib.SMTPServerDisconnected:
+				# the server dropped the kept-alive connection, reconnect once (and keep it open)
+				connection.close()
+				connection.open()
+				message.send()
+		except NoRecipient as error:
+			failed.append((notification, error, False)) # retrying cannot help
+		except (smtplib.SMTPException, OSError) as error:
+			failed.append((notification, error, True))
+		else:
+			sent.append(notification.pk)
+
+	now = timezone.now()
+	LeaveNotification.objects.filter(pk__in=sent).update(status=LeaveNotification.SENT, sent=now, last_error='')
+	for notification, error, retry in failed:
+		notification.attempts += 1
+		notification.last_error = str(error) or error.__class__.__name__
+		if retry and notification.attempts < settings.LEAVE_NOTIFICATION_MAX_ATTEMPTS:
+			notification.available_at = now + retry_delay(notification.attempts)
+		else:
+			notification.status = LeaveNotification.FAILED
+	LeaveNotification.objects.bulk_update([notification for notification, _, _ in failed], ['attempts', 'last_error', 'status', 'available_at'])
+	return len(sent), len(failed)
+
+
+
+def drain(batch_size=None, connection=None):
+	'''
+	sends batches until nothing is due -> (sent, failed); one SMTP connection for all of them,
+	opened with the first batch and closed when the queue is drained
+	'''
+	connection = connection or get_connection()
+	total_sent = total_failed = 0
+	try:
+		while True:
+			outcome = send_batch(connection, batch_size)
+			if outcome is None:
+				return total_sent, total_failed
+			total_sent, total_failed = total_sent + outcome[0], total_failed + outcome[1]
+	finally:
+		connection.close()
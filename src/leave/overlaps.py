@@ -0,0 +1,52 @@
+"""
+Organisation-wide overlap report.
+
+Leaves are streamed sorted by (user, startdate) and swept once per user:
+a heap holds the leaves still running, so each leave is compared only
+with the ones it actually overlaps instead of every other leave of the
+user. O(n log n + pairs).
+"""
+import heapq
+
+from .manager import BLOCKING_STATUSES
+from .models import Leave
+
+
+
+def sweep(intervals):
+	'''
+	intervals sorted by start: [(start, end, key), ...] with inclusive ends
+	-> [(earlier key, later key), ...] for every overlapping pair
+	'''
+	pairs = []
+	running = [] # heap of (end, key)
+	for start, end, key in intervals:
+		while running and running[0][0] < start:
+			heapq.heappop(running)
+		pairs.extend((other, key) for _, other in sorted(running, key=lambda item: item[1]))
+		heapq.heappush(running, (end, key))
+	return pairs
+
+
+
+def overlapping_pairs(leaves=None, statuses=BLOCKING_STATUSES):
+	'''
+	every pair of leaves of the same user sharing a day -> [(user_id, leave_id, leave_id), ...]
+	leaves defaults to all leaves; only statuses count
+	'''
+	if leaves is None:
+		leaves = Leave.objects.all()
+	rows = (
+		leaves.order_by('user_id', 'startdate', 'id')
+		.filter(status__in=statuses, startdate__isnull=False, enddate__isnull=False)
+		.values_list('user_id', 'startdate', 'enddate', 'id')
+	)
+
+	pairs, current_user, intervals = [], None, []
+	for user_id, startdate, enddate, leave_id in rows.iterator(chunk_size=5000):
+		if user_id != current_user:
+			pairs.extend((current_user, first, second) for first, second in sweep(intervals))
+			current_user, intervals = user_id, []
+		intervals.append((startdate, enddate, leave_id))
+	pairs.extend((current_user, first, second) for first, second in sweep(intervals))
+	return pairs
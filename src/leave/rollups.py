@@ -0,0 +1,251 @@
+"""
+Incremental maintenance of the LeaveStatistic monthly rollups.
+
+A leave contributes one request to the month it starts in and its
+working days (leave.workdays) to every month it covers. Changes are
+applied as deltas (old contribution out, new contribution in) so a save
+only touches the handful of rollup rows it affects.
+"""
+import datetime
+
+from django.db import transaction
+from django.db.models import F
+
+from employee.models import Employee
+from .models import Leave, LeaveStatistic
+from . import workdays
+
+
+STATE_FIELDS = ('user_id', 'startdate', 'enddate', 'leavetype', 'status')
+BATCH_SIZE = 10000
+
+
+def state_of(leave):
+	'''
+	the fields of a leave that feed the rollups -> dict
+	'''
+	return {field: getattr(leave, field) for field in STATE_FIELDS}
+
+
+
+def month_ranges(startdate, enddate):
+	'''
+	splits an inclusive date range by month -> [(first day of month, first day, last day), ...]
+	eg. 2024-01-30 .. 2024-02-02 -> [(2024-01-01, 2024-01-30, 2024-01-31), (2024-02-01, 2024-02-01, 2024-02-02)]
+	'''
+	ranges = []
+	current = startdate
+	while current <= enddate:
+		month = current.replace(day=1)
+		next_month = (month + datetime.timedelta(days=32)).replace(day=1)
+		last = min(enddate, next_month - datetime.timedelta(days=1))
+		ranges.append((month, current, last))
+		current = next_month
+	return ranges
+
+
+
+def month_spans(startdate, enddate):
+	'''
+	splits an inclusive date range by month -> [(first day of month, calendar days), ...]
+	eg. 2024-01-30 .. 2024-02-02 -> [(2024-01-01, 2), (2024-02-01, 2)]
+	'''
+	return [(month, (last - first).days + 1) for month, first, last in month_ranges(startdate, enddate)]
+
+
+
+def contributions_of(items):
+	'''
+	rollup rows of many leaves -> items: [(state, department_id, work week), ...]
+	-> [{(month, department, leavetype, status): [leaves, days]}, ...] in the same order
+	the working days of every month span are counted in one vectorised pass
+	'''
+	results, slots, ranges = [], [], []
+	for state, department_id, weekmask in items:
+		rows = {}
+		results.append(rows)
+		startdate, enddate = state['startdate'], state['enddate']
+		if not startdate:
+			continue
+
+		def key(month):
+			return (month, department_id, state['leavetype'], state['status'])
+
+		rows[key(startdate.replace(day=1))] = [1, 0]
+		if enddate and enddate >= startdate:
+			for month, first, last in month_ranges(startdate, enddate):
+				slots.append((rows, key(month)))
+				ranges.append((first, last, weekmask))
+
+	for (rows, key), days in zip(slots, workdays.count_ranges(ranges)):
+		if days:
+			rows.setdefault(key, [0, 0])[1] += days
+	return results
+
+
+
+def contributions(state, department_id, weekmask=workdays.DEFAULT_WORK_WEEK):
+	'''
+	rollup rows of a single leave -> {(month, department, leavetype, status): [leaves, days]}
+	'''
+	return contributions_of([(state, department_id, weekmask)])[0]
+
+
+
+def merge(totals, rows, sign=1):
+	for key, (leaves, days) in rows.items():
+		entry = totals.setdefault(key, [0, 0])
+		entry[0] += sign * leaves
+		entry[1] += sign * days
+	return totals
+
+
+
+def profiles_of(user_ids=None):
+	'''
+	user id -> (department id, work week) of the user's latest employee profile (all users when user_ids is None)
+	'''
+	employees = Employee.objects.all_employees().order_by('-created')
+	if user_ids is not None:
+		employees = employees.filter(user_id__in=user_ids)
+
+	profiles = {}
+	for user_id, department_id, employeetype in employees.values_list('user_id', 'department_id', 'employeetype'):
+		profiles.setdefault(user_id, (department_id, workdays.work_week(employeetype)))
+	return profiles
+
+
+
+def profile_of(profiles, user_id):
+	'''
+	profiles_of entry of a user, no department and the default work week without a profile
+	'''
+	return profiles.get(user_id) or (None, workdays.work_week(None))
+
+
+
+def departments_of(user_ids=None):
+	'''
+	user id -> department id of the user's employee profile (all users when user_ids is None)
+	'''
+	return {user_id: department_id for user_id, (department_id, _) in profiles_of(user_ids).items()}
+
+
+
+def record_changes(changes, profiles=None):
+	'''
+	moves the contributions of many leaves from their old to their new state -> changes: [(old_state, new_state), ...]
+	deltas are merged first, so each rollup row is written once whatever the batch size
+	profiles (profiles_of) may be passed in when the caller already has them
+	'''
+	changes = [(old_state, new_state) for old_state, new_state in changes if old_state != new_state]
+	if not changes:
+		return
+
+	if profiles is None:
+		profiles = profiles_of({state['user_id'] for change in changes for state in change if state})
+
+	signs, items = [], []
+	for old_state, new_state in changes:
+		for sign, state in ((-1, old_state), (1, new_state)):
+			if state:
+				signs.append(sign)
+				items.append((state,) + profile_of(profiles, state['user_id']))
+
+	totals = {}
+	for sign, rows in zip(signs, contributions_of(items)):
+		merge(totals, rows, sign)
+	write(totals)
+
+
+
+def move_profiles(old_profiles, new_profiles, user_ids):
+	'''
+	moves the contributions of the users' leaves from their old profile (department, work week)
+	to the new one -> old_profiles, new_profiles: profiles_of results taken before and after the change;
+	old_profiles None when the old rows are gone already (their department was deleted)
+	'''
+	if old_profiles is not None:
+		user_ids = {user_id for user_id in user_ids if profile_of(old_profiles, user_id) != profile_of(new_profiles, user_id)}
+	if not user_ids:
+		return
+
+	totals, signs, items = {}, [], []
+	sides = ((1, new_profiles),) if old_profiles is None else ((-1, old_profiles), (1, new_profiles))
+	for state in Leave.objects.filter(user_id__in=user_ids).order_by().values(*STATE_FIELDS).iterator(chunk_size=BATCH_SIZE):
+		for sign, profiles in sides:
+			signs.append(sign)
+			items.append((state,) + profile_of(profiles, state['user_id']))
+	for sign, rows in zip(signs, contributions_of(items)):
+		merge(totals, rows, sign)
+	write(totals)
+
+
+
+def write(totals):
+	'''
+	adds merged deltas to the rollup rows, one UPDATE (or INSERT) per row
+	'''
+	with transaction.atomic():
+		for (month, department_id, leavetype, status), (leaves, days) in totals.items():
+			if not (leaves or days):
+				continue
+			lookup = dict(month=month, department_id=department_id, leavetype=leavetype, status=status)
+			updated = LeaveStatistic.objects.filter(**lookup).update(leaves=F('leaves') + leaves, days=F('days') + days)
+			if not updated:
+				LeaveStatistic.objects.create(leaves=leaves, days=days, **lookup)
+
+
+
+def compute():
+	'''
+	rollups recomputed from the leave table -> {(month, department, leavetype, status): [leaves, days]}
+	'''
+	profiles = profiles_of()
+	totals, batch = {}, []
+	for state in Leave.objects.order_by().values(*STATE_FIELDS).iterator(chunk_size=BATCH_SIZE):
+		batch.append((state,) + profile_of(profiles, state['user_id']))
+		if len(batch) == BATCH_SIZE:
+			for rows in contributions_of(batch):
+				merge(totals, rows)
+			batch = []
+	for rows in contributions_of(batch):
+		merge(totals, rows)
+	return totals
+
+
+
+def stored():
+	totals = {}
+	for row in LeaveStatistic.objects.order_by().values_list('month', 'department_id', 'leavetype', 'status', 'leaves', 'days').iterator():
+		merge(totals, {row[:4]: [row[4], row[5]]})
+	return totals
+
+
+
+def rebuild():
+	'''
+	replaces every rollup row with freshly computed ones -> number of rows written
+	'''
+	totals = compute()
+	with transaction.atomic():
+		LeaveStatistic.objects.all().delete()
+		LeaveStatistic.objects.bulk_create([
+			LeaveStatistic(month=month, department_id=department_id, leavetype=leavetype, status=status, leaves=leaves, days=days)
+			for (month, department_id, leavetype, status), (leaves, days) in totals.items()
+		], batch_size=500)
+	return len(totals)
+
+
+
+def drift():
+	'''
+	rows whose stored totals differ from the leave table -> {key: (stored, expected)}
+	'''
+	expected, actual = compute(), stored()
+	drifted = {}
+	for key in set(expected) | set(actual):
+		have, want = actual.get(key, [0, 0]), expected.get(key, [0, 0])
+		if have != want:
+			drifted[key] = (have, want)
+	return drifted
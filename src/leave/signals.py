@@ -0,0 +1,167 @@
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import Signal, receiver
+
+from employee.models import Department, Employee
+from employee.signals import employees_imported
+from .models import Leave
+from . import balances, durations, notifications, rollups, workdays
+
+
+# sent by leave.transitions inside the transaction that moved the leaves, instead of a
+# post_save per leave; like post_save, receivers defer side effects with on_commit
+# kwargs: action ('approve', 'reject', 'cancel', ...), pks and user_ids of the leaves moved
+leaves_transitioned = Signal()
+
+# sent by the rebuild_leave_statistics and rebuild_leave_balances commands once they
+# rewrote the rollups or the ledger in bulk; kwargs: user_ids whose numbers may have
+# changed, None for everyone
+leave_totals_rebuilt = Signal()
+
+
+def record_changes(changes, profiles=None):
+	'''
+	applies leave changes to the rollups and the ledger with a single profile lookup
+	profiles (rollups.profiles_of) already read for some of the users are reused
+	'''
+	changes = [(old_state, new_state) for old_state, new_state in changes if old_state != new_state]
+	if not changes:
+		return
+	profiles = dict(profiles or {})
+	missing = {state['user_id'] for change in changes for state in change if state} - set(profiles)
+	if missing:
+		profiles.update(rollups.profiles_of(missing))
+	rollups.record_changes(changes, profiles)
+	balances.record_changes(changes, profiles)
+
+
+
+@receiver(pre_save, sender=Leave)
+def remember_leave_state(sender, instance, raw=False, **kwargs):
+	'''
+	keeps the stored state of the leave so post_save can apply a delta
+	'''
+	instance._stored_state = None
+	if raw or instance._state.adding or not instance.pk:
+		return
+	instance._stored_state = Leave.objects.filter(pk=instance.pk).values(*rollups.STATE_FIELDS).first()
+
+
+
+@receiver(post_save, sender=Leave)
+def update_leave_statistics(sender, instance, raw=False, **kwargs):
+	if raw:
+		return
+	old_state, new_state = getattr(instance, '_stored_state', None), rollups.state_of(instance)
+	record_changes([(old_state, new_state)], getattr(instance, '_profiles', None))
+
+
+
+@receiver(post_save, sender=Leave)
+def queue_leave_notification(sender, instance, created=False, raw=False, **kwargs):
+	'''
+	new requests and status changes queue an e-mail, in the saving transaction
+	'''
+	if raw:
+		return
+	stored_state = getattr(instance, '_stored_state', None)
+	if created:
+		notifications.enqueue([instance.pk], notifications.CREATED)
+	elif stored_state and stored_state['status'] != instance.status:
+		notifications.enqueue([instance.pk], instance.status)
+
+
+
+@receiver(post_delete, sender=Leave)
+def remove_leave_statistics(sender, instance, **kwargs):
+	record_changes([(rollups.state_of(instance), None)])
+
+
+
+# ---------------- employee profiles ----------------
+# rollup rows are keyed by the employee's department, and rollups, ledger and stored
+# durations count working days of their work week (employeetype): a profile change
+# moves the user's leaves between rows and recounts them
+
+PROFILE_FIELDS = ('user_id', 'department_id', 'employeetype', 'is_deleted')
+
+
+@receiver(pre_save, sender=Employee)
+def remember_employee_profiles(sender, instance, raw=False, **kwargs):
+	instance._stored_profiles = None
+	if raw:
+		return
+	stored = None
+	if not instance._state.adding and instance.pk:
+		stored = Employee.objects.all_employees().filter(pk=instance.pk).values(*PROFILE_FIELDS).first()
+		if stored == {field: getattr(instance, field) for field in PROFILE_FIELDS}:
+			return
+	user_ids = {instance.user_id} | ({stored['user_id']} if stored else set())
+	instance._stored_profiles = (user_ids, rollups.profiles_of(user_ids))
+
+
+
+@receiver(post_save, sender=Employee)
+def move_employee_statistics(sender, instance, raw=False, **kwargs):
+	stored = getattr(instance, '_stored_profiles', None)
+	if stored:
+		instance._stored_profiles = None
+		user_ids, profiles = stored
+		new_profiles = rollups.profiles_of(user_ids)
+		rollups.move_profiles(profiles, new_profiles, user_ids)
+		balances.move_profiles(profiles, new_profiles, user_ids)
+		# the stored durations were counted with the old work week
+		recounted = {user_id for user_id in user_ids if rollups.profile_of(profiles, user_id)[1] != rollups.profile_of(new_profiles, user_id)[1]}
+		if recounted:
+			durations.recount(recounted)
+
+
+
+@receiver(pre_delete, sender=Employee)
+def remember_deleted_employee_profile(sender, instance, **kwargs):
+	instance._stored_profiles = ({instance.user_id}, rollups.profiles_of({instance.user_id}))
+
+
+
+@receiver(post_delete, sender=Employee)
+def move_deleted_employee_statistics(sender, instance, **kwargs):
+	move_employee_statistics(sender, instance)
+
+
+
+@receiver(pre_delete, sender=Department)
+def remember_department_members(sender, instance, **kwargs):
+	'''
+	the department's rollup rows go with it (CASCADE) and its employees are moved to no
+	department without a save: remember whose leaves were counted under it
+	'''
+	members = Employee.objects.all_employees().filter(department=instance).values_list('user_id', flat=True)
+	instance._member_ids = {user_id for user_id, (department_id, _) in rollups.profiles_of(set(members)).items() if department_id == instance.pk}
+
+
+
+@receiver(post_delete, sender=Department)
+def recount_department_members(sender, instance, **kwargs):
+	user_ids = getattr(instance, '_member_ids', set())
+	rollups.move_profiles(None, rollups.profiles_of(user_ids), user_ids)
+
+
+
+IMPORT_BATCH_SIZE = 1000
+
+
+@receiver(employees_imported, sender=Employee)
+def move_imported_statistics(sender, user_ids, **kwargs):
+	'''
+	bulk_create sends no post_save: the imported users may have leaves already, counted
+	under no profile or a deleted one; the imported profile is each user's newest
+	'''
+	user_ids = sorted(set(user_ids))
+	for start in range(0, len(user_ids), IMPORT_BATCH_SIZE):
+		batch = user_ids[start:start + IMPORT_BATCH_SIZE]
+		old_profiles, new_profiles = {}, {}
+		employees = Employee.objects.all_employees().filter(user_id__in=batch).order_by('-created', '-pk')
+		for user_id, department_id, employeetype in employees.values_list('user_id', 'department_id', 'employeetype'):
+			(old_profiles if user_id in new_profiles else new_profiles).setdefault(user_id, (department_id, workdays.work_week(employeetype)))
+		rollups.move_profiles(old_profiles, new_profiles, batch)
+		balances.move_profiles(old_profiles, new_profiles, batch)
+		durations.recount(batch, new_profiles)
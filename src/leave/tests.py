@@ -1,3 +1,631 @@
-from django.test import TestCase
+import datetime
+import io
+import socketserver
+import threading
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.mail import get_connection
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, close_old_connections, connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from unittest import skipUnless
+
+from dashboard.testing import TemporarySearchIndex
+from employee.models import Department, Employee
+from .forms import LeaveCreationForm
+from .models import Leave, LeaveBalance, LeaveNotification, LeaveStatistic
+from .signals import leaves_transitioned
+from .overlaps import overlapping_pairs, sweep
+from . import balances, durations, notifications, rollups, transitions, workdays
+
+
+class LeaveStatisticTest(TestCase):
+
+    def setUp(self):
+        self.department = Department.objects.create(name='Finance')
+        self.user = User.objects.create(username='ama')
+        Employee.objects.create(user=self.user, firstname='Ama', lastname='Mensah',
+                                birthday=datetime.date(1990, 1, 1), department=self.department)
+
+    def rows(self):
+        return {
+            (row.month, row.status): (row.leaves, row.days)
+            for row in LeaveStatistic.objects.exclude(leaves=0, days=0)
+        }
+
+    def test_month_spans(self):
+        self.assertEqual(rollups.month_spans(datetime.date(2024, 1, 30), datetime.date(2024, 3, 1)), [
+            (datetime.date(2024, 1, 1), 2),
+            (datetime.date(2024, 2, 1), 29),
+            (datetime.date(2024, 3, 1), 1),
+        ])
+
+    def test_leave_spanning_months_splits_days(self):
+        Leave.objects.create(user=self.user, startdate=datetime.date(2024, 1, 30), enddate=datetime.date(2024, 2, 2))
+        self.assertEqual(self.rows(), {
+            (datetime.date(2024, 1, 1), 'pending'): (1, 2),
+            (datetime.date(2024, 2, 1), 'pending'): (0, 2),
+        })
+
+    def test_transitions_move_rollups(self):
+        leave = Leave.objects.create(user=self.user, startdate=datetime.date(2024, 5, 6), enddate=datetime.date(2024, 5, 8))
+        leave.approve_leave
+        self.assertEqual(self.rows(), {(datetime.date(2024, 5, 1), 'approved'): (1, 3)})
+
+        leave.unapprove_leave
+        leave.reject_leave
+        self.assertEqual(self.rows(), {(datetime.date(2024, 5, 1), 'rejected'): (1, 3)})
+
+        leave.leaves_cancel
+        self.assertEqual(self.rows(), {(datetime.date(2024, 5, 1), 'cancelled'): (1, 3)})
+
+        leave.delete()
+        self.assertEqual(self.rows(), {})
+
+    def test_duration_is_stored_inclusive(self):
+        leave = Leave.objects.create(user=self.user, startdate=datetime.date(2024, 5, 6), enddate=datetime.date(2024, 5, 6))
+        self.assertEqual(leave.duration, 1)
+
+        leave.enddate = datetime.date(2024, 5, 10)
+        leave.save(update_fields=['enddate'])
+        leave.refresh_from_db()
+        self.assertEqual(leave.duration, 5)
+
+    def test_rebuild_and_check(self):
+        Leave.objects.create(user=self.user, startdate=datetime.date(2024, 5, 6), enddate=datetime.date(2024, 5, 8))
+        self.assertEqual(rollups.drift(), {})
+
+        LeaveStatistic.objects.update(days=99)
+        self.assertEqual(len(rollups.drift()), 1)
+
+        call_command('rebuild_leave_statistics', stdout=io.StringIO())
+        self.assertEqual(rollups.drift(), {})
+        self.assertEqual(self.rows(), {(datetime.date(2024, 5, 1), 'pending'): (1, 3)})
+
+    @override_settings(LEAVE_WORK_WEEKS={None: 'Mon Tue Wed Thu Fri', Employee.PART_TIME: 'Mon Tue'}, LEAVE_HOLIDAY_COUNTRY=None)
+    def test_profile_changes_move_rollups(self):
+        Leave.objects.create(user=self.user, startdate=datetime.date(2024, 5, 6), enddate=datetime.date(2024, 5, 8))
+        employee = Employee.objects.get(user=self.user)
+        operations = Department.objects.create(name='Operations')
+
+        def departments():
+            return dict(LeaveStatistic.objects.exclude(leaves=0, days=0).values_list('department_id', 'days'))
+
+        employee.department = operations
+        employee.save()
+        self.assertEqual(departments(), {operations.pk: 3})
+        self.assertEqual(rollups.drift(), {})
+
+        employee.employeetype = Employee.PART_TIME # Mon Tue: two of the three days
+        employee.save()
+        self.assertEqual(departments(), {operations.pk: 2})
+
+        operations.delete()
+        self.assertEqual(departments(), {None: 2})
+        self.assertEqual(rollups.drift(), {})
+
+        employee.refresh_from_db()
+        employee.department = self.department
+        employee.save()
+        employee.delete()
+        self.assertEqual(departments(), {None: 3})
+        self.assertEqual(rollups.drift(), {})
+
+
+# every day is a working day, so ledger tests in next year's calendar stay fixed
+EVERY_DAY = override_settings(LEAVE_WORK_WEEKS={None: 'Mon Tue Wed Thu Fri Sat Sun'}, LEAVE_HOLIDAY_COUNTRY=None)
+
+
+@EVERY_DAY
+class LeaveBalanceTest(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(username='yaw')
+        self.year = datetime.date.today().year + 1
+
+    def balance(self):
+        balance = LeaveBalance.objects.balance_for(self.user, self.year)
+        return balance.used, balance.pending
+
+    def test_transitions_update_ledger(self):
+        leave = Leave.objects.create(user=self.user, startdate=datetime.date(self.year, 3, 2), enddate=datetime.date(self.year, 3, 6))
+        self.assertEqual(self.balance(), (0, 5))
+
+        leave.approve_leave
+        self.assertEqual(self.balance(), (5, 0))
+
+        leave.unapprove_leave
+        self.assertEqual(self.balance(), (0, 5))
+
+        leave.reject_leave
+        self.assertEqual(self.balance(), (0, 0))
+
+        leave.status = 'pending'
+        leave.save()
+        leave.leaves_cancel
+        self.assertEqual(self.balance(), (0, 0))
+        self.assertEqual(balances.drift(), {})
+
+    def test_leave_across_new_year_is_split(self):
+        leave = Leave.objects.create(user=self.user, startdate=datetime.date(self.year, 12, 30), enddate=datetime.date(self.year + 1, 1, 2))
+        leave.approve_leave
+        self.assertEqual(self.balance(), (2, 0))
+        self.assertEqual(LeaveBalance.objects.balance_for(self.user, self.year + 1).used, 2)
+
+    def test_form_rejects_request_beyond_balance(self):
+        LeaveBalance.objects.create(user=self.user, year=self.year, entitlement=10, used=8)
+        data = {'startdate': datetime.date(self.year, 5, 4), 'enddate': datetime.date(self.year, 5, 6), 'leavetype': 'casual'}
+        form = LeaveCreationForm(data=data, user=self.user)
+        self.assertFalse(form.is_valid())
+        self.assertIn('Not enough leave days', form.non_field_errors()[0])
+
+        data['enddate'] = datetime.date(self.year, 5, 5)
+        self.assertTrue(LeaveCreationForm(data=data, user=self.user).is_valid())
+
+    def test_rebuild_keeps_entitlement(self):
+        Leave.objects.create(user=self.user, startdate=datetime.date(self.year, 3, 2), enddate=datetime.date(self.year, 3, 3))
+        LeaveBalance.objects.filter(user=self.user).update(entitlement=25, pending=0)
+        self.assertEqual(len(balances.drift()), 1)
+
+        call_command('rebuild_leave_balances', stdout=io.StringIO())
+        balance = LeaveBalance.objects.balance_for(self.user, self.year)
+        self.assertEqual((balance.entitlement, balance.pending), (25, 2))
+
+
+class WorkdaysTest(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(username='kofi')
+        self.employee = Employee.objects.create(user=self.user, firstname='Kofi', lastname='Boateng',
+                                                birthday=datetime.date(1990, 1, 1))
+
+    @override_settings(LEAVE_HOLIDAY_COUNTRY=None)
+    def test_weekends_are_not_charged(self):
+        self.assertEqual(workdays.working_days(datetime.date(2024, 5, 6), datetime.date(2024, 5, 12)), 5)
+        self.assertEqual(workdays.working_days(datetime.date(2024, 5, 11), datetime.date(2024, 5, 12)), 0)
+        self.assertIsNone(workdays.working_days(datetime.date(2024, 5, 12), datetime.date(2024, 5, 6)))
+
+    @override_settings(LEAVE_HOLIDAY_COUNTRY='GH')
+    def test_public_holidays_are_not_charged(self):
+        # Independence Day, Wednesday 6 March 2024
+        self.assertEqual(workdays.working_days(datetime.date(2024, 3, 4), datetime.date(2024, 3, 8)), 4)
+        # Christmas and Boxing Day, then New Year's Day
+        self.assertEqual(workdays.working_days(datetime.date(2024, 12, 23), datetime.date(2025, 1, 3)), 7)
+
+    @override_settings(LEAVE_HOLIDAY_COUNTRY=None, LEAVE_WORK_WEEKS={None: 'Mon Tue Wed Thu Fri', 'Part-Time': 'Mon Tue Wed'})
+    def test_work_week_follows_employee_type(self):
+        leave = Leave.objects.create(user=self.user, startdate=datetime.date(2024, 5, 6), enddate=datetime.date(2024, 5, 10))
+        self.assertEqual(leave.duration, 5)
+
+        Employee.objects.filter(pk=self.employee.pk).update(employeetype=Employee.PART_TIME)
+        leave = Leave.objects.create(user=self.user, startdate=datetime.date(2024, 5, 13), enddate=datetime.date(2024, 5, 17))
+        self.assertEqual(leave.duration, 3)
+        self.assertEqual(LeaveStatistic.objects.get().days, 8)
+        self.assertEqual(LeaveBalance.objects.balance_for(self.user, 2024).pending, 8)
+
+    @override_settings(LEAVE_HOLIDAY_COUNTRY=None, LEAVE_WORK_WEEKS={None: 'Mon Tue Wed Thu Fri', 'Part-Time': 'Mon Tue Wed'})
+    def test_employee_type_change_recounts_leaves(self):
+        leave = Leave.objects.create(user=self.user, startdate=datetime.date(2024, 5, 6), enddate=datetime.date(2024, 5, 10))
+        self.employee.employeetype = Employee.PART_TIME
+        self.employee.save()
+
+        leave.refresh_from_db()
+        self.assertEqual(leave.duration, 3)
+        self.assertEqual(LeaveStatistic.objects.get().days, 3)
+        self.assertEqual(LeaveBalance.objects.balance_for(self.user, 2024).pending, 3)
+        self.assertEqual((durations.drift(), rollups.drift(), balances.drift()), ({}, {}, {}))
+
+    @override_settings(LEAVE_HOLIDAY_COUNTRY=None)
+    def test_rebuild_recounts_durations_counted_under_old_settings(self):
+        leave = Leave.objects.create(user=self.user, startdate=datetime.date(2024, 5, 6), enddate=datetime.date(2024, 5, 12))
+        self.assertEqual(leave.duration, 5)
+
+        with self.settings(LEAVE_WORK_WEEKS={None: 'Mon Tue Wed Thu Fri Sat Sun'}):
+            self.assertEqual(durations.drift(), {leave.pk: (5, 7)})
+            with self.assertRaises(CommandError):
+                call_command('rebuild_leave_balances', check=True, stdout=io.StringIO())
+            stdout = io.StringIO()
+            call_command('rebuild_leave_statistics', stdout=stdout)
+            self.assertIn('Recounted the duration of 1 leaves', stdout.getvalue())
+            leave.refresh_from_db()
+            self.assertEqual(leave.duration, 7)
+            self.assertEqual(LeaveStatistic.objects.get().days, 7)
+
+    def test_save_reads_the_profile_once(self):
+        with CaptureQueriesContext(connection) as queries:
+            Leave.objects.create(user=self.user, startdate=datetime.date(2024, 5, 6), enddate=datetime.date(2024, 5, 10))
+        profile_reads = [query['sql'] for query in queries if query['sql'].startswith('SELECT') and 'employee_employee' in query['sql']]
+        self.assertEqual(len(profile_reads), 1)
+
+    @override_settings(LEAVE_HOLIDAY_COUNTRY=None)
+    def test_count_ranges_keeps_order_across_work_weeks(self):
+        monday, sunday = datetime.date(2024, 5, 6), datetime.date(2024, 5, 12)
+        ranges = [(monday, sunday, 'Mon Tue Wed Thu Fri'), (monday, sunday, 'Mon Tue Wed'), (sunday, monday, 'Mon Tue Wed Thu Fri')]
+        self.assertEqual(workdays.count_ranges(ranges), [5, 3, 0])
+
+    @override_settings(LEAVE_HOLIDAY_COUNTRY=None)
+    def test_form_counts_working_days(self):
+        today = datetime.date.today()
+        monday = datetime.date(today.year + 1, 5, 1) + datetime.timedelta(days=-datetime.date(today.year + 1, 5, 1).weekday() % 7)
+        LeaveBalance.objects.create(user=self.user, year=monday.year, entitlement=5)
+        data = {'startdate': monday, 'enddate': monday + datetime.timedelta(days=6), 'leavetype': 'casual'}
+        self.assertTrue(LeaveCreationForm(data=data, user=self.user).is_valid())
+
+        data['enddate'] = monday + datetime.timedelta(days=7)
+        form = LeaveCreationForm(data=data, user=self.user)
+        self.assertFalse(form.is_valid())
+        self.assertIn('6 working days requested', form.non_field_errors()[0])
+
+
+class OverlapTest(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(username='esi')
+        self.year = datetime.date.today().year + 1
+
+    def leave(self, start, end, user=None, status='pending'):
+        return Leave.objects.create(user=user or self.user, status=status,
+                                    startdate=datetime.date(self.year, *start), enddate=datetime.date(self.year, *end))
+
+    def test_form_rejects_overlapping_request(self):
+        self.leave((5, 4), (5, 8), status='approved')
+        self.leave((6, 1), (6, 3), status='rejected')
+        data = {'startdate': datetime.date(self.year, 5, 8), 'enddate': datetime.date(self.year, 5, 10), 'leavetype': 'casual'}
+        form = LeaveCreationForm(data=data, user=self.user)
+        self.assertFalse(form.is_valid())
+        self.assertIn('overlap your approved sick leave from 04 May', form.non_field_errors()[0])
+
+        for start, end in (((5, 9), (5, 10)), ((6, 1), (6, 3))):
+            data.update(startdate=datetime.date(self.year, *start), enddate=datetime.date(self.year, *end))
+            self.assertTrue(LeaveCreationForm(data=data, user=self.user).is_valid())
+
+    def test_sweep(self):
+        self.assertEqual(sweep([(1, 3, 'a'), (2, 2, 'b'), (3, 5, 'c'), (6, 7, 'd'), (7, 7, 'e')]),
+                         [('a', 'b'), ('a', 'c'), ('d', 'e')])
+        self.assertEqual(sweep([]), [])
+
+    def test_overlapping_pairs_per_user(self):
+        other = User.objects.create(username='kofi')
+        a = self.leave((1, 1), (1, 10))
+        b = self.leave((1, 5), (1, 6), status='approved')
+        self.leave((1, 5), (1, 6), status='cancelled')
+        c = self.leave((1, 10), (1, 12))
+        self.leave((1, 13), (1, 14))
+        d = self.leave((1, 5), (1, 5), user=other)
+        e = self.leave((1, 5), (1, 5), user=other)
+        self.leave((1, 6), (1, 6), user=other)
+
+        self.assertEqual(overlapping_pairs(), [
+            (self.user.pk, a.pk, b.pk), (self.user.pk, a.pk, c.pk), (other.pk, d.pk, e.pk),
+        ])
+        out = io.StringIO()
+        call_command('find_leave_overlaps', stdout=out)
+        self.assertIn('3 overlapping leave pairs', out.getvalue())
+
+
+class BulkTransitionTest(TestCase):
+
+    def setUp(self):
+        self.department = Department.objects.create(name='Finance')
+        self.users = [User.objects.create(username='user{0}'.format(i)) for i in range(3)]
+        for user in self.users:
+            Employee.objects.create(user=user, firstname=user.username, lastname='Test',
+                                    birthday=datetime.date(1990, 1, 1), department=self.department)
+        self.leaves = [
+            Leave.objects.create(user=user, startdate=datetime.date(2024, 5, 6), enddate=datetime.date(2024, 5, 7))
+            for user in self.users for _ in range(4)
+        ]
+
+    def test_side_effects_match_single_transitions(self):
+        single = self.leaves[:6]
+        for leave in single[:3]:
+            leave.approve_leave
+        for leave in single[3:]:
+            leave.reject_leave
+        expected = (rollups.stored(), balances.stored())
+
+        Leave.objects.filter(pk__in=[leave.pk for leave in single]).update(status='pending', is_approved=False, is_rejected=False)
+        rollups.rebuild()
+        balances.rebuild()
+
+        self.assertEqual(transitions.bulk_transition('approve', [leave.pk for leave in single[:3]]), [leave.pk for leave in single[:3]])
+        transitions.bulk_transition('reject', [leave.pk for leave in single[3:]])
+        self.assertEqual((rollups.stored(), balances.stored()), expected)
+        self.assertEqual(rollups.drift(), {})
+        self.assertEqual(balances.drift(), {})
+
+    def test_batch_is_set_based_and_skips_non_pending(self):
+        self.leaves[0].reject_leave
+        received = []
+        leaves_transitioned.connect(lambda sender, **kwargs: received.append(kwargs), sender=Leave, weak=False,
+                                    dispatch_uid='bulk-test')
+        self.addCleanup(leaves_transitioned.disconnect, sender=Leave, dispatch_uid='bulk-test')
+
+        ids = [leave.pk for leave in self.leaves]
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertNumQueries(21): # per batch, rollup row, ledger row, e-mail queue and change feed, not per leave
+                moved = transitions.bulk_transition('cancel', ids)
+        self.assertEqual(moved, ids[1:])
+        self.assertEqual(Leave.objects.filter(status='cancelled').count(), 11)
+        self.assertEqual(Leave.objects.get(pk=ids[0]).status, 'rejected')
+        self.assertEqual(len(received), 1)
+        self.assertEqual(received[0]['action'], 'cancel')
+        self.assertEqual(received[0]['user_ids'], sorted(user.pk for user in self.users))
+        self.assertEqual(balances.drift(), {})
+
+    def test_pending_list_bulk_action(self):
+        admin = User.objects.create(username='admin', is_staff=True, is_superuser=True)
+        self.client.force_login(admin)
+        ids = [leave.pk for leave in self.leaves[:5]]
+        response = self.client.post('/dashboard/leaves/pending/bulk/', {'action': 'approve', 'leave_ids': ids})
+        self.assertRedirects(response, '/dashboard/leaves/pending/all/', fetch_redirect_response=False)
+        self.assertEqual(Leave.objects.filter(status='approved', is_approved=True).count(), 5)
+
+        response = self.client.post('/dashboard/leaves/pending/bulk/', {'action': 'delete', 'leave_ids': ids})
+        self.assertEqual(Leave.objects.filter(status='approved').count(), 5)
+
+
+class TransitionTest(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(username='ama')
+        self.leave = Leave.objects.create(user=self.user, startdate=datetime.date(2024, 5, 6), enddate=datetime.date(2024, 5, 7),
+                                          reason='wedding')
+
+    def test_only_transition_columns_are_written(self):
+        stale = Leave.objects.get(pk=self.leave.pk)
+        Leave.objects.filter(pk=self.leave.pk).update(reason='family wedding')
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertTrue(stale.approve_leave)
+        update = next(query['sql'] for query in queries if query['sql'].startswith('UPDATE "leave_leave"'))
+        self.assertNotIn('reason', update)
+        self.assertIn('"status" = \'pending\'', update)
+        self.assertEqual(Leave.objects.get(pk=self.leave.pk).reason, 'family wedding')
+
+    def test_any_source_status_is_moved_with_one_update(self):
+        self.assertTrue(transitions.transition(self.leave, 'approve'))
+        with CaptureQueriesContext(connection) as queries:
+            self.assertTrue(transitions.transition(self.leave, 'reject')) # from approved, the second of its sources
+        self.assertEqual(len([query for query in queries if query['sql'].startswith('UPDATE "leave_leave"')]), 1)
+        self.assertEqual(balances.drift(), {})
+        self.assertEqual(rollups.drift(), {})
+
+    def test_stale_transition_reports_it_did_not_apply(self):
+        first, second = Leave.objects.get(pk=self.leave.pk), Leave.objects.get(pk=self.leave.pk)
+        self.assertTrue(first.reject_leave)
+        self.assertFalse(second.approve_leave)
+        self.assertEqual((second.status, second.is_rejected), ('rejected', True))
+
+        self.assertTrue(transitions.transition(second, 'unreject'))
+        self.assertEqual(Leave.objects.filter(status='pending', is_rejected=False).count(), 1)
+        self.assertEqual(balances.drift(), {})
+        self.assertEqual(rollups.drift(), {})
+
+
+class TransitionConcurrencyTest(TemporarySearchIndex, TransactionTestCase):
+    '''
+    many approvers on the same leave at once: exactly one approval applies
+    '''
+    THREADS = 16
+
+    def test_concurrent_approvals_apply_once(self):
+        user = User.objects.create(username='ama')
+        leave = Leave.objects.create(user=user, startdate=datetime.date(2024, 5, 6), enddate=datetime.date(2024, 5, 7))
+        barrier = threading.Barrier(self.THREADS)
+        results, errors = [], []
+
+        def approve():
+            try:
+                stale = Leave.objects.get(pk=leave.pk)
+                barrier.wait()
+                while True:
+                    try:
+                        results.append(stale.approve_leave)
+                        break
+                    except OperationalError: # sqlite reports a busy database instead of waiting
+                        continue
+            except Exception as error:
+                errors.append(error)
+            finally:
+                close_old_connections()
+
+        threads = [threading.Thread(target=approve) for _ in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(sorted(results), [False] * (self.THREADS - 1) + [True])
+        self.assertEqual(Leave.objects.get(pk=leave.pk).status, 'approved')
+        self.assertEqual(balances.drift(), {})
+        self.assertEqual(rollups.drift(), {})
+        self.assertEqual(LeaveBalance.objects.get(user=user).used, 2)
+
+
+class SMTPStandIn(socketserver.ThreadingTCPServer):
+    """
+    just enough of an SMTP server on localhost to receive what smtplib sends;
+    counts connections and answers 451 (try again later) for addresses in `refuse`
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, refuse=()):
+        super().__init__(('127.0.0.1', 0), SMTPStandInHandler)
+        self.refuse = set(refuse)
+        self.messages, self.connections = [], 0
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class SMTPStandInHandler(socketserver.StreamRequestHandler):
+
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        self.server.connections += 1
+        self.reply('220 localhost stand-in')
+        recipients = []
+        for line in self.rfile:
+            command = line.decode().strip()
+            verb = command[:4].upper()
+            if verb in ('EHLO', 'HELO'):
+                self.reply('250 localhost')
+            elif verb == 'MAIL':
+                recipients = []
+                self.reply('250 OK')
+            elif verb == 'RCPT':
+                address = command.split(':', 1)[1].strip(' <>')
+                if address in self.server.refuse:
+                    self.reply('451 try again later')
+                else:
+                    recipients.append(address)
+                    self.reply('250 OK')
+            elif verb == 'DATA':
+                self.reply('354 go ahead')
+                data = b''
+                for data_line in self.rfile:
+                    if data_line == b'.\r\n':
+                        break
+                    data += data_line
+                self.server.messages.append((recipients, data.decode()))
+                self.reply('250 OK')
+            elif verb == 'QUIT':
+                self.reply('221 bye')
+                return
+            else:
+                self.reply('250 OK')
+
+
+class NotificationTest(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(username='ama', email='ama@example.com')
+        Employee.objects.create(user=self.user, firstname='Ama', lastname='Mensah', birthday=datetime.date(1990, 1, 1))
+        User.objects.create_superuser('admin', 'admin@example.com', 'secret')
+        self.smtp = SMTPStandIn(refuse=['refused@example.com'])
+        self.addCleanup(self.smtp.stop)
+
+    def connection(self):
+        return get_connection('django.core.mail.backends.smtp.EmailBackend', host='127.0.0.1', port=self.smtp.port,
+                              username='', password='', use_tls=False, timeout=5)
+
+    def leave(self, day=4, user=None):
+        return Leave.objects.create(user=user or self.user, startdate=datetime.date(2024, 3, day), enddate=datetime.date(2024, 3, day), leavetype='casual')
+
+    def test_events_cost_the_request_one_insert(self):
+        leave = self.leave()
+        with CaptureQueriesContext(connection) as queries:
+            leave.approve_leave
+        inserts = [query['sql'] for query in queries if query['sql'].startswith('INSERT INTO "leave_leavenotification"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(list(LeaveNotification.objects.order_by('pk').values_list('event', flat=True)), ['created', 'approved'])
+
+        leave.reason = 'no status change'
+        leave.save()
+        self.assertEqual(LeaveNotification.objects.count(), 2)
+
+    def test_rolled_back_change_queues_nothing(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            self.leave()
+            raise RuntimeError
+        self.assertFalse(LeaveNotification.objects.exists())
+
+    def test_bulk_transition_queues_one_per_leave(self):
+        leaves = [self.leave(day) for day in range(4, 9)]
+        transitions.bulk_transition('reject', [leave.pk for leave in leaves])
+        self.assertEqual(LeaveNotification.objects.filter(event='rejected').count(), 5)
+
+    def test_worker_drains_in_batches_over_one_connection(self):
+        leaves = [self.leave(day) for day in range(4, 9)]
+        transitions.bulk_transition('approve', [leave.pk for leave in leaves])
+
+        self.assertEqual(notifications.drain(batch_size=3, connection=self.connection()), (10, 0))
+        self.assertEqual(self.smtp.connections, 1)
+        self.assertEqual(LeaveNotification.objects.filter(status=LeaveNotification.SENT).count(), 10)
+        recipients = sorted(recipient for recipients, _ in self.smtp.messages for recipient in recipients)
+        self.assertEqual(recipients, ['admin@example.com'] * 5 + ['ama@example.com'] * 5)
+        self.assertTrue(any('Subject: Your leave request was approved' in data and 'Ama Mensah' in data for _, data in self.smtp.messages))
+        self.assertEqual(notifications.drain(connection=self.connection()), (0, 0))
+
+    def test_empty_queue_opens_no_connection(self):
+        self.assertEqual(notifications.drain(connection=self.connection()), (0, 0))
+        self.assertEqual(self.smtp.connections, 0)
+
+    def test_unreachable_server_hands_the_batch_back(self):
+        self.leave()
+        self.smtp.stop()
+        with self.assertRaises(OSError):
+            notifications.drain(connection=self.connection())
+        notification = LeaveNotification.objects.get()
+        self.assertEqual((notification.status, notification.attempts), (LeaveNotification.QUEUED, 0))
+        self.assertLessEqual(notification.available_at, timezone.now())
+
+    @override_settings(LEAVE_NOTIFICATION_MAX_ATTEMPTS=2, LEAVE_NOTIFICATION_RETRY_DELAY=60)
+    def test_failed_sends_back_off_then_give_up(self):
+        refused = User.objects.create(username='kofi', email='refused@example.com')
+        leave = self.leave(user=refused)
+        LeaveNotification.objects.all().delete()
+        leave.approve_leave
+
+        self.assertEqual(notifications.drain(connection=self.connection()), (0, 1))
+        notification = LeaveNotification.objects.get()
+        self.assertEqual((notification.status, notification.attempts), (LeaveNotification.QUEUED, 1))
+        self.assertIn('451', notification.last_error)
+        self.assertGreater(notification.available_at, timezone.now() + datetime.timedelta(seconds=50))
+        self.assertEqual(notifications.drain(connection=self.connection()), (0, 0)) # not due yet
+
+        LeaveNotification.objects.update(available_at=timezone.now())
+        self.assertEqual(notifications.drain(connection=self.connection()), (0, 1))
+        notification.refresh_from_db()
+        self.assertEqual((notification.status, notification.attempts), (LeaveNotification.FAILED, 2))
+
+    def test_missing_address_fails_without_retry(self):
+        nobody = User.objects.create(username='yaw')
+        self.leave(user=nobody).approve_leave
+        LeaveNotification.objects.filter(event='created').delete()
+
+        self.assertEqual(notifications.drain(connection=self.connection()), (0, 1))
+        self.assertEqual(LeaveNotification.objects.get().status, LeaveNotification.FAILED)
+
+    def test_command_drains_once(self):
+        self.leave()
+        call_command('send_leave_notifications', '--once', stdout=io.StringIO())
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['admin@example.com'])
+
+
+@skipUnless(connection.vendor == 'sqlite', 'query plans are checked against SQLite')
+class HotQueryPlanTest(TestCase):
+
+    def plan(self, queryset):
+        return queryset.explain()
+
+    def test_pending_list_uses_status_created_index(self):
+        self.assertIn('leave_status_created_idx', self.plan(Leave.objects.all_pending_leaves()))
+
+    def test_user_status_filter_uses_composite_index(self):
+        self.assertIn('leave_user_status_end_idx', self.plan(Leave.objects.filter(user_id=1, status='approved').order_by()))
+
+    def test_overlap_check_is_an_index_range_scan(self):
+        plan = self.plan(Leave.objects.filter(user_id=1).overlapping(datetime.date(2024, 5, 1), datetime.date(2024, 5, 3)).order_by())
+        self.assertIn('leave_user_status_end_idx (user_id=? AND status=? AND enddate>?)', plan)
+
+    def test_current_year_uses_startdate_index(self):
+        self.assertIn('leave_startdate_idx', self.plan(Leave.objects.current_year_leaves()))
+
+    def test_active_employees_by_department_use_partial_index(self):
+        self.assertIn('employee_active_dept_idx', self.plan(Employee.objects.filter(department_id=1)))
@@ -0,0 +1,99 @@
+"""
+Leave state transitions as conditional UPDATEs.
+
+transition moves one leave with UPDATE ... WHERE status=<as read>, so of
+two approvers acting at once exactly one wins and the other is told;
+only the transition columns are written and no row is locked up front.
+bulk_transition applies approve, reject or cancel to many pending
+leaves in one transaction: the leaves are moved with one UPDATE per
+batch of ids, the rollup and balance deltas are merged so each row is
+written once, the e-mails are queued with one INSERT (leave.notifications)
+and a single leaves_transitioned signal (dashboard cache, availability,
+change feed) is sent for the whole batch.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Leave
+from .rollups import STATE_FIELDS
+from .signals import leaves_transitioned, record_changes
+from . import notifications
+
+
+SOURCE_STATUS = 'pending' # bulk transitions only move pending leaves
+BATCH_SIZE = 500
+
+# action -> (statuses it applies from, columns it writes)
+TRANSITIONS = {
+	'approve': (('pending',), {'status': 'approved', 'is_approved': True}),
+	'unapprove': (('approved',), {'status': 'pending', 'is_approved': False}),
+	'reject': (('pending', 'approved', 'cancelled'), {'status': 'rejected', 'is_approved': False, 'is_rejected': True}),
+	'unreject': (('rejected',), {'status': 'pending', 'is_approved': False, 'is_rejected': False}),
+	'cancel': (('pending', 'approved', 'rejected'), {'status': 'cancelled', 'is_approved': False}),
+	'uncancel': (('cancelled',), {'status': 'pending', 'is_approved': False}),
+}
+BULK_ACTIONS = ('approve', 'reject', 'cancel')
+
+
+
+def transition(leave, action):
+	'''
+	applies action to leave with a single conditional UPDATE -> True when it applied
+	False when the leave is not (or no longer) in a status the action applies from;
+	leave's transition columns reflect the stored row either way
+	'''
+	sources, values = TRANSITIONS[action]
+	with transaction.atomic():
+		now = timezone.now()
+		while True:
+			old_state = Leave.objects.filter(pk=leave.pk, status__in=sources).values(*STATE_FIELDS).first()
+			if old_state is None:
+				leave.refresh_from_db(fields=['status', 'is_approved', 'is_rejected', 'updated'])
+				return False
+			# UPDATE has no portable RETURNING for the old status, so the row is read unlocked
+			# and the UPDATE only applies to it unchanged; when another write got in between
+			# it matches nothing and the row is read again
+			if Leave.objects.filter(pk=leave.pk, **old_state).update(updated=now, **values):
+				break
+
+		record_changes([(old_state, dict(old_state, status=values['status']))])
+		notifications.enqueue([leave.pk], values['status'])
+		user_ids = [old_state['user_id']]
+		leaves_transitioned.send(sender=Leave, action=action, pks=[leave.pk], user_ids=user_ids)
+
+	for field, value in values.items():
+		setattr(leave, field, value)
+	leave.updated = now
+	return True
+
+
+
+def bulk_transition(action, ids):
+	'''
+	moves the pending leaves among ids to the status of action -> [pk of every leave moved]
+	leaves that are no longer pending are skipped
+	'''
+	if action not in BULK_ACTIONS:
+		raise ValueError('{0!r} is not a bulk leave action'.format(action))
+	values = TRANSITIONS[action][1]
+	ids = sorted(set(ids))
+	moved, changes = [], []
+
+	with transaction.atomic():
+		now = timezone.now()
+		for start in range(0, len(ids), BATCH_SIZE):
+			rows = Leave.objects.select_for_update().order_by('pk').filter(pk__in=ids[start:start + BATCH_SIZE], status=SOURCE_STATUS).values('pk', *STATE_FIELDS)
+			states = {row.pop('pk'): row for row in rows}
+			if not states:
+				continue
+			Leave.objects.filter(pk__in=list(states), status=SOURCE_STATUS).update(updated=now, **values)
+			moved.extend(states)
+			changes.extend((state, dict(state, status=values['status'])) for state in states.values())
+
+		record_changes(changes)
+		notifications.enqueue(moved, values['status'])
+
+		user_ids = sorted({state['user_id'] for state, _ in changes})
+		if moved:
+			leaves_transitioned.send(sender=Leave, action=action, pks=moved, user_ids=user_ids)
+	return moved
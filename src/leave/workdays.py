@@ -0,0 +1,103 @@
+"""
+Working days of leaves.
+
+A leave is charged the days of the employee's work week (per employee
+type, settings.LEAVE_WORK_WEEKS) minus the public holidays of
+settings.LEAVE_HOLIDAY_COUNTRY. Ranges are counted with
+numpy.busday_count, one vectorised call per work week for a whole batch.
+Holiday calendars are built once per (work week, country, years) and kept
+for the life of the process.
+"""
+from functools import lru_cache
+
+import holidays
+import numpy
+from django.apps import apps
+from django.conf import settings
+
+
+DEFAULT_WORK_WEEK = 'Mon Tue Wed Thu Fri'
+
+
+
+def work_week(employeetype):
+	'''
+	numpy weekmask of an Employee.employeetype, eg. 'Mon Tue Wed Thu Fri'
+	the None entry covers unknown types and users without an employee profile
+	'''
+	weeks = getattr(settings, 'LEAVE_WORK_WEEKS', {})
+	return weeks.get(employeetype) or weeks.get(None) or DEFAULT_WORK_WEEK
+
+
+
+def work_weeks_of(user_ids):
+	'''
+	user id -> work week of the user's latest employee profile (default work week when none)
+	'''
+	Employee = apps.get_model('employee', 'Employee')
+	types = {}
+	for user_id, employeetype in Employee.objects.all_employees().filter(user_id__in=user_ids).order_by('-created').values_list('user_id', 'employeetype'):
+		types.setdefault(user_id, employeetype)
+	return {user_id: work_week(types.get(user_id)) for user_id in user_ids}
+
+
+
+@lru_cache(maxsize=None)
+def holiday_dates(country, year):
+	'''
+	public holidays of a country in a year -> tuple of dates, memoised per process
+	'''
+	if not country:
+		return ()
+	return tuple(sorted(holidays.country_holidays(country, years=year)))
+
+
+
+@lru_cache(maxsize=256)
+def _calendar(weekmask, country, first_year, last_year):
+	days = [day for year in range(first_year, last_year + 1) for day in holiday_dates(country, year)]
+	return numpy.busdaycalendar(weekmask=weekmask, holidays=days)
+
+
+
+def count(starts, ends, weekmask=DEFAULT_WORK_WEEK):
+	'''
+	working days of each inclusive range starts[i]..ends[i] -> numpy array of ints
+	ranges ending before they start count 0
+	'''
+	starts = numpy.asarray(starts, dtype='datetime64[D]')
+	ends = numpy.asarray(ends, dtype='datetime64[D]') + 1
+	if not starts.size:
+		return numpy.zeros(0, dtype=int)
+	years = numpy.concatenate([starts, ends]).astype('datetime64[Y]').astype(int) + 1970
+	first_year, last_year = int(years.min()), int(years.max())
+	calendar = _calendar(weekmask, getattr(settings, 'LEAVE_HOLIDAY_COUNTRY', None), first_year, last_year)
+	return numpy.maximum(numpy.busday_count(starts, ends, busdaycal=calendar), 0)
+
+
+
+def count_ranges(ranges):
+	'''
+	[(startdate, enddate, weekmask), ...] -> [working days, ...] in the same order
+	one busday_count per distinct work week, whatever the number of ranges
+	'''
+	by_week = {}
+	for index, (startdate, enddate, weekmask) in enumerate(ranges):
+		by_week.setdefault(weekmask, []).append((index, startdate, enddate))
+
+	days = [0] * len(ranges)
+	for weekmask, rows in by_week.items():
+		indexes, starts, ends = zip(*rows)
+		for index, value in zip(indexes, count(starts, ends, weekmask)):
+			days[index] = int(value)
+	return days
+
+
+
+def working_days(startdate, enddate, weekmask=DEFAULT_WORK_WEEK):
+	'''
+	working days from startdate to enddate, both included -> int or None
+	'''
+	if not (startdate and enddate) or startdate > enddate:
+		return None
+	return int(count([startdate], [enddate], weekmask)[0])